@@ -0,0 +1,6 @@
+#benchmarks for the shared client code and the completed labs
+#
+#everything here runs against the local Bedrock stand-in (common.bedrock_stub), so results are
+#repeatable and cost nothing. Run the scripts from the workshop folder, e.g.
+#
+#    python -m benchmarks.lib_benchmarks --output results.json
@@ -0,0 +1,79 @@
+import os, sys, json, time, statistics
+import boto3
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client, clear_clients
+from common.bedrock_stub import BedrockStub
+
+#compares per-request overhead of a new Session + client per call (the old lib pattern)
+#against the shared, pooled client from common.clients, using the local Bedrock stand-in
+#with its simulated latency turned off
+#
+#usage: python client_overhead.py [requests]
+
+MODEL_ID = "us.amazon.nova-lite-v1:0"
+
+
+def converse(bedrock):
+    return bedrock.converse(
+        modelId=MODEL_ID,
+        messages=[{"role": "user", "content": [{"text": "Hello"}]}],
+        inferenceConfig={"maxTokens": 10, "temperature": 0},
+    )
+
+
+def per_request_client(endpoint_url): #the pattern the libs used before
+    session = boto3.Session()
+    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2', endpoint_url=endpoint_url)
+    return converse(bedrock)
+
+
+def shared_client(endpoint_url):
+    bedrock = get_bedrock_client(region_name='us-west-2', endpoint_url=endpoint_url)
+    return converse(bedrock)
+
+
+def measure(fn, endpoint_url, requests):
+    fn(endpoint_url) #warm up imports and service model loading
+
+    timings = []
+
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn(endpoint_url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def run(requests=200):
+    #the stub does not check signatures, but botocore still needs credentials to sign requests
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    with BedrockStub(time_scale=0) as stub:
+        clear_clients()
+
+        results = {
+            "per_request_client": measure(per_request_client, stub.url, requests),
+            "shared_client": measure(shared_client, stub.url, requests),
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    results = run(requests)
+
+    for name, stats in results.items():
+        print(f"{name:20} {json.dumps(stats)}")
+
+    saved = results["per_request_client"]["mean_ms"] - results["shared_client"]["mean_ms"]
+    print(f"overhead saved per request: {saved:.3f} ms")
@@ -0,0 +1,134 @@
+import argparse, glob, json, os, subprocess, sys
+
+#import-time profile and cold-start budget check for the completed labs
+#
+#Streamlit imports an app's lib the first time the page loads, so whatever the lib imports at module
+#level is paid before anything is drawn. This imports each lib in a fresh interpreter under
+#`python -X importtime`, reports its total import time and which top-level packages it spent it on,
+#and exits with status 1 if any lib is over budget - run it after touching a lib's imports:
+#
+#    python benchmarks/cold_start.py
+#    python benchmarks/cold_start.py --only rag --top 15
+#
+#each lib is imported several times and the fastest run is kept, so the numbers reflect import work
+#rather than a cold disk cache.
+
+COMPLETED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "completed")
+
+#every lib defers boto3, chromadb, pandas and PIL (see common/lazy.py) and imports in ~5-20 ms;
+#importing any one of those eagerly again costs 100 ms to 1 s and trips this
+DEFAULT_BUDGET_MS = 50
+
+
+def find_libs(only=None): #(lab folder, lib module name) for every completed lab
+    libs = []
+
+    for lib_path in sorted(glob.glob(os.path.join(COMPLETED_DIR, "*", "*_lib.py"))):
+        lab = os.path.basename(os.path.dirname(lib_path))
+
+        if only and not any(text in lab for text in only):
+            continue
+
+        libs.append((lab, os.path.splitext(os.path.basename(lib_path))[0]))
+
+    return libs
+
+
+def parse_importtime(output):
+    """Parse -X importtime output into [(module, self_us, cumulative_us, depth)]."""
+
+    modules = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2 #two spaces per nesting level
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    return modules
+
+
+def profile_import(lab, module_name):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=os.path.join(COMPLETED_DIR, lab), capture_output=True, text=True,
+    )
+
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module_name} failed:\n{result.stderr[-2000:]}")
+
+    modules = parse_importtime(result.stderr)
+    total_us = next(cumulative for name, _, cumulative, _ in modules if name == module_name)
+
+    return total_us, modules
+
+
+def get_package_costs(modules, module_name):
+    """Self time of everything imported on behalf of module_name, summed by top-level package, heaviest first."""
+
+    #importtime lists a module after its dependencies, so the lib's subtree is the run of deeper
+    #entries right before it; modules the interpreter loaded at startup are not part of it
+    index = next(i for i, module in enumerate(modules) if module[0] == module_name)
+    depth = modules[index][3]
+    costs = {}
+
+    for name, self_us, _, module_depth in reversed(modules[:index]):
+        if module_depth <= depth:
+            break
+
+        package = name.split(".")[0]
+        costs[package] = costs.get(package, 0) + self_us
+
+    return sorted(costs.items(), key=lambda item: -item[1])
+
+
+def run(libs, repeats=3, top=5, budget_ms=DEFAULT_BUDGET_MS):
+    report = {}
+
+    for lab, module_name in libs:
+        runs = [profile_import(lab, module_name) for _ in range(repeats)]
+        total_us, modules = min(runs, key=lambda run: run[0])
+
+        report[lab] = {
+            "lib": module_name,
+            "import_ms": round(total_us / 1000, 1),
+            "budget_ms": budget_ms,
+            "over_budget": total_us / 1000 > budget_ms,
+            "heaviest_packages_ms": {package: round(us / 1000, 1) for package, us in get_package_costs(modules, module_name)[:top]},
+        }
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the completed labs' libs and check it against a budget")
+    parser.add_argument("--only", action="append", help="only labs whose folder name contains this text (repeatable)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="how many of the heaviest packages to list per lib")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(find_libs(args.only), args.repeats, args.top, args.budget_ms)
+
+    for lab, entry in report.items():
+        status = "OVER BUDGET" if entry["over_budget"] else "ok"
+        packages = ", ".join(f"{package} {ms}" for package, ms in entry["heaviest_packages_ms"].items())
+        print(f"{lab:22} {entry['import_ms']:8.1f} ms / {entry['budget_ms']:.0f} ms  {status:11}  {packages}")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2, sort_keys=True)
+            json_file.write("\n")
+
+    over_budget = [lab for lab, entry in report.items() if entry["over_budget"]]
+
+    if over_budget:
+        print(f"\n{len(over_budget)} lib(s) over the cold-start budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse, json, os, sys, tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+import numpy as np
+from common.clients import ENDPOINT_URL_ENV_VAR, clear_clients, get_bedrock_client
+from common.embedding_file import read_embedding_file
+from common.embedding_profiles import MODEL_ID, PROFILES, get_profile, get_request_body, get_vectors_name
+from common.ingest import ingest
+from common.quantized_index import QuantizedIndex, build_quantized_index
+from benchmarks.harness import _percentile, time_calls, write_results
+from benchmarks.lib_benchmarks import DATA_DIR, FIXTURES_PATH, start_stub
+
+#recall vs latency vs memory across the Titan v2 embedding profiles (common/embedding_profiles.py)
+#
+#the FAQ and services documents are embedded once per dimensions setting through the local Bedrock
+#stand-in, and every profile's index is built from them: a Chroma collection for the float profiles,
+#a quantized index for int8/binary. Queries are the fixture questions plus every FAQ question.
+#For each profile this reports
+#    recall@k   overlap with the exact top k of the 1024-dim float vectors (the default profile)
+#    latency    of the search alone, given the query vector (the embedding call costs the same for every profile)
+#    memory     what the index keeps resident: the float vectors for Chroma, the codes for quantized
+#               indexes (their float vectors are memory-mapped and only read for the shortlist)
+#
+#    python -m benchmarks.embedding_profiles
+#    python -m benchmarks.embedding_profiles --scale 20 --k 10    #20 variants of each document
+
+DUMPS = ("bedrock_faqs_with_embeddings.npy", "services_with_embeddings.npy")
+
+
+def load_corpus(scale=1):
+    """Items to index: the FAQ and services documents, each repeated scale times as distinct variants."""
+
+    items = []
+
+    for dump in DUMPS:
+        dump_items, _ = read_embedding_file(os.path.join(DATA_DIR, dump))
+
+        for item in dump_items:
+            for variant in range(scale):
+                document = item['document'] if variant == 0 else f"{item['document']} (variant {variant})"
+                items.append({"id": f"{dump.split('_')[0]}-{item['id']}-{variant}", "document": document, "metadata": item['metadata']})
+
+    return items
+
+
+def load_queries():
+    with open(FIXTURES_PATH) as fixtures_file:
+        fixtures = json.load(fixtures_file)
+
+    faqs, _ = read_embedding_file(os.path.join(DATA_DIR, "bedrock_faqs_with_embeddings.npy"))
+    return fixtures["questions"] + fixtures["service_questions"] + [item['document'].strip().split("\n")[0] for item in faqs]
+
+
+def embed_all(texts, profile, workers=16):
+    bedrock = get_bedrock_client()
+
+    def embed(text):
+        response = bedrock.invoke_model(body=get_request_body(text, profile), modelId=MODEL_ID, accept="application/json", contentType="application/json")
+        return json.loads(response['body'].read())['embedding']
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return np.asarray(list(executor.map(embed, texts)), dtype=np.float32)
+
+
+def exact_top_k(matrix, queries, k):
+    distances = (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ matrix.T + (matrix ** 2).sum(axis=1)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def build_index(root, profile, items, matrix):
+    """(search(query vector, k) -> item ids, resident bytes) for the profile's index over items."""
+
+    if profile['index'] == "float":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=os.path.join(root, "chroma"))
+        collection = client.create_collection(profile['name'])
+        ingest(collection, items, matrix)
+
+        search = lambda vector, k: collection.query(query_embeddings=[vector], n_results=k, include=[])['ids'][0]
+        return search, matrix.nbytes
+
+    build_quantized_index(root, profile['name'], items, matrix, profile['index'])
+    index = QuantizedIndex(root, profile['name'], rescore=profile['rescore'])
+
+    search = lambda vector, k: index.query(query_embeddings=[vector], n_results=k)['ids'][0]
+    return search, index.get_memory_bytes()
+
+
+def run(profile_names, k=4, scale=1, repeats=20):
+    items = load_corpus(scale)
+    queries = load_queries()
+    documents = [item['document'] for item in items]
+    ids = np.array([item['id'] for item in items])
+
+    vectors = {} #one corpus and query embedding per dimensions setting, shared by the profiles that use it
+    profiles = [get_profile(name) for name in profile_names]
+    reference = get_profile("titan-v2-1024")
+
+    for profile in [reference] + profiles:
+        name = get_vectors_name(profile)
+
+        if name not in vectors:
+            print(f"embedding {len(documents)} documents and {len(queries)} queries as {name}", file=sys.stderr)
+            vectors[name] = (embed_all(documents, profile), embed_all(queries, profile))
+
+    corpus, query_vectors = vectors[get_vectors_name(reference)]
+    truth = [set(ids[row] for row in rows) for rows in exact_top_k(corpus, query_vectors, k)]
+
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="embedding-profiles-") as root:
+        for profile in profiles:
+            matrix, profile_queries = vectors[get_vectors_name(profile)]
+            search, resident_bytes = build_index(root, profile, items, matrix)
+
+            recall = np.mean([len(truth[i] & set(search(vector, k))) / k for i, vector in enumerate(profile_queries)])
+
+            calls = len(profile_queries) * repeats
+            latencies, _ = time_calls(lambda i: search(profile_queries[i % len(profile_queries)], k), calls)
+            ordered = sorted(latencies)
+
+            results[profile['name']] = {
+                "dimensions": profile['dimensions'],
+                "index": profile['index'],
+                "recall_at_k": round(float(recall), 4),
+                "latency_ms": {"p50": round(_percentile(ordered, 0.5) * 1000, 3), "p95": round(_percentile(ordered, 0.95) * 1000, 3)},
+                "resident_bytes": int(resident_bytes),
+                "bytes_per_document": round(resident_bytes / len(items), 1),
+            }
+
+            entry = results[profile['name']]
+            print(f"{profile['name']:22} recall@{k} {entry['recall_at_k']:.3f}  p50 {entry['latency_ms']['p50']:7.3f} ms  p95 {entry['latency_ms']['p95']:7.3f} ms  "
+                  f"{entry['resident_bytes'] // 1024:7} KB resident ({entry['bytes_per_document']:.0f} B/doc)", file=sys.stderr)
+
+    return {"settings": {"k": k, "scale": scale, "documents": len(items), "queries": len(queries)}, "profiles": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall, search latency and index memory across the Titan v2 embedding profiles")
+    parser.add_argument("--profile", action="append", choices=list(PROFILES), help="profiles to compare (repeatable; default: all)")
+    parser.add_argument("--k", type=int, default=4, help="results per query (the labs ask for 4)")
+    parser.add_argument("--scale", type=int, default=1, help="index this many variants of every document")
+    parser.add_argument("--repeats", type=int, default=20, help="timed passes over the queries")
+    parser.add_argument("--time-scale", type=float, default=0.0, help="stand-in latency multiplier, for the embedding calls")
+    parser.add_argument("--endpoint-url", help="use an already running stand-in instead of starting one")
+    parser.add_argument("--output", default="embedding_profiles.json")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+    process, endpoint_url = (None, args.endpoint_url) if args.endpoint_url else start_stub(args.time_scale)
+    os.environ[ENDPOINT_URL_ENV_VAR] = endpoint_url
+    clear_clients()
+
+    try:
+        results = run(args.profile or list(PROFILES), args.k, args.scale, args.repeats)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    write_results(results, args.output)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
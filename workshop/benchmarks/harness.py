@@ -0,0 +1,176 @@
+import gc
+import io
+import json
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+
+try:
+    import resource
+except ImportError: #not available on Windows
+    resource = None
+
+#timing and memory measurement shared by the benchmark scripts
+#
+#a scenario is a callable taking the iteration number. Latency and throughput come from a plain timed
+#pass; memory comes from a second, shorter pass under tracemalloc, because tracing slows every
+#allocation down and would distort the timings.
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def get_max_rss_mb(): #process high-water mark so far, or None where the platform does not report it
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) #bytes on macOS, kilobytes on Linux
+
+
+def time_calls(fn, iterations, concurrency=1):
+    latencies = [0.0] * iterations
+
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    if concurrency == 1:
+        for i in range(iterations):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+
+    return latencies, time.perf_counter() - start
+
+
+def trace_calls(fn, iterations):
+    """Peak traced memory of a single call, and blocks still allocated after all of them (a leak signal)."""
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+
+    tracemalloc.start()
+    peak = 0
+
+    try:
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            fn(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    gc.collect()
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+
+    return peak, retained_blocks
+
+
+def measure(fn, iterations=50, warmup=3, concurrency=1, memory_iterations=10, quiet=True):
+    """Run fn(i) warmup + iterations times and return throughput, latency percentiles and memory use.
+
+    Latencies are in milliseconds. quiet swallows anything the libs print while they run.
+    """
+
+    with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        for i in range(warmup): #first calls pay for imports, client creation and opening the vector store
+            fn(i)
+
+        latencies, elapsed = time_calls(fn, iterations, concurrency)
+        peak_bytes, retained_blocks = trace_calls(fn, memory_iterations) if memory_iterations else (None, None)
+
+    ordered = sorted(latencies)
+
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "throughput_per_s": round(iterations / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2),
+        },
+        "memory": {
+            "peak_traced_kb": round(peak_bytes / 1024, 1) if peak_bytes is not None else None,
+            "retained_blocks_per_call": round(retained_blocks / memory_iterations, 1) if memory_iterations else None,
+            "max_rss_mb": get_max_rss_mb(),
+        },
+    }
+
+
+#diffable results
+
+def write_results(results, file_path):
+    with open(file_path, "w") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True) #stable key order so runs diff cleanly
+        results_file.write("\n")
+
+
+def load_results(file_path):
+    with open(file_path) as results_file:
+        return json.load(results_file)
+
+
+#(metric path, True if higher is better)
+COMPARED_METRICS = (
+    (("throughput_per_s",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("memory", "peak_traced_kb"), False),
+)
+
+
+def _lookup(result, path):
+    for key in path:
+        result = (result or {}).get(key)
+
+    return result
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """Relative change of each compared metric per scenario, and the ones that got worse by more than threshold."""
+
+    rows = []
+    regressions = []
+
+    for scenario in sorted(current["scenarios"]):
+        if scenario not in baseline["scenarios"]:
+            continue
+
+        for path, higher_is_better in COMPARED_METRICS:
+            before = _lookup(baseline["scenarios"][scenario], path)
+            after = _lookup(current["scenarios"][scenario], path)
+
+            if not before or after is None:
+                continue
+
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            row = (scenario, ".".join(path), before, after, change)
+            rows.append(row)
+
+            if worse > threshold:
+                regressions.append(row)
+
+    return rows, regressions
+
+
+def format_comparison(rows):
+    lines = [f"{'scenario':45} {'metric':22} {'baseline':>12} {'current':>12} {'change':>8}"]
+
+    for scenario, metric, before, after, change in rows:
+        lines.append(f"{scenario:45} {metric:22} {before:12.2f} {after:12.2f} {change:+8.1%}")
+
+    return "\n".join(lines)
@@ -0,0 +1,136 @@
+import argparse, os, sys, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+os.environ.setdefault("BEDROCK_QUERY_CACHE_SIZE", "0") #every timed query pays for its embedding, as a new question would
+from common.clients import ENDPOINT_URL_ENV_VAR, clear_clients, get_session
+from common.embedding_file import read_embedding_file
+from common.embedding_profiles import get_embedding_function, get_profile
+from common.ingest import ingest
+from common.lexical_index import BM25Index, HybridCollection, build_bm25_index
+from benchmarks.embedding_profiles import embed_all
+from benchmarks.harness import _percentile, time_calls, write_results
+from benchmarks.lib_benchmarks import DATA_DIR, start_stub
+
+#recall@k and latency of hybrid (BM25 + vector, common/lexical_index.py) against vector-only and BM25-only search
+#
+#the FAQ and services documents are embedded through the local Bedrock stand-in and indexed both
+#ways. Three labelled query sets:
+#    names       each service's name, e.g. "Amazon Athena"; relevant: that service
+#    models      model and provider names, e.g. "Jurassic-2 Ultra"; relevant: the FAQs that mention them
+#    questions   each FAQ's question; relevant: that FAQ
+#recall@k is the share of a query's relevant documents in its top k (at most k of them count).
+#Latency includes embedding the query; pass --time-scale 1 for the stand-in's realistic latency,
+#which the keyword search runs alongside in hybrid mode.
+#
+#    python -m benchmarks.hybrid_search
+#    python -m benchmarks.hybrid_search --time-scale 1 --k 2
+
+MODEL_QUERIES = { #query -> text an FAQ has to contain to be relevant
+    "Jurassic-2 Ultra": "jurassic",
+    "Titan": "titan",
+    "Claude": "claude",
+    "Llama 2": "llama",
+    "Mistral": "mistral",
+    "Cohere Command": "cohere",
+    "Stable Diffusion": "stable diffusion",
+    "AI21 Labs": "ai21",
+}
+
+
+def load_query_sets():
+    services, _ = read_embedding_file(os.path.join(DATA_DIR, "services_with_embeddings.npy"))
+    faqs, _ = read_embedding_file(os.path.join(DATA_DIR, "bedrock_faqs_with_embeddings.npy"))
+
+    return {
+        "names": ("services", [(item['metadata']['name'], {str(item['id'])}) for item in services]),
+        "models": ("faqs", [(query, {str(item['id']) for item in faqs if term in item['document'].lower()}) for query, term in MODEL_QUERIES.items()]),
+        "questions": ("faqs", [(item['document'].strip().split("\n")[0], {str(item['id'])}) for item in faqs]),
+    }
+
+
+def build_searches(root, profile):
+    """{corpus: {mode: search(question, k) -> ids}} over the FAQ and services documents."""
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=os.path.join(root, "chroma"))
+    embedding_function = get_embedding_function(get_session(), profile)
+    searches = {}
+
+    for corpus, dump in (("faqs", "bedrock_faqs_with_embeddings.npy"), ("services", "services_with_embeddings.npy")):
+        items, _ = read_embedding_file(os.path.join(DATA_DIR, dump))
+        print(f"embedding {len(items)} {corpus} documents", file=sys.stderr)
+
+        collection = client.create_collection(f"{corpus}_collection", embedding_function=embedding_function)
+        ingest(collection, items, embed_all([item['document'] for item in items], profile))
+
+        build_bm25_index(root, corpus, items)
+        bm25_index = BM25Index(root, corpus)
+        hybrid = HybridCollection(collection, bm25_index)
+
+        searches[corpus] = {
+            "vector": lambda question, k, collection=collection: collection.query(query_texts=[question], n_results=k)['ids'][0],
+            "bm25": lambda question, k, bm25_index=bm25_index: bm25_index.search(question, k)[0],
+            "hybrid": lambda question, k, hybrid=hybrid: hybrid.query(query_texts=[question], n_results=k)['ids'][0],
+        }
+
+    return searches
+
+
+def run(k=4, repeats=3):
+    profile = get_profile()
+    query_sets = load_query_sets()
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="hybrid-search-") as root:
+        searches = build_searches(root, profile)
+
+        for set_name, (corpus, queries) in query_sets.items():
+            results[set_name] = {}
+
+            for mode, search in searches[corpus].items():
+                recall = sum(len(relevant & set(search(query, k))) / min(k, len(relevant)) for query, relevant in queries) / len(queries)
+
+                latencies, _ = time_calls(lambda i: search(queries[i % len(queries)][0], k), len(queries) * repeats)
+                ordered = sorted(latencies)
+
+                entry = results[set_name][mode] = {
+                    "recall_at_k": round(recall, 4),
+                    "latency_ms": {"p50": round(_percentile(ordered, 0.5) * 1000, 3), "p95": round(_percentile(ordered, 0.95) * 1000, 3)},
+                }
+
+                print(f"{set_name:10} {mode:7} recall@{k} {entry['recall_at_k']:.3f}  p50 {entry['latency_ms']['p50']:7.3f} ms  "
+                      f"p95 {entry['latency_ms']['p95']:7.3f} ms  ({len(queries)} queries)", file=sys.stderr)
+
+    return {"settings": {"k": k, "profile": profile['name']}, "query_sets": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hybrid BM25 + vector search with vector-only and BM25-only search")
+    parser.add_argument("--k", type=int, default=4, help="results per query (the labs ask for 4)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes over each query set")
+    parser.add_argument("--time-scale", type=float, default=0.0, help="stand-in latency multiplier, for the query embedding calls")
+    parser.add_argument("--endpoint-url", help="use an already running stand-in instead of starting one")
+    parser.add_argument("--output", default="hybrid_search.json")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+    process, endpoint_url = (None, args.endpoint_url) if args.endpoint_url else start_stub(args.time_scale)
+    os.environ[ENDPOINT_URL_ENV_VAR] = endpoint_url
+    clear_clients()
+
+    try:
+        results = run(args.k, args.repeats)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    write_results(results, args.output)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
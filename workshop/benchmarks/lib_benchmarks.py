@@ -0,0 +1,291 @@
+import argparse, importlib, json, os, platform, subprocess, sys, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.clients import ENDPOINT_URL_ENV_VAR, clear_clients, get_session
+from common.embedding_file import read_embedding_file
+from common.ingest import ingest
+from benchmarks.harness import measure, write_results, load_results, compare_results, format_comparison
+
+#benchmarks the completed labs' lib functions end to end against the local Bedrock stand-in
+#
+#each scenario calls a real lib function with recorded inputs from fixtures.json, from inside a
+#scratch copy of the lab folder so the libs' relative paths ("../../data/chroma", "images/...")
+#resolve to a throwaway vector store built from the *_with_embeddings.npy dumps. The stand-in runs
+#in its own process so its threads do not show up in the timings or the memory traces.
+#
+#results are written as sorted JSON, so two runs can be diffed directly or with --compare:
+#
+#    python -m benchmarks.lib_benchmarks --output baseline.json
+#    python -m benchmarks.lib_benchmarks --output current.json --compare baseline.json
+#
+#--time-scale 0 (the default) turns the stand-in's simulated model latency off, which isolates the
+#client-side cost of the libs; --time-scale 1 gives realistic end-to-end numbers.
+
+WORKSHOP_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DATA_DIR = os.path.join(WORKSHOP_DIR, "data")
+COMPLETED_DIR = os.path.join(WORKSHOP_DIR, "completed")
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures.json")
+
+TEXT_COLLECTIONS = {"bedrock_faqs_collection": "bedrock_faqs_with_embeddings.npy", "services_collection": "services_with_embeddings.npy"}
+IMAGE_COLLECTIONS = {"images_collection": "images_with_embeddings.npy"}
+
+
+#scenarios: each takes the imported lib and the fixtures and returns fn(i) for the harness
+
+def read_file(file_path): #fixture images are read once, up front, like an uploaded file would be
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def rag_response(lib, fixtures):
+    questions = fixtures["questions"]
+    return lambda i: lib.get_rag_response(questions[i % len(questions)])
+
+
+def rag_chat(lib, fixtures):
+    turns = fixtures["chat_turns"]
+    return lambda i: lib.chat_with_model([], turns[i % len(turns)]) #a fresh conversation, so every call takes the tool (RAG) path
+
+
+def embeddings_search(lib, fixtures):
+    questions = fixtures["questions"]
+    return lambda i: lib.get_similarity_search_results(questions[i % len(questions)])
+
+
+def image_search(lib, fixtures):
+    terms = fixtures["image_search_terms"]
+    images = [read_file(path) for path in fixtures["image_search_files"]]
+
+    def search(i): #alternate text-only and image-only queries
+        if i % 2 == 0:
+            return lib.get_similarity_search_results(search_term=terms[(i // 2) % len(terms)])
+
+        return lib.get_similarity_search_results(search_image=images[(i // 2) % len(images)])
+
+    return search
+
+
+def recommendations(lib, fixtures):
+    questions = fixtures["service_questions"]
+    return lambda i: lib.get_similarity_search_results(questions[i % len(questions)])
+
+
+def csv_response(lib, fixtures):
+    emails = fixtures["emails"]
+    return lambda i: lib.get_csv_response(emails[i % len(emails)])
+
+
+def image_prompts(lib, fixtures):
+    prompts = fixtures["image_prompts"]
+    return lambda i: lib.get_image_from_model(prompts[i % len(prompts)], negative_prompt="blurry")
+
+
+def image_background(lib, fixtures):
+    edit = fixtures["image_edits"]["image_background"]
+    image = read_file(edit["image"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], image, mask_prompt=edit["mask_prompt"])
+
+
+def image_extension(lib, fixtures):
+    edit = fixtures["image_edits"]["image_extension"]
+    image = read_file(edit["image"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], image)
+
+
+def image_insertion(lib, fixtures):
+    edit = fixtures["image_edits"]["image_insertion"]
+    image = read_file(edit["image"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], image, insertion_position=tuple(edit["position"]), insertion_dimensions=tuple(edit["dimensions"]))
+
+
+def image_masking(lib, fixtures):
+    edit = fixtures["image_edits"]["image_masking"]
+    image, mask = read_file(edit["image"]), read_file(edit["mask"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], image, "INPAINTING", "Image", mask_bytes=mask)
+
+
+def image_replacement(lib, fixtures):
+    edit = fixtures["image_edits"]["image_replacement"]
+    image = read_file(edit["image"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], image, mask_prompt=edit["mask_prompt"])
+
+
+def image_style_mixing(lib, fixtures):
+    edit = fixtures["image_edits"]["image_style_mixing"]
+    image1, image2 = (read_file(path) for path in edit["images"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], edit["similarity_strength"], image1, image2)
+
+
+def image_variation(lib, fixtures):
+    edit = fixtures["image_edits"]["image_variation"]
+    image = read_file(edit["image"])
+    return lambda i: lib.get_image_from_model(edit["prompt"], edit["similarity_strength"], image)
+
+
+#(scenario name, lab folder, lib module, scenario function)
+SCENARIOS = [
+    ("rag.get_rag_response", "rag", "rag_lib", rag_response),
+    ("rag_chatbot.chat_with_model", "rag_chatbot", "rag_chatbot_lib", rag_chat),
+    ("embeddings_search.get_similarity_search_results", "embeddings_search", "embeddings_search_lib", embeddings_search),
+    ("image_search.get_similarity_search_results", "image_search", "image_search_lib", image_search),
+    ("recommendations.get_similarity_search_results", "recommendations", "recommendations_lib", recommendations),
+    ("csv.get_csv_response", "csv", "csv_lib", csv_response),
+    ("image_prompts.get_image_from_model", "image_prompts", "image_prompts_lib", image_prompts),
+    ("image_background.get_image_from_model", "image_background", "image_background_lib", image_background),
+    ("image_extension.get_image_from_model", "image_extension", "image_extension_lib", image_extension),
+    ("image_insertion.get_image_from_model", "image_insertion", "image_insertion_lib", image_insertion),
+    ("image_masking.get_image_from_model", "image_masking", "image_masking_lib", image_masking),
+    ("image_replacement.get_image_from_model", "image_replacement", "image_replacement_lib", image_replacement),
+    ("image_style_mixing.get_image_from_model", "image_style_mixing", "image_style_mixing_lib", image_style_mixing),
+    ("image_variation.get_image_from_model", "image_variation", "image_variation_lib", image_variation),
+]
+
+
+#environment
+
+def start_stub(time_scale):
+    """Start the Bedrock stand-in in a child process on a free port and return (process, url)."""
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "common.bedrock_stub", "--port", "0", "--time-scale", str(time_scale)],
+        cwd=WORKSHOP_DIR, stdout=subprocess.PIPE, text=True,
+    )
+
+    line = process.stdout.readline() #"Bedrock stand-in listening on http://127.0.0.1:<port>"
+
+    if "listening on " not in line:
+        process.kill()
+        raise RuntimeError(f"Bedrock stand-in failed to start: {line!r}")
+
+    return process, line.strip().split("listening on ")[1]
+
+
+def build_vector_store(root):
+    """Populate <root>/data/chroma with the collections the labs query, straight from the embedding dumps."""
+
+    import chromadb
+    from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction
+
+    client = chromadb.PersistentClient(path=os.path.join(root, "data", "chroma"))
+    embedding_function = AmazonBedrockEmbeddingFunction(session=get_session(), region_name='us-west-2', model_name="amazon.titan-embed-text-v2:0")
+
+    collections = [(name, source, embedding_function) for name, source in TEXT_COLLECTIONS.items()]
+    collections += [(name, source, None) for name, source in IMAGE_COLLECTIONS.items()]
+
+    for name, source, function in collections:
+        collection = client.get_or_create_collection(name, embedding_function=function)
+
+        items, embeddings = read_embedding_file(os.path.join(DATA_DIR, source))
+        ingest(collection, items, embeddings)
+
+
+def prepare_lab(root, lab): #a scratch lab folder two levels below root, sharing the lab's images
+    lab_dir = os.path.join(root, "completed", lab)
+    os.makedirs(lab_dir, exist_ok=True)
+
+    images_dir = os.path.join(COMPLETED_DIR, lab, "images")
+
+    if os.path.isdir(images_dir) and not os.path.exists(os.path.join(lab_dir, "images")):
+        os.symlink(images_dir, os.path.join(lab_dir, "images"))
+
+    return lab_dir
+
+
+def load_lib(lab, module_name):
+    lab_path = os.path.join(COMPLETED_DIR, lab)
+
+    if lab_path not in sys.path:
+        sys.path.insert(0, lab_path)
+
+    return importlib.import_module(module_name)
+
+
+def run(scenarios, iterations=50, warmup=3, concurrency=1, memory_iterations=10, time_scale=0.0, endpoint_url=None):
+    with open(FIXTURES_PATH) as fixtures_file:
+        fixtures = json.load(fixtures_file)
+
+    #the stand-in never checks signatures, but botocore still needs credentials and a region to sign with
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+    process = None
+
+    if endpoint_url is None:
+        process, endpoint_url = start_stub(time_scale)
+
+    os.environ[ENDPOINT_URL_ENV_VAR] = endpoint_url
+    clear_clients()
+
+    original_dir = os.getcwd()
+    results = {}
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="lib-benchmarks-") as root:
+            build_vector_store(root)
+
+            for name, lab, module_name, scenario in scenarios:
+                os.chdir(prepare_lab(root, lab))
+
+                try:
+                    fn = scenario(load_lib(lab, module_name), fixtures)
+                    results[name] = measure(fn, iterations=iterations, warmup=warmup, concurrency=concurrency, memory_iterations=memory_iterations)
+                finally:
+                    os.chdir(original_dir)
+
+                print(f"{name:55} {results[name]['throughput_per_s']:9.1f}/s  p50 {results[name]['latency_ms']['p50']:9.2f} ms  p95 {results[name]['latency_ms']['p95']:9.2f} ms  p99 {results[name]['latency_ms']['p99']:9.2f} ms", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    return {
+        "settings": {
+            "iterations": iterations,
+            "warmup": warmup,
+            "concurrency": concurrency,
+            "memory_iterations": memory_iterations,
+            "time_scale": time_scale if process is not None else None, #unknown for an external endpoint
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the completed labs' lib functions against the local Bedrock stand-in")
+    parser.add_argument("--only", action="append", help="run only scenarios whose name contains this text (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the scenarios and exit")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1, help="threads calling the lib at once during the timed pass")
+    parser.add_argument("--memory-iterations", type=int, default=10, help="calls traced for memory use (0 skips tracing)")
+    parser.add_argument("--time-scale", type=float, default=0.0, help="stand-in latency multiplier (0 disables simulated latency)")
+    parser.add_argument("--endpoint-url", help="use an already running stand-in instead of starting one")
+    parser.add_argument("--output", default="lib_benchmarks.json", help="where to write the results")
+    parser.add_argument("--compare", help="baseline results file; exit with status 1 if any metric regressed")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if not args.only or any(text in s[0] for text in args.only)]
+
+    if args.list:
+        for scenario in scenarios:
+            print(scenario[0])
+        return
+
+    results = run(scenarios, args.iterations, args.warmup, args.concurrency, args.memory_iterations, args.time_scale, args.endpoint_url)
+    write_results(results, args.output)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        rows, regressions = compare_results(load_results(args.compare), results, args.threshold)
+        print(format_comparison(rows))
+
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+            print(format_comparison(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse, json, os, subprocess, sys, tempfile, time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+import numpy as np
+from common.embedding_file import read_embedding_file, write_embedding_file
+from common.vector_store import STORES, NumpyStore, open_vector_store
+from benchmarks.harness import _percentile, time_calls, write_results
+from benchmarks.lib_benchmarks import DATA_DIR
+
+#load time, query latency, recall and memory of the vector stores (common/vector_store.py) against Chroma
+#
+#the corpus is the FAQ and services dumps, each vector repeated scale times with a little noise so
+#larger corpora keep the same structure; queries are corpus vectors with more noise. No Bedrock
+#calls are made: the stores are compared on the search alone. Each store is measured in a fresh
+#process so its load time and resident memory are not flattered by the others:
+#    load      Chroma: open the persisted database and run the first query (which loads its HNSW
+#              index); in-memory stores: read the dump and build the index
+#    latency   one query for k results, with documents and metadata, as the libs ask for them
+#    recall@k  overlap with the exact top k
+#    memory    growth of the process's resident set over the load, importing chromadb or faiss included
+#
+#    python -m benchmarks.vector_stores
+#    python -m benchmarks.vector_stores --scale 100 --store chroma --store faiss-hnsw
+
+DUMPS = ("bedrock_faqs_with_embeddings.npy", "services_with_embeddings.npy")
+
+
+def get_rss_mb(): #current resident set size, or None where /proc is not available
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def normalize_rows(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+def write_corpus(root, scale=1, queries=200, k=4, seed=0):
+    """Write the corpus dump, the queries and their exact top k under root; returns the corpus items and vectors."""
+
+    rng = np.random.default_rng(seed)
+    items, vectors = [], []
+
+    for dump in DUMPS:
+        dump_items, matrix = read_embedding_file(os.path.join(DATA_DIR, dump))
+
+        for variant in range(scale):
+            noisy = matrix if variant == 0 else normalize_rows(matrix + rng.normal(0, 0.01, matrix.shape))
+            vectors.append(np.asarray(noisy, dtype=np.float32))
+            items.extend({"id": f"{dump.split('_')[0]}-{item['id']}-{variant}", "document": item['document'], "metadata": item['metadata']} for item in dump_items)
+
+    matrix = np.concatenate(vectors)
+    write_embedding_file(os.path.join(root, "corpus"), items, matrix)
+
+    query_matrix = normalize_rows(matrix[rng.integers(0, len(matrix), queries)] + rng.normal(0, 0.03, (queries, matrix.shape[1])))
+    np.save(os.path.join(root, "queries.npy"), query_matrix)
+
+    rows, _ = NumpyStore(items, matrix).search(query_matrix, k)
+
+    with open(os.path.join(root, "truth.json"), "w") as truth_file:
+        json.dump([[items[row]["id"] for row in query_rows] for query_rows in rows], truth_file)
+
+    return items, matrix
+
+
+def write_chroma(root, items, matrix):
+    import chromadb
+    from common.ingest import ingest
+
+    client = chromadb.PersistentClient(path=os.path.join(root, "chroma"))
+    ingest(client.create_collection("corpus"), items, matrix)
+
+
+def measure_store(store, root, k=4, repeats=5):
+    """Run in a fresh process: load the store, then time its queries."""
+
+    query_matrix = np.load(os.path.join(root, "queries.npy"))
+
+    with open(os.path.join(root, "truth.json")) as truth_file:
+        truth = [set(ids) for ids in json.load(truth_file)]
+
+    rss_before = get_rss_mb()
+    started = time.perf_counter()
+
+    if store == "chroma":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=os.path.join(root, "chroma")).get_collection("corpus")
+    else:
+        collection = open_vector_store(os.path.join(root, "corpus.npy"), store)
+
+    collection.query(query_embeddings=[query_matrix[0]], n_results=k)
+    load_seconds = time.perf_counter() - started
+    rss_after = get_rss_mb()
+
+    recall = np.mean([len(truth[i] & set(collection.query(query_embeddings=[vector], n_results=k)["ids"][0])) / k for i, vector in enumerate(query_matrix)])
+
+    latencies, _ = time_calls(lambda i: collection.query(query_embeddings=[query_matrix[i % len(query_matrix)]], n_results=k), len(query_matrix) * repeats)
+    ordered = sorted(latencies)
+
+    return {
+        "load_ms": round(load_seconds * 1000, 1),
+        "latency_ms": {"p50": round(_percentile(ordered, 0.5) * 1000, 3), "p95": round(_percentile(ordered, 0.95) * 1000, 3)},
+        "recall_at_k": round(float(recall), 4),
+        "memory_mb": None if rss_before is None else round(rss_after - rss_before, 1),
+    }
+
+
+def run(stores, k=4, scale=1, queries=200, repeats=5):
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="vector-stores-") as root:
+        items, matrix = write_corpus(root, scale, queries, k)
+        print(f"{len(items)} documents of {matrix.shape[1]} dimensions, {queries} queries", file=sys.stderr)
+
+        if "chroma" in stores:
+            write_chroma(root, items, matrix)
+
+        for store in stores:
+            output = subprocess.run([sys.executable, "-m", "benchmarks.vector_stores", "--measure", store, "--root", root, "--k", str(k), "--repeats", str(repeats)],
+                                    cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."), capture_output=True, text=True, check=True).stdout
+            entry = results[store] = json.loads(output)
+
+            print(f"{store:12} load {entry['load_ms']:8.1f} ms  p50 {entry['latency_ms']['p50']:7.3f} ms  p95 {entry['latency_ms']['p95']:7.3f} ms  "
+                  f"recall@{k} {entry['recall_at_k']:.3f}  +{entry['memory_mb']} MB resident", file=sys.stderr)
+
+    return {"settings": {"k": k, "scale": scale, "documents": len(items), "queries": queries}, "stores": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the in-memory vector stores with Chroma: load time, query latency, recall and memory")
+    parser.add_argument("--store", action="append", choices=list(STORES), help="stores to compare (repeatable; default: all)")
+    parser.add_argument("--k", type=int, default=4, help="results per query (the labs ask for 4)")
+    parser.add_argument("--scale", type=int, default=1, help="index this many noisy copies of every vector")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5, help="timed passes over the queries")
+    parser.add_argument("--output", default="vector_stores.json")
+    parser.add_argument("--measure", choices=list(STORES), help=argparse.SUPPRESS) #internal: measure one store in this process
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_store(args.measure, args.root, args.k, args.repeats)))
+        return
+
+    results = run(args.store or list(STORES), args.k, args.scale, args.queries, args.repeats)
+
+    write_results(results, args.output)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
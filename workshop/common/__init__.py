@@ -0,0 +1,4 @@
+#shared helpers used by the completed labs and the data scripts
+#
+#the labs are run from their own directory (e.g. `cd completed/rag; streamlit run rag_app.py`),
+#so each lib adds the workshop folder to sys.path before importing from this package
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from common.clients import get_bedrock_client
+
+#asyncio facade over the shared bedrock-runtime client
+#
+#boto3 has no native asyncio support, so the blocking calls run on a dedicated thread pool sized to
+#the concurrency limit. The event loop never blocks, and a semaphore bounds how many requests are in
+#flight. Every in-flight request (or open stream) still occupies one executor thread and one pooled
+#connection, so max_concurrency is a thread count: callers beyond it wait on the semaphore, they do
+#not get cheap extra fan-out.
+#
+#    bedrock = AsyncBedrock(region_name='us-west-2', max_concurrency=32)
+#    response = await bedrock.converse(modelId=..., messages=[...])
+#    async with contextlib.aclosing(bedrock.converse_stream(modelId=..., messages=[...])) as stream:
+#        async for event in stream:
+#            ...
+#    response = await bedrock.invoke_model(body=..., modelId=...)
+#
+#wrap converse_stream in contextlib.aclosing() whenever the loop may stop early (break, return, an
+#exception): an abandoned async generator only releases its slot and closes its stream when it is
+#garbage-collected.
+
+_STREAM_DONE = object()
+
+
+class AsyncBedrock():
+    def __init__(self, region_name=None, max_concurrency=64, client=None):
+        self.max_concurrency = max_concurrency
+        self._client = client or get_bedrock_client(region_name=region_name, max_pool_connections=max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="async-bedrock")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, fn, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, **kwargs))
+
+    async def converse(self, **kwargs): #same arguments and return value as client.converse
+        async with self._semaphore:
+            return await self._run(self._client.converse, **kwargs)
+
+    async def invoke_model(self, **kwargs): #same as client.invoke_model, with the body already read off the socket
+        async with self._semaphore:
+            return await self._run(self._invoke_model_and_read, **kwargs)
+
+    def _invoke_model_and_read(self, **kwargs):
+        response = self._client.invoke_model(**kwargs)
+        response['body'] = BytesIO(response['body'].read()) #keep the response.get('body').read() shape without blocking the loop
+        return response
+
+    async def converse_stream(self, **kwargs):
+        """Async iterator over the same events as client.converse_stream()['stream'].
+
+        Use it under contextlib.aclosing() so an early exit closes the stream and frees the slot at once.
+        """
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            response = await self._run(self._client.converse_stream, **kwargs)
+            stream = response['stream']
+            queue = asyncio.Queue()
+
+            def put(item):
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                except RuntimeError: #the loop is already closed, nobody is listening
+                    pass
+
+            stop = threading.Event()
+
+            def pump(): #read events on a worker thread and hand them to the loop as they arrive
+                try:
+                    for event in stream:
+                        if stop.is_set(): #the consumer stopped iterating
+                            break
+
+                        put((event, None))
+                except Exception as e:
+                    if not stop.is_set(): #otherwise the stream was closed under us on purpose
+                        put((None, e))
+                finally:
+                    stream.close()
+                    put((_STREAM_DONE, None))
+
+            pumping = loop.run_in_executor(self._executor, pump)
+
+            try:
+                while True:
+                    event, error = await queue.get()
+
+                    if error is not None:
+                        raise error
+
+                    if event is _STREAM_DONE:
+                        break
+
+                    yield event
+            finally:
+                if not pumping.done():
+                    stop.set()
+                    stream.close() #the pump may be blocked waiting for the next event; closing the connection wakes it
+
+                await pumping #hold the semaphore slot until the pump has let go of the stream
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
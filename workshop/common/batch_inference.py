@@ -0,0 +1,223 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from common.clients import get_bedrock_client, get_client
+
+#Bedrock batch inference for bulk jobs
+#
+#instead of one converse call per item, the requests are written as JSONL records
+#({"recordId": ..., "modelInput": <InvokeModel body>}) to S3, a model invocation job runs them
+#asynchronously at the batch price, and the results are read back from the job's output
+#(<output uri>/<job id>/<input file>.out, one {"recordId", "modelInput", "modelOutput" | "error"} per line).
+#
+#needs an S3 location and a service role that Bedrock can assume to read and write it:
+#
+#    BEDROCK_BATCH_S3_URI=s3://my-bucket/batch BEDROCK_BATCH_ROLE_ARN=arn:aws:iam::123456789012:role/BedrockBatch
+#
+#Bedrock only accepts jobs with at least MIN_RECORDS records, so BatchJob.submit refuses smaller ones
+#up front and run_batch sends them as plain InvokeModel calls instead (they are cheap enough anyway).
+#common/batch_stub.py stands in for S3 and the job APIs offline.
+
+S3_URI_ENV_VAR = "BEDROCK_BATCH_S3_URI"
+ROLE_ARN_ENV_VAR = "BEDROCK_BATCH_ROLE_ARN"
+
+TERMINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+SUCCESS_STATUSES = ("Completed", "PartiallyCompleted")
+
+MIN_RECORDS = 100
+DIRECT_WORKERS = 8 #concurrent InvokeModel calls for workloads too small for a job
+
+
+class BatchJobError(Exception):
+    pass
+
+
+def split_s3_uri(s3_uri): #s3://bucket/some/prefix -> ("bucket", "some/prefix")
+    if not s3_uri.startswith("s3://"):
+        raise ValueError(f"Expected an s3:// URI, got {s3_uri!r}")
+
+    bucket, _, key = s3_uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def to_jsonl(records): #[(record id, model input)] -> JSONL bytes in the batch inference record format
+    return "".join(json.dumps({"recordId": record_id, "modelInput": model_input}) + "\n" for record_id, model_input in records).encode("utf-8")
+
+
+class BatchJob():
+    """One model invocation job: upload the records, submit, poll, then stream the results back."""
+
+    def __init__(self, model_id, s3_uri=None, role_arn=None, region_name=None, job_name=None):
+        self.model_id = model_id
+        self.s3_uri = (s3_uri or os.environ.get(S3_URI_ENV_VAR) or "").rstrip("/")
+        self.role_arn = role_arn or os.environ.get(ROLE_ARN_ENV_VAR)
+        self.job_name = job_name or f"workshop-batch-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.job_arn = None
+        self.status = None
+
+        if not self.s3_uri or not self.role_arn:
+            raise BatchJobError(f"Batch inference needs an S3 location and a service role: set {S3_URI_ENV_VAR} and {ROLE_ARN_ENV_VAR}")
+
+        self.bucket, prefix = split_s3_uri(self.s3_uri)
+        self.prefix = f"{prefix}/{self.job_name}" if prefix else self.job_name
+
+        self._bedrock = get_client("bedrock", region_name=region_name) #the control plane, not bedrock-runtime
+        self._s3 = get_client("s3", region_name=region_name)
+
+    @property
+    def input_key(self):
+        return f"{self.prefix}/input/records.jsonl"
+
+    @property
+    def output_uri(self):
+        return f"s3://{self.bucket}/{self.prefix}/output/"
+
+    def submit(self, records):
+        """Upload [(record id, InvokeModel body)] and start the job; returns the job ARN."""
+
+        records = list(records)
+
+        if len(records) < MIN_RECORDS:
+            raise BatchJobError(f"Bedrock batch jobs need at least {MIN_RECORDS} records, got {len(records)}; use run_batch or plain InvokeModel calls")
+
+        self._s3.put_object(Bucket=self.bucket, Key=self.input_key, Body=to_jsonl(records))
+
+        response = self._bedrock.create_model_invocation_job(
+            jobName=self.job_name,
+            roleArn=self.role_arn,
+            modelId=self.model_id,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{self.bucket}/{self.input_key}", "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": self.output_uri}},
+        )
+
+        self.job_arn = response["jobArn"]
+        self.status = "Submitted"
+        return self.job_arn
+
+    def get_job(self):
+        job = self._bedrock.get_model_invocation_job(jobIdentifier=self.job_arn)
+        self.status = job["status"]
+        return job
+
+    def wait(self, poll_seconds=30.0, timeout_seconds=None):
+        """Poll until the job finishes; raises BatchJobError if it failed, was stopped or timed out."""
+
+        started = time.monotonic()
+
+        while True:
+            job = self.get_job()
+
+            if job["status"] in TERMINAL_STATUSES:
+                break
+
+            if timeout_seconds is not None and time.monotonic() - started > timeout_seconds:
+                raise BatchJobError(f"Batch job {self.job_arn} still {job['status']} after {timeout_seconds} seconds")
+
+            time.sleep(poll_seconds)
+
+        if job["status"] not in SUCCESS_STATUSES:
+            raise BatchJobError(f"Batch job {self.job_arn} ended {job['status']}: {job.get('message', '')}")
+
+        return job
+
+    def stop(self):
+        self._bedrock.stop_model_invocation_job(jobIdentifier=self.job_arn)
+
+    def iter_results(self):
+        """Yield (record id, model output, error) from the job's output files, one line at a time."""
+
+        job_id = self.job_arn.rsplit("/", 1)[1]
+        paginator = self._s3.get_paginator("list_objects_v2")
+        output_prefix = split_s3_uri(self.output_uri)[1] + job_id + "/"
+
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=output_prefix):
+            for entry in page.get("Contents", []):
+                if not entry["Key"].endswith(".jsonl.out"): #skip manifest.json.out
+                    continue
+
+                body = self._s3.get_object(Bucket=self.bucket, Key=entry["Key"])["Body"]
+
+                for line in body.iter_lines():
+                    if line.strip():
+                        record = json.loads(line)
+                        yield record.get("recordId"), record.get("modelOutput"), record.get("error")
+
+
+def invoke_directly(model_id, model_inputs, region_name=None): #[(model output, error)] from one InvokeModel call per input
+    bedrock = get_bedrock_client(region_name=region_name)
+
+    def invoke(model_input):
+        try:
+            response = bedrock.invoke_model(modelId=model_id, body=json.dumps(model_input), accept="application/json", contentType="application/json")
+            return json.loads(response["body"].read()), None
+        except Exception as e: #same shape as a failed batch record, so one bad input does not sink the rest
+            return None, {"errorMessage": str(e)}
+
+    with ThreadPoolExecutor(max_workers=DIRECT_WORKERS) as executor:
+        return list(executor.map(invoke, model_inputs))
+
+
+def run_batch(model_id, model_inputs, poll_seconds=30.0, timeout_seconds=None, **job_args):
+    """Run a list of InvokeModel bodies as one batch job and return [(model output, error)] in input order.
+
+    Fewer than MIN_RECORDS inputs are sent as plain InvokeModel calls, since Bedrock would reject the job.
+    """
+
+    if len(model_inputs) < MIN_RECORDS:
+        return invoke_directly(model_id, model_inputs, job_args.get("region_name"))
+
+    job = BatchJob(model_id, **job_args)
+    width = len(str(len(model_inputs)))
+    job.submit([(str(i).zfill(width), model_input) for i, model_input in enumerate(model_inputs)]) #record ids only need to be unique within the file
+    job.wait(poll_seconds, timeout_seconds)
+
+    results = [(None, {"errorMessage": "No result returned for this record."})] * len(model_inputs)
+
+    for record_id, model_output, error in job.iter_results():
+        try:
+            row = int(record_id)
+        except (TypeError, ValueError): #no usable recordId: its record keeps the placeholder error
+            continue
+
+        if 0 <= row < len(results):
+            results[row] = (model_output, error)
+
+    return results
+
+
+#converse-style requests as Anthropic InvokeModel bodies, which is what batch records carry
+
+def to_anthropic_request(messages, inference_config=None, tool_config=None, system=None):
+    inference_config = inference_config or {}
+
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": inference_config.get("maxTokens", 2000),
+        "messages": [{"role": m["role"], "content": [{"type": "text", "text": block["text"]} for block in m["content"]]} for m in messages],
+    }
+
+    if "temperature" in inference_config:
+        body["temperature"] = inference_config["temperature"]
+
+    if system:
+        body["system"] = "\n".join(block["text"] for block in system)
+
+    if tool_config:
+        body["tools"] = [{"name": tool["toolSpec"]["name"], "description": tool["toolSpec"].get("description", ""), "input_schema": tool["toolSpec"]["inputSchema"]["json"]}
+                         for tool in tool_config["tools"]]
+
+        choice = tool_config.get("toolChoice", {})
+
+        if "tool" in choice:
+            body["tool_choice"] = {"type": "tool", "name": choice["tool"]["name"]}
+        elif "any" in choice:
+            body["tool_choice"] = {"type": "any"}
+
+    return body
+
+
+def get_tool_input(model_output, tool_name): #the input the model passed to tool_name, or None
+    block = next((b for b in (model_output or {}).get("content", []) if b.get("type") == "tool_use" and b.get("name") == tool_name), None)
+    return block["input"] if block else None
@@ -0,0 +1,36 @@
+#batched multi-query search
+#
+#the libs' get_vector_search_results sends one question per query(query_texts=[question]): one
+#embedding round trip and one index probe each. Evaluation runs (data/evaluate_search.py) and
+#multi-query rewriting have many questions at once, so here they go to the collection in batches:
+#the embedding function embeds a batch concurrently (embedding_profiles.EMBEDDING_WORKERS requests in
+#flight), and the index is probed once with all of the batch's vectors. Works with anything the
+#collection registry hands out (Chroma, quantized, in-memory and hybrid collections):
+#
+#    collection = collection_registry.get_collection("chroma", "bedrock_faqs_collection")
+#    for question, results in zip(questions, search_batch(collection, questions)):
+#        print(question, results["ids"])
+
+DEFAULT_BATCH_SIZE = 64 #questions per query() call
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+
+def iter_batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def search_batch(collection, questions, n_results=4, batch_size=DEFAULT_BATCH_SIZE):
+    """Results for each question, in order: {"ids", "documents", "metadatas", "distances"} (plus "scores" from hybrid collections), each a flat list."""
+
+    unique_questions = list(dict.fromkeys(questions)) #a repeated question is embedded and searched once
+    found = {}
+
+    for batch in iter_batches(unique_questions, batch_size):
+        results = collection.query(query_texts=batch, n_results=n_results)
+        keys = [key for key in RESULT_KEYS + ("scores",) if results.get(key) is not None]
+
+        for i, question in enumerate(batch):
+            found[question] = {key: results[key][i] for key in keys}
+
+    return [found[question] for question in questions]
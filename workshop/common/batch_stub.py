@@ -0,0 +1,425 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+from common.bedrock_stub import DEFAULT_MODEL_PROFILES, get_model_profile, invoke_result
+
+#local stand-in for the S3 and Bedrock batch-inference (model invocation job) APIs
+#
+#one server answers both: /model-invocation-job... is the bedrock control plane, every other path is
+#path-style S3 (PutObject, GetObject, HeadObject, ListObjectsV2) backed by an in-memory store. A job
+#waits in the queue for a while, then runs every record of its input through the same fake models as
+#common.bedrock_stub and writes <output>/<job id>/<input file>.out and manifest.json.out the way
+#Bedrock does. Point boto3 at it with the endpoint env vars botocore reads:
+#
+#    python -m common.batch_stub --port 9000 &
+#    AWS_ENDPOINT_URL_S3=http://127.0.0.1:9000 AWS_ENDPOINT_URL_BEDROCK=http://127.0.0.1:9000 python ...
+
+TERMINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+S3_URI_PATTERN = re.compile(r"^s3://(?P<bucket>[^/]+)/?(?P<key>.*)$")
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _etag(data):
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+
+def decode_aws_chunked(data): #strip aws-chunked framing (size;chunk-signature=...\r\n data \r\n ... 0\r\n trailers)
+    body = b""
+    position = 0
+
+    while True:
+        line_end = data.index(b"\r\n", position)
+        size = int(data[position:line_end].split(b";")[0], 16)
+
+        if size == 0:
+            return body
+
+        body += data[line_end + 2:line_end + 2 + size]
+        position = line_end + 2 + size + 2
+
+
+class BatchStub():
+    def __init__(self, host="127.0.0.1", port=0, profiles=None, time_scale=1.0, queue_seconds=5.0, record_error_rate=0.0, seed=0):
+        self.profiles = {key: dict(value) for key, value in DEFAULT_MODEL_PROFILES.items()}
+
+        for prefix, overrides in (profiles or {}).items():
+            self.profiles.setdefault(prefix, dict(DEFAULT_MODEL_PROFILES[""])).update(overrides)
+
+        self.time_scale = time_scale #0 runs jobs as soon as they are submitted
+        self.queue_seconds = queue_seconds #how long a job sits in Submitted / InProgress before its output appears
+        self.record_error_rate = record_error_rate #fraction of records that come back with an error instead of output
+        self.objects = {} #(bucket, key) -> (bytes, last modified)
+        self.jobs = {} #job arn -> job description
+        self.stats = {"puts": 0, "gets": 0, "lists": 0, "jobs": 0, "records": 0}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        handler = type("BoundBatchStubHandler", (BatchStubHandler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    #S3
+
+    def put_object(self, bucket, key, data):
+        with self._lock:
+            self.stats["puts"] += 1
+            self.objects[(bucket, key)] = (data, time.time())
+
+    def get_object(self, bucket, key):
+        with self._lock:
+            self.stats["gets"] += 1
+            return self.objects.get((bucket, key))
+
+    def list_objects(self, bucket, prefix=""):
+        with self._lock:
+            self.stats["lists"] += 1
+            return sorted((key, data, modified) for (b, key), (data, modified) in self.objects.items() if b == bucket and key.startswith(prefix))
+
+    #model invocation jobs
+
+    def create_job(self, request):
+        job_id = uuid.uuid4().hex[:12]
+        job_arn = f"arn:aws:bedrock:us-west-2:000000000000:model-invocation-job/{job_id}"
+        now = time.time()
+
+        job = {
+            "jobArn": job_arn,
+            "jobName": request["jobName"],
+            "modelId": request["modelId"],
+            "roleArn": request["roleArn"],
+            "status": "Submitted",
+            "submitTime": _timestamp(now),
+            "lastModifiedTime": _timestamp(now),
+            "inputDataConfig": request["inputDataConfig"],
+            "outputDataConfig": request["outputDataConfig"],
+        }
+
+        with self._lock:
+            self.stats["jobs"] += 1
+            self.jobs[job_arn] = job
+
+        threading.Thread(target=self.run_job, args=(job_arn,), daemon=True).start()
+        return job_arn
+
+    def find_job(self, job_identifier): #by arn, or by the id at the end of it
+        with self._lock:
+            for job_arn, job in self.jobs.items():
+                if job_identifier in (job_arn, job_arn.rsplit("/", 1)[1]):
+                    return job
+
+        return None
+
+    def _set_status(self, job, status, **fields):
+        with self._lock:
+            if job["status"] in TERMINAL_STATUSES or (job["status"] == "Stopping" and status != "Stopped"):
+                return False
+
+            job.update(fields, status=status, lastModifiedTime=_timestamp(time.time()))
+
+            if status in TERMINAL_STATUSES:
+                job["endTime"] = job["lastModifiedTime"]
+
+            return True
+
+    def stop_job(self, job):
+        self._set_status(job, "Stopping")
+
+    def run_job(self, job_arn):
+        job = self.jobs[job_arn]
+        time.sleep(self.queue_seconds * self.time_scale / 2)
+
+        if not self._set_status(job, "InProgress"):
+            self._set_status(job, "Stopped")
+            return
+
+        time.sleep(self.queue_seconds * self.time_scale / 2)
+
+        input_match = S3_URI_PATTERN.match(job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+        output_match = S3_URI_PATTERN.match(job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"])
+
+        if not input_match or not output_match:
+            self._set_status(job, "Failed", message="Input and output locations must be s3:// URIs.")
+            return
+
+        input_bucket, input_key = input_match.group("bucket"), input_match.group("key")
+        output_bucket, output_prefix = output_match.group("bucket"), output_match.group("key")
+        job_id = job_arn.rsplit("/", 1)[1]
+        profile = get_model_profile(self.profiles, job["modelId"])
+
+        #the input is either one .jsonl object or every .jsonl object under a prefix
+        inputs = [(key, data) for key, data, _ in self.list_objects(input_bucket, input_key)
+                  if key == input_key or (key.endswith(".jsonl") and (input_key == "" or input_key.endswith("/")))]
+
+        if not inputs:
+            self._set_status(job, "Failed", message=f"No input found at {job['inputDataConfig']['s3InputDataConfig']['s3Uri']}")
+            return
+
+        counts = {"totalRecordCount": 0, "processedRecordCount": 0, "successRecordCount": 0, "errorRecordCount": 0}
+        tokens = {"inputTokenCount": 0, "outputTokenCount": 0}
+
+        for key, data in inputs:
+            lines = []
+
+            for line in data.decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+
+                counts["totalRecordCount"] += 1
+                lines.append(self.run_record(job["modelId"], profile, line, counts, tokens))
+
+            output_key = f"{output_prefix.rstrip('/') + '/' if output_prefix else ''}{job_id}/{key.rsplit('/', 1)[-1]}.out"
+            self.put_object(output_bucket, output_key, ("\n".join(lines) + "\n").encode("utf-8"))
+
+        manifest_key = f"{output_prefix.rstrip('/') + '/' if output_prefix else ''}{job_id}/manifest.json.out"
+        self.put_object(output_bucket, manifest_key, json.dumps(dict(counts, **tokens)).encode("utf-8"))
+
+        status = "Completed" if counts["errorRecordCount"] == 0 else "PartiallyCompleted"
+
+        if counts["successRecordCount"] == 0:
+            status = "Failed"
+
+        self._set_status(job, status, message="" if status != "Failed" else "Every record failed.",
+                         totalRecordCount=counts["totalRecordCount"], processedRecordCount=counts["processedRecordCount"],
+                         successRecordCount=counts["successRecordCount"], errorRecordCount=counts["errorRecordCount"])
+
+    def run_record(self, model_id, profile, line, counts, tokens): #one output line for one input line
+        counts["processedRecordCount"] += 1
+
+        with self._lock:
+            self.stats["records"] += 1
+            fail = self._rng.random() < self.record_error_rate
+
+        try:
+            record = json.loads(line)
+            model_input = record["modelInput"]
+        except (ValueError, KeyError, TypeError):
+            counts["errorRecordCount"] += 1
+            return json.dumps({"error": {"errorCode": 400, "errorMessage": "Malformed record: expected recordId and modelInput."}})
+
+        output = {"recordId": record.get("recordId"), "modelInput": model_input}
+
+        if fail:
+            counts["errorRecordCount"] += 1
+            output["error"] = {"errorCode": 500, "errorMessage": "Internal server error while processing the record."}
+            return json.dumps(output)
+
+        output["modelOutput"] = result = invoke_result(model_id, profile, model_input)
+        usage = result.get("usage", {})
+        tokens["inputTokenCount"] += result.get("inputTextTokenCount", usage.get("input_tokens", usage.get("inputTokens", 0)))
+        tokens["outputTokenCount"] += usage.get("output_tokens", usage.get("outputTokens", 0))
+        counts["successRecordCount"] += 1
+
+        return json.dumps(output)
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    stub = None #set on the per-server subclass
+
+    JOB_PATTERN = re.compile(r"^/model-invocation-job(?:/(?P<job>[^/]+))?(?P<stop>/stop)?$")
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError): #the client dropped a kept-alive connection
+            pass
+
+    def send_body(self, status, body, content_type, headers=None, include_body=True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+
+        if include_body:
+            self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def send_json_error(self, status, error_type, message):
+        self.send_body(status, json.dumps({"message": message}).encode("utf-8"), "application/json",
+                       {"x-amzn-ErrorType": f"{error_type}:http://internal.amazon.com/coral/com.amazon.bedrock/"})
+
+    def send_s3_error(self, status, code, message, include_body=True):
+        body = f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+        self.send_body(status, body.encode("utf-8"), "application/xml", include_body=include_body)
+
+    def read_body(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            data = decode_aws_chunked(data)
+
+        return data
+
+    def split_path(self): #(bucket, key, query) for a path-style S3 request
+        parts = urlsplit(self.path)
+        bucket, _, key = parts.path.lstrip("/").partition("/")
+        return unquote(bucket), unquote(key), parse_qs(parts.query)
+
+    def do_POST(self):
+        match = self.JOB_PATTERN.match(urlsplit(self.path).path)
+        body = self.read_body()
+
+        if not match:
+            self.send_json_error(404, "ResourceNotFoundException", f"Unknown path {self.path}")
+            return
+
+        if match.group("stop"):
+            job = self.stub.find_job(unquote(match.group("job")))
+
+            if job is None:
+                self.send_json_error(404, "ResourceNotFoundException", "The specified job does not exist.")
+                return
+
+            self.stub.stop_job(job)
+            self.send_json(200, {})
+            return
+
+        try:
+            request = json.loads(body or b"{}")
+            missing = [name for name in ("jobName", "roleArn", "modelId", "inputDataConfig", "outputDataConfig") if name not in request]
+        except ValueError:
+            missing = ["body"]
+
+        if missing:
+            self.send_json_error(400, "ValidationException", f"Missing required parameters: {', '.join(missing)}")
+            return
+
+        self.send_json(200, {"jobArn": self.stub.create_job(request)})
+
+    def do_GET(self):
+        match = self.JOB_PATTERN.match(urlsplit(self.path).path)
+
+        if match and match.group("job") and not match.group("stop"):
+            job = self.stub.find_job(unquote(match.group("job")))
+
+            if job is None:
+                self.send_json_error(404, "ResourceNotFoundException", "The specified job does not exist.")
+                return
+
+            with self.stub._lock:
+                self.send_json(200, dict(job))
+            return
+
+        bucket, key, query = self.split_path()
+
+        if not key and query.get("list-type") == ["2"]:
+            self.list_objects(bucket, query)
+            return
+
+        found = self.stub.get_object(bucket, key)
+
+        if found is None:
+            self.send_s3_error(404, "NoSuchKey", "The specified key does not exist.")
+            return
+
+        data, modified = found
+        self.send_body(200, data, "application/octet-stream", {"ETag": _etag(data), "Last-Modified": formatdate(modified, usegmt=True)})
+
+    def do_HEAD(self):
+        bucket, key, _ = self.split_path()
+        found = self.stub.get_object(bucket, key)
+
+        if found is None:
+            self.send_s3_error(404, "NoSuchKey", "The specified key does not exist.", include_body=False)
+            return
+
+        data, modified = found
+        self.send_body(200, data, "application/octet-stream", {"ETag": _etag(data), "Last-Modified": formatdate(modified, usegmt=True)}, include_body=False)
+
+    def do_PUT(self):
+        bucket, key, _ = self.split_path()
+        data = self.read_body()
+
+        if key: #a bare bucket PUT is CreateBucket; buckets spring into existence on first write anyway
+            self.stub.put_object(bucket, key, data)
+
+        self.send_body(200, b"", "application/xml", {"ETag": _etag(data)})
+
+    def list_objects(self, bucket, query):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start_after = query.get("continuation-token", query.get("start-after", [""]))[0]
+
+        objects = [entry for entry in self.stub.list_objects(bucket, prefix) if entry[0] > start_after]
+        page, truncated = objects[:max_keys], len(objects) > max_keys
+
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><LastModified>{_timestamp(modified)}</LastModified>"
+            f"<ETag>{escape(_etag(data))}</ETag><Size>{len(data)}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+            for key, data, modified in page
+        )
+        continuation = f"<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>" if truncated else ""
+
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{continuation}{contents}</ListBucketResult>")
+
+        self.send_body(200, body.encode("utf-8"), "application/xml")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for S3 and Bedrock batch inference jobs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for the simulated queue time (0 disables it)")
+    parser.add_argument("--queue-seconds", type=float, default=5.0, help="how long a job waits before its results appear")
+    parser.add_argument("--record-error-rate", type=float, default=0.0, help="fraction of records that fail")
+    args = parser.parse_args()
+
+    stub = BatchStub(args.host, args.port, time_scale=args.time_scale, queue_seconds=args.queue_seconds, record_error_rate=args.record_error_rate)
+    print(f"Batch inference stand-in listening on {stub.url}")
+
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+#local stand-in for the bedrock-runtime endpoints the workshop uses
+#
+#implements Converse (with tool use), ConverseStream (with real event-stream framing) and InvokeModel
+#for Claude, Nova Lite, Titan text/image embeddings, Nova Canvas and SDXL. Latency, token rate and
+#throttling are configurable per model, and embeddings are deterministic so search results are repeatable.
+#
+#point any lib at it with the endpoint env var read by common.clients:
+#
+#    python -m common.bedrock_stub --port 8999 &
+#    AWS_ENDPOINT_URL_BEDROCK_RUNTIME=http://127.0.0.1:8999 streamlit run rag_app.py
+#
+#the stub never checks signatures, but boto3 still needs some credentials and a region to sign with.
+
+#per-model behaviour, matched against the model id with any cross-region prefix ("us.") removed
+#latency_ms is the (median, sigma) of a lognormal distribution for time to first byte
+DEFAULT_MODEL_PROFILES = {
+    "anthropic.claude": {"latency_ms": (600, 0.4), "tokens_per_second": 80, "max_concurrency": 50, "throttle_rate": 0.0},
+    "amazon.nova-lite": {"latency_ms": (300, 0.3), "tokens_per_second": 150, "max_concurrency": 100, "throttle_rate": 0.0},
+    "amazon.titan-text": {"latency_ms": (400, 0.3), "tokens_per_second": 100, "max_concurrency": 50, "throttle_rate": 0.0},
+    "amazon.titan-embed-text": {"latency_ms": (40, 0.3), "max_concurrency": 100, "throttle_rate": 0.0, "dimensions": 1024},
+    "amazon.titan-embed-image": {"latency_ms": (90, 0.3), "max_concurrency": 50, "throttle_rate": 0.0, "dimensions": 1024},
+    "amazon.nova-canvas": {"latency_ms": (4000, 0.2), "max_concurrency": 10, "throttle_rate": 0.0},
+    "stability.": {"latency_ms": (5000, 0.2), "max_concurrency": 10, "throttle_rate": 0.0},
+    "": {"latency_ms": (300, 0.3), "tokens_per_second": 100, "max_concurrency": 50, "throttle_rate": 0.0}, #anything else
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def get_model_profile(profiles, model_id):
+    base_id = re.sub(r"^(us|eu|apac|global)\.", "", model_id)
+
+    for prefix in sorted(profiles, key=len, reverse=True): #longest matching prefix wins
+        if base_id.startswith(prefix):
+            return profiles[prefix]
+
+    return profiles[""]
+
+
+def count_tokens(text): #rough token count, good enough for usage metadata
+    return max(1, len(WORD_PATTERN.findall(text)))
+
+
+#deterministic fake embeddings
+
+@lru_cache(maxsize=65536)
+def _token_vector(token, dimensions):
+    rng = random.Random(hashlib.sha256(token.encode("utf-8")).digest())
+    return [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_text_embedding(text, dimensions=1024, normalize=True):
+    #bag of hashed words, so texts that share words land close together and retrieval behaves sensibly
+    vector = [0.0] * dimensions
+
+    for token in WORD_PATTERN.findall(text.lower()):
+        for i, v in enumerate(_token_vector(token, dimensions)):
+            vector[i] += v
+
+    return _normalize(vector) if normalize else vector
+
+
+def fake_bytes_embedding(data, dimensions=1024):
+    rng = random.Random(hashlib.sha256(data).digest())
+    return _normalize([rng.gauss(0.0, 1.0) for _ in range(dimensions)])
+
+
+def fake_png(width, height, seed): #a solid-colour PNG, built by hand so the stub needs no imaging library
+    rng = random.Random(seed)
+    pixel = bytes([rng.randrange(256), rng.randrange(256), rng.randrange(256)])
+    raw = (b"\x00" + pixel * width) * height
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1))
+            + chunk(b"IEND", b""))
+
+
+#AWS event-stream framing (application/vnd.amazon.eventstream)
+
+def encode_event(event_type, payload):
+    headers = b""
+
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"), (":message-type", "event")):
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        headers += struct.pack(">B", len(name)) + name + b"\x07" + struct.pack(">H", len(value)) + value #7 = string
+
+    body = json.dumps(payload).encode("utf-8")
+    prelude = struct.pack(">II", 12 + len(headers) + len(body) + 4, len(headers))
+    message = prelude + struct.pack(">I", binascii.crc32(prelude)) + headers + body
+
+    return message + struct.pack(">I", binascii.crc32(message))
+
+
+class ThrottledError(Exception):
+    pass
+
+
+class BedrockStub():
+    def __init__(self, host="127.0.0.1", port=0, profiles=None, time_scale=1.0, throttle_rate=None, seed=0):
+        self.profiles = {key: dict(value) for key, value in DEFAULT_MODEL_PROFILES.items()}
+
+        for prefix, overrides in (profiles or {}).items():
+            self.profiles.setdefault(prefix, dict(DEFAULT_MODEL_PROFILES[""])).update(overrides)
+
+        if throttle_rate is not None: #one switch to throttle every model
+            for profile in self.profiles.values():
+                profile["throttle_rate"] = throttle_rate
+
+        self.time_scale = time_scale #0 turns off all simulated delays, e.g. for CI
+        self.stats = {"requests": 0, "throttled": 0, "by_model": {}}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+        handler = type("BoundStubHandler", (StubHandler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def sleep(self, seconds):
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def sample_latency(self, profile): #seconds until the first byte
+        median_ms, sigma = profile["latency_ms"]
+
+        with self._lock:
+            return median_ms * math.exp(self._rng.gauss(0.0, sigma)) / 1000
+
+    def acquire(self, model_id, profile): #count the request and decide whether to throttle it
+        with self._lock:
+            self.stats["requests"] += 1
+            model_stats = self.stats["by_model"].setdefault(model_id, {"requests": 0, "throttled": 0})
+            model_stats["requests"] += 1
+
+            in_flight = self._in_flight.get(model_id, 0)
+
+            if in_flight >= profile.get("max_concurrency", math.inf) or self._rng.random() < profile.get("throttle_rate", 0.0):
+                self.stats["throttled"] += 1
+                model_stats["throttled"] += 1
+                raise ThrottledError()
+
+            self._in_flight[model_id] = in_flight + 1
+
+    def release(self, model_id):
+        with self._lock:
+            self._in_flight[model_id] -= 1
+
+
+#request handling
+
+def _message_text(messages):
+    texts = []
+
+    for message in messages:
+        for block in message.get("content", []):
+            if isinstance(block, dict) and "text" in block:
+                texts.append(block["text"])
+            elif isinstance(block, dict) and "toolResult" in block:
+                texts.extend(c.get("text", "") for c in block["toolResult"].get("content", []))
+            elif isinstance(block, str):
+                texts.append(block)
+
+    return "\n".join(texts)
+
+
+def _reply_text(model_id, prompt, max_tokens):
+    #a deterministic reply that echoes the last words of the prompt, sized like a real answer
+    words = WORD_PATTERN.findall(prompt)[-200:] or ["ok"]
+    length = min(max_tokens, 20 + len(prompt) % 180)
+    reply = [f"[{model_id}]"] + [words[i % len(words)] for i in range(length - 1)]
+
+    return " ".join(reply)
+
+
+def converse_result(model_id, request):
+    prompt = _message_text(request.get("system", [])) + "\n" + _message_text(request.get("messages", []))
+    max_tokens = request.get("inferenceConfig", {}).get("maxTokens", 512)
+    text = _reply_text(model_id, prompt, max_tokens)
+
+    return text, {"inputTokens": count_tokens(prompt), "outputTokens": count_tokens(text), "totalTokens": count_tokens(prompt) + count_tokens(text)}
+
+
+def _schema_value(schema, prompt): #the simplest value that satisfies a JSON schema fragment
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type", "string")
+
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: _schema_value(properties.get(name, {}), prompt) for name in schema.get("required", properties)}
+
+    if kind == "array":
+        return [_schema_value(schema.get("items", {}), prompt)]
+
+    if kind == "boolean":
+        return False
+
+    if kind in ("integer", "number"):
+        return schema.get("minimum", 0)
+
+    return " ".join(WORD_PATTERN.findall(prompt)[-12:]) or "ok"
+
+
+def _tool_use(request, prompt):
+    #call a tool when one is forced, or when tools are offered and no tool result has come back yet
+    tool_config = request.get("toolConfig")
+
+    if not tool_config or not tool_config.get("tools"):
+        return None
+
+    choice = tool_config.get("toolChoice", {})
+    specs = [tool["toolSpec"] for tool in tool_config["tools"] if "toolSpec" in tool]
+
+    if "tool" in choice:
+        spec = next((s for s in specs if s["name"] == choice["tool"]["name"]), None)
+    elif "any" in choice or not any("toolResult" in block for m in request.get("messages", []) for block in m.get("content", []) if isinstance(block, dict)):
+        spec = specs[0] if specs else None
+    else:
+        spec = None
+
+    if spec is None:
+        return None
+
+    tool_input = _schema_value(dict(spec.get("inputSchema", {}).get("json", {}), type="object"), prompt)
+    tool_use_id = "tooluse_" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:22]
+
+    return {"toolUseId": tool_use_id, "name": spec["name"], "input": tool_input}
+
+
+def converse_output(model_id, request): #message content blocks, stop reason and usage for a Converse response
+    tool_use = _tool_use(request, _message_text(request.get("messages", [])))
+    text, usage = converse_result(model_id, request)
+
+    if tool_use is None:
+        return [{"text": text}], "end_turn", usage
+
+    tool_tokens = count_tokens(json.dumps(tool_use["input"]))
+    usage = dict(usage, outputTokens=tool_tokens, totalTokens=usage["inputTokens"] + tool_tokens)
+
+    return [{"toolUse": tool_use}], "tool_use", usage
+
+
+def _anthropic_to_converse(request): #just enough of an Anthropic messages body, in Converse shape, for converse_output
+    messages = []
+
+    for message in request.get("messages", []):
+        content = message.get("content", [])
+        blocks = [{"text": content}] if isinstance(content, str) else []
+
+        for block in content if isinstance(content, list) else []:
+            if block.get("type") == "tool_result":
+                result = block.get("content", "")
+                blocks.append({"toolResult": {"content": [{"text": result if isinstance(result, str) else json.dumps(result)}]}})
+            elif "text" in block:
+                blocks.append({"text": block["text"]})
+
+        messages.append({"role": message.get("role", "user"), "content": blocks})
+
+    converse_request = {
+        "system": [{"text": request["system"] if isinstance(request.get("system"), str) else _message_text([{"content": request.get("system", [])}])}],
+        "messages": messages,
+        "inferenceConfig": {"maxTokens": request.get("max_tokens", 512)},
+    }
+
+    if request.get("tools"):
+        choice = request.get("tool_choice", {"type": "auto"})
+        converse_request["toolConfig"] = {
+            "tools": [{"toolSpec": {"name": tool["name"], "inputSchema": {"json": tool.get("input_schema", {})}}} for tool in request["tools"]],
+            "toolChoice": {"tool": {"name": choice["name"]}} if choice.get("type") == "tool" else {choice.get("type", "auto"): {}},
+        }
+
+    return converse_request
+
+
+def invoke_result(model_id, profile, request):
+    base_id = re.sub(r"^(us|eu|apac|global)\.", "", model_id)
+
+    if base_id.startswith("amazon.titan-embed-text"):
+        text = request.get("inputText", "")
+        dimensions = request.get("dimensions", profile.get("dimensions", 1024))
+        embedding = fake_text_embedding(text, dimensions, request.get("normalize", True))
+        result = {"embedding": embedding, "inputTextTokenCount": count_tokens(text)}
+
+        embedding_types = request.get("embeddingTypes")
+
+        if embedding_types:
+            result["embeddingsByType"] = {}
+
+            if "float" in embedding_types:
+                result["embeddingsByType"]["float"] = embedding
+
+            if "binary" in embedding_types:
+                result["embeddingsByType"]["binary"] = [1 if v > 0 else 0 for v in embedding]
+
+        return result
+
+    if base_id.startswith("amazon.titan-embed-image"):
+        dimensions = request.get("embeddingConfig", {}).get("outputEmbeddingLength", profile.get("dimensions", 1024))
+
+        if request.get("inputImage"):
+            embedding = fake_bytes_embedding(base64.b64decode(request["inputImage"]), dimensions)
+
+            if request.get("inputText"): #blend text and image like the multimodal model
+                text_embedding = fake_text_embedding(request["inputText"], dimensions)
+                embedding = _normalize([a + b for a, b in zip(embedding, text_embedding)])
+        else:
+            embedding = fake_text_embedding(request.get("inputText", ""), dimensions)
+
+        return {"embedding": embedding, "inputTextTokenCount": count_tokens(request.get("inputText", "") or "")}
+
+    seed = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    if base_id.startswith(("amazon.nova-canvas", "amazon.titan-image")):
+        config = request.get("imageGenerationConfig", {})
+        images = [base64.b64encode(fake_png(config.get("width", 512), config.get("height", 512), seed + str(i))).decode("utf-8")
+                  for i in range(config.get("numberOfImages", 1))]
+        return {"images": images}
+
+    if base_id.startswith("stability."):
+        image = fake_png(request.get("width", 512), request.get("height", 512), seed)
+        return {"result": "success", "artifacts": [{"base64": base64.b64encode(image).decode("utf-8"), "finishReason": "SUCCESS", "seed": 0}]}
+
+    if base_id.startswith("anthropic."): #Anthropic messages API body
+        content, stop_reason, usage = converse_output(model_id, _anthropic_to_converse(request))
+        blocks = [{"type": "tool_use", "id": block["toolUse"]["toolUseId"], "name": block["toolUse"]["name"], "input": block["toolUse"]["input"]}
+                  if "toolUse" in block else {"type": "text", "text": block["text"]} for block in content]
+        return {"id": "msg_stub", "type": "message", "role": "assistant", "model": model_id,
+                "content": blocks, "stop_reason": stop_reason,
+                "usage": {"input_tokens": usage["inputTokens"], "output_tokens": usage["outputTokens"]}}
+
+    if base_id.startswith("amazon.titan-text"):
+        prompt = request.get("inputText", "")
+        text = _reply_text(model_id, prompt, request.get("textGenerationConfig", {}).get("maxTokenCount", 512))
+        return {"inputTextTokenCount": count_tokens(prompt), "results": [{"tokenCount": count_tokens(text), "outputText": text, "completionReason": "FINISH"}]}
+
+    #Nova messages-v1 body and anything else that looks like it
+    text, usage = converse_result(model_id, {"system": request.get("system", []), "messages": request.get("messages", []), "inferenceConfig": request.get("inferenceConfig", {})})
+    return {"output": {"message": {"role": "assistant", "content": [{"text": text}]}}, "stopReason": "end_turn", "usage": usage}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    stub = None #set on the per-server subclass
+
+    PATH_PATTERN = re.compile(r"^/model/(?P<model_id>[^/]+)/(?P<operation>converse|converse-stream|invoke)$")
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError): #the client dropped a kept-alive connection
+            pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, error_type, message):
+        self.send_json(status, {"message": message}, {"x-amzn-ErrorType": f"{error_type}:http://internal.amazon.com/coral/com.amazon.bedrock/"})
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        match = self.PATH_PATTERN.match(self.path.split("?")[0])
+
+        if not match:
+            self.send_error_json(404, "ResourceNotFoundException", f"Unknown path {self.path}")
+            return
+
+        model_id = unquote(match.group("model_id"))
+        operation = match.group("operation")
+        stub = self.stub
+        profile = get_model_profile(stub.profiles, model_id)
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self.send_error_json(400, "ValidationException", "Malformed input request, please reformat your input and try again.")
+            return
+
+        try:
+            stub.acquire(model_id, profile)
+        except ThrottledError:
+            stub.sleep(0.005) #real throttles come back quickly, but not instantly
+            self.send_error_json(429, "ThrottlingException", "Too many requests, please wait before trying again.")
+            return
+
+        try:
+            started = time.perf_counter()
+            stub.sleep(stub.sample_latency(profile))
+
+            if operation == "converse":
+                content, stop_reason, usage = converse_output(model_id, request)
+                stub.sleep(usage["outputTokens"] / profile.get("tokens_per_second", math.inf))
+                self.send_json(200, {
+                    "output": {"message": {"role": "assistant", "content": content}},
+                    "stopReason": stop_reason,
+                    "usage": usage,
+                    "metrics": {"latencyMs": int((time.perf_counter() - started) * 1000)},
+                })
+            elif operation == "converse-stream":
+                try:
+                    self.stream_converse(model_id, profile, request, started)
+                except (BrokenPipeError, ConnectionResetError): #the client stopped reading mid-stream
+                    self.close_connection = True
+            else:
+                result = invoke_result(model_id, profile, request)
+                usage = result.get("usage", {})
+                self.send_json(200, result, {
+                    "X-Amzn-Bedrock-Invocation-Latency": str(int((time.perf_counter() - started) * 1000)),
+                    "X-Amzn-Bedrock-Input-Token-Count": str(result.get("inputTextTokenCount", usage.get("inputTokens", usage.get("input_tokens", 0)))),
+                    "X-Amzn-Bedrock-Output-Token-Count": str(usage.get("outputTokens", usage.get("output_tokens", 0))),
+                })
+        finally:
+            stub.release(model_id)
+
+    def stream_converse(self, model_id, profile, request, started):
+        text, usage = converse_result(model_id, request)
+        token_delay = 1.0 / profile.get("tokens_per_second", math.inf)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self.write_chunk(encode_event("messageStart", {"role": "assistant"}))
+
+        for i, word in enumerate(text.split(" ")):
+            self.write_chunk(encode_event("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": word if i == 0 else " " + word}}))
+            self.stub.sleep(token_delay)
+
+        self.write_chunk(encode_event("contentBlockStop", {"contentBlockIndex": 0}))
+        self.write_chunk(encode_event("messageStop", {"stopReason": "end_turn"}))
+        self.write_chunk(encode_event("metadata", {"usage": usage, "metrics": {"latencyMs": int((time.perf_counter() - started) * 1000)}}))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Amazon Bedrock runtime API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--config", help="JSON file of per-model profile overrides, keyed by model id prefix")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for all simulated delays (0 disables them)")
+    parser.add_argument("--throttle-rate", type=float, help="probability of a ThrottlingException for every model")
+    args = parser.parse_args()
+
+    profiles = None
+
+    if args.config:
+        with open(args.config) as config_file:
+            profiles = json.load(config_file)
+
+    stub = BedrockStub(args.host, args.port, profiles=profiles, time_scale=args.time_scale, throttle_rate=args.throttle_rate)
+    print(f"Bedrock stand-in listening on {stub.url}")
+
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
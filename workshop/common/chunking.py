@@ -0,0 +1,110 @@
+import os
+import re
+
+#token-window chunking with parent linkage
+#
+#embedding a whole FAQ answer as one vector dilutes it, and retrieving it sends the whole answer to
+#the model even when one paragraph is relevant. Long documents are split into windows of max_tokens
+#tokens overlapping by overlap tokens (a window ends early at a sentence end when there is one in its
+#second half), and every chunk records its parent document in its metadata. Retrieval searches the
+#chunks and only expands to the parent when several of its chunks make the top results, i.e. when
+#the answer is likely spread across it.
+#
+#tokens are approximated as words and punctuation marks: Titan's tokenizer is not public, and the
+#windows only need to be roughly even in size.
+#
+#the labs use the chunks when BEDROCK_RAG_CHUNKS is set, after building them with:
+#
+#    python prefetch_embeddings.py && python populate_collection.py
+
+CHUNKS_ENV_VAR = "BEDROCK_RAG_CHUNKS"
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_ENDS = (".", "?", "!")
+
+
+def chunks_enabled():
+    return os.environ.get(CHUNKS_ENV_VAR, "").lower() not in ("", "0", "false", "no")
+
+
+def count_tokens(text):
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def get_chunk_spans(text, max_tokens=100, overlap=20):
+    """(start, end) character offsets of the chunks of text."""
+
+    spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+
+    if len(spans) <= max_tokens:
+        return [(0, len(text))]
+
+    chunks = []
+    start = 0
+
+    while True:
+        end = min(start + max_tokens, len(spans))
+
+        if end < len(spans): #prefer to stop at a sentence end in the second half of the window
+            for i in range(end - 1, start + max_tokens // 2, -1):
+                if text[spans[i][0]:spans[i][1]] in SENTENCE_ENDS:
+                    end = i + 1
+                    break
+
+        chunks.append((spans[start][0], spans[end - 1][1]))
+
+        if end == len(spans):
+            return chunks
+
+        start = max(end - overlap, start + 1)
+
+
+def chunk_document(parent_id, text, metadata=None, max_tokens=100, overlap=20, prefix=""):
+    """Chunk items ({"id", "document", "metadata"}) for one document; prefix (e.g. a title) starts every chunk."""
+
+    spans = get_chunk_spans(text, max_tokens, overlap)
+
+    return [
+        {
+            'id': f"{parent_id}-{number}",
+            'document': prefix + text[start:end],
+            'metadata': dict(metadata or {}, parent_id=str(parent_id), chunk=number, chunks=len(spans)),
+        }
+        for number, (start, end) in enumerate(spans, start=1)
+    ]
+
+
+def get_chunk_context(chunk_collection, question, parent_collection=None, n_results=4, expand_threshold=2):
+    """The documents to send as context for question: the best chunks, in rank order.
+
+    When expand_threshold or more of the chunks come from one parent, they are replaced (at the
+    position of the best of them) by the parent document from parent_collection.
+    """
+
+    results = chunk_collection.query(query_texts=[question], n_results=n_results)
+    documents, metadatas = results['documents'][0], results['metadatas'][0]
+
+    hits = {}
+
+    for metadata in metadatas:
+        hits[metadata['parent_id']] = hits.get(metadata['parent_id'], 0) + 1
+
+    expanded = [parent_id for parent_id, count in hits.items() if count >= expand_threshold] if parent_collection is not None else []
+    parents = {}
+
+    if expanded:
+        found = parent_collection.get(ids=expanded)
+        parents = dict(zip(found['ids'], found['documents']))
+
+    context = []
+
+    for document, metadata in zip(documents, metadatas):
+        parent_id = metadata['parent_id']
+
+        if parent_id in parents:
+            if parents[parent_id] not in context:
+                context.append(parents[parent_id])
+        else:
+            context.append(document)
+
+    return context
@@ -0,0 +1,98 @@
+import os
+import copy
+import threading
+from common.instrumentation import instrument_client
+from common.lazy import lazy_import
+
+boto3 = lazy_import("boto3") #loaded by the first get_session(), not when a lib is imported
+botocore_config = lazy_import("botocore.config")
+
+#process-wide boto3 clients
+#
+#creating a Session and a client per request pays for credential resolution, endpoint resolution
+#and a fresh TLS handshake every time. Clients are thread safe once built, so we build one per
+#(service, region, endpoint, config) and hand the same object to every caller.
+
+DEFAULT_CLIENT_CONFIG = {
+    "max_pool_connections": 50, #enough pooled connections for the parallel/batch labs
+    "tcp_keepalive": True, #keep idle pooled connections alive between Streamlit reruns
+    "connect_timeout": 10,
+    "read_timeout": 300, #Nova Canvas and long converse calls can take a while
+    "retries": {"max_attempts": 10, "mode": "adaptive"}, #client-side rate limiting on throttles
+}
+
+#point the libs at a local stand-in (common/bedrock_stub.py) instead of AWS. botocore reads this
+#variable itself, so clients we don't build (e.g. Chroma's embedding function) follow it too;
+#we read it here only so a change of endpoint gets its own cache entry
+ENDPOINT_URL_ENV_VAR = "AWS_ENDPOINT_URL_BEDROCK_RUNTIME"
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def _freeze(value): #turn nested config dicts into something hashable for the cache key
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def get_session():
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = boto3.Session()
+
+        return _session
+
+
+def get_client(service_name, region_name=None, endpoint_url=None, **config_overrides):
+    """Return the shared client for this service/region/endpoint/config combination.
+
+    Any keyword accepted by botocore.config.Config can be passed to override DEFAULT_CLIENT_CONFIG.
+    """
+
+    if endpoint_url is None: #the same per-service variable botocore reads, e.g. AWS_ENDPOINT_URL_S3
+        endpoint_url = os.environ.get("AWS_ENDPOINT_URL_" + service_name.upper().replace("-", "_")) or None
+
+    config_args = dict(DEFAULT_CLIENT_CONFIG, **config_overrides)
+    key = (service_name, region_name, endpoint_url, _freeze(config_args))
+
+    client = _clients.get(key)
+
+    if client is not None:
+        return client
+
+    session = get_session()
+
+    with _lock: #boto3 sessions are not thread safe while creating clients
+        client = _clients.get(key)
+
+        if client is None:
+            client = session.client(
+                service_name=service_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=botocore_config.Config(**copy.deepcopy(config_args)), #Config rewrites the retries dict in place
+            )
+            if service_name == "bedrock-runtime":
+                instrument_client(client) #no-op until metrics are enabled
+
+            _clients[key] = client
+
+    return client
+
+
+def get_bedrock_client(region_name=None, **config_overrides):
+    return get_client("bedrock-runtime", region_name=region_name, **config_overrides)
+
+
+def clear_clients(): #drop every cached client, e.g. after changing credentials or the endpoint env var
+    global _session
+
+    with _lock:
+        _clients.clear()
+        _session = None
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from common.clients import ENDPOINT_URL_ENV_VAR, _freeze, get_session
+from common.lazy import lazy_import
+chromadb = lazy_import("chromadb")
+embedding_profiles = lazy_import("common.embedding_profiles")
+vector_store = lazy_import("common.vector_store")
+lexical_index = lazy_import("common.lexical_index")
+query_cache = lazy_import("common.query_cache")
+
+#process-wide Chroma clients and collections
+#
+#the libs used to open a PersistentClient, build a Bedrock embedding function and look the
+#collection up on every question. Opening a Chroma database reads its SQLite catalog, and the first
+#query on a collection loads its HNSW index from disk, so every question paid that cold start again.
+#Here each database is opened once per process and each collection once per (database, name,
+#embedding profile, vector store, search mode); every thread, and every Streamlit rerun (modules survive reruns), gets the
+#same objects. The entries record how long the open and the first query took:
+#
+#    collection = get_collection("../../data/chroma", "bedrock_faqs_collection")
+#    warm_up("../../data/chroma", ["bedrock_faqs_collection"])    #pay the cold start now, not on the first question
+#    get_stats()                                                    #open/first-query timings per collection
+#
+#reload() drops everything (Chroma's own per-path system cache included) so the next call reopens
+#the databases, e.g. after populate_collection.py has rewritten them from another process.
+
+_clients = {}
+_collections = {}
+_lock = threading.RLock()
+
+
+class RegisteredCollection():
+    """A registry entry: the open collection plus its timings. Answers like the collection itself."""
+
+    def __init__(self, path, collection_name, profile_name, collection, open_seconds):
+        self.path = path
+        self.collection_name = collection_name
+        self.profile_name = profile_name
+        self.collection = collection
+        self.open_seconds = open_seconds
+        self.first_query_seconds = None
+        self.queries = 0
+        self.derived = {} #values the libs work out from the collection's contents; dropped with the entry by reload()
+
+    def query(self, *args, **kwargs):
+        started = time.perf_counter()
+        results = self.collection.query(*args, **kwargs)
+
+        if self.first_query_seconds is None:
+            self.first_query_seconds = time.perf_counter() - started
+
+        self.queries += 1
+        return results
+
+    def __getattr__(self, name): #get(), count() etc. go straight to the collection
+        return getattr(self.collection, name)
+
+
+def get_chroma_client(path):
+    """The shared PersistentClient for the Chroma database at path."""
+
+    path = os.path.realpath(path)
+    client = _clients.get(path)
+
+    if client is None:
+        with _lock:
+            client = _clients.get(path)
+
+            if client is None:
+                client = _clients[path] = chromadb.PersistentClient(path=path)
+
+    return client
+
+
+def _get_or_open(key, open_collection):
+    entry = _collections.get(key)
+
+    if entry is None:
+        with _lock: #one open per key, even when several threads ask at once
+            entry = _collections.get(key)
+
+            if entry is None:
+                started = time.perf_counter()
+                collection = open_collection()
+                entry = _collections[key] = RegisteredCollection(key[0], key[1], key[2], collection, time.perf_counter() - started)
+
+    return entry
+
+
+def get_collection(path, collection_name, profile=None, **client_args):
+    """The embedding profile's collection (or quantized index, see common/embedding_profiles.py), opened once per process.
+
+    client_args go to the embedding function's boto3 client (e.g. region_name).
+    """
+
+    profile = profile or embedding_profiles.get_profile()
+    store = vector_store.get_store_name()
+    mode = lexical_index.get_search_mode()
+    key = (os.path.realpath(path), collection_name, profile["name"], store, mode, _freeze(client_args), os.environ.get(ENDPOINT_URL_ENV_VAR))
+
+    def open_collection():
+        client = get_chroma_client(path) if profile["index"] == "float" and store == "chroma" else None
+        embedding_function = embedding_profiles.get_embedding_function(get_session(), profile, **client_args)
+        collection = embedding_profiles.open_collection(path, collection_name, get_session(), profile, client=client, store=store,
+                                                        embedding_function=embedding_function, **client_args)
+        collection = query_cache.with_query_cache(collection, embedding_function, embedding_profiles.MODEL_ID, profile["dimensions"], profile["normalize"]) #questions only
+
+        if mode == "hybrid": #BEDROCK_SEARCH_MODE=hybrid: fuse with the BM25 index built by populate_collection.py
+            collection = lexical_index.HybridCollection(collection, lexical_index.BM25Index(path, collection_name))
+
+        return collection
+
+    return _get_or_open(key, open_collection)
+
+
+def get_chroma_collection(path, collection_name):
+    """A collection opened without an embedding function (queried with query_embeddings), opened once per process."""
+
+    key = (os.path.realpath(path), collection_name, None)
+    return _get_or_open(key, lambda: get_chroma_client(path).get_collection(collection_name))
+
+
+def warm_up(path, collection_names, profile=None, **client_args):
+    """Open the collections and run one query on each, so the first question does not pay for it; returns get_stats()."""
+
+    profile = profile or embedding_profiles.get_profile()
+
+    for collection_name in collection_names:
+        collection = get_collection(path, collection_name, profile, **client_args)
+
+        if collection.first_query_seconds is None: #any vector loads the index; no Bedrock call needed
+            collection.query(query_embeddings=[[0.0] * profile["dimensions"]], n_results=1)
+
+    return get_stats()
+
+
+def get_stats():
+    return [
+        {
+            "path": entry.path,
+            "collection": entry.collection_name,
+            "profile": entry.profile_name,
+            "open_ms": round(entry.open_seconds * 1000, 1),
+            "first_query_ms": None if entry.first_query_seconds is None else round(entry.first_query_seconds * 1000, 1),
+            "queries": entry.queries,
+        }
+        for entry in list(_collections.values())
+    ]
+
+
+def reload(): #reopen everything on next use, e.g. after the databases were rebuilt by another process
+    with _lock:
+        if _clients: #Chroma keeps one system per path for the whole process; any client can clear them
+            next(iter(_clients.values())).clear_system_cache()
+
+        _clients.clear()
+        _collections.clear()
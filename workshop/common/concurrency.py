@@ -0,0 +1,189 @@
+import functools
+import random
+import threading
+import time
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+from common.clients import get_bedrock_client
+
+#adaptive (AIMD) concurrency limits for Bedrock calls
+#
+#each model gets one limiter per process, shared by every thread. The limit grows by about one
+#request per round trip while calls succeed (additive increase) and is cut in half on a throttle
+#(multiplicative decrease), so batch jobs settle just under the account quota instead of
+#oscillating between idle and a throttling storm. A sharp rise in latency over the observed
+#baseline is treated as an early congestion signal and trims the limit more gently. Other transient
+#failures (5xx, a model still loading, dropped connections) are retried with the same backoff but
+#leave the limit alone.
+
+THROTTLING_ERROR_CODES = ("ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException")
+TRANSIENT_ERROR_CODES = ("InternalServerException", "ModelNotReadyException", "ModelTimeoutException", "RequestTimeout")
+
+
+class AdaptiveLimiter():
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=128, throttle_decrease=0.5,
+                 latency_decrease=0.9, latency_tolerance=2.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.throttle_decrease = throttle_decrease
+        self.latency_decrease = latency_decrease
+        self.latency_tolerance = latency_tolerance #how many times the baseline latency counts as congestion
+
+        self.in_flight = 0
+        self.recent_latency = None
+        self.baseline_latency = None
+        self.stats = {"successes": 0, "throttles": 0, "latency_decreases": 0, "peak_limit": self.limit}
+
+        self._condition = threading.Condition()
+        self._last_decrease = 0.0
+
+    def acquire(self): #blocks until a slot is free, returns the start time to pass back on release
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+
+            self.in_flight += 1
+
+        return time.monotonic()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._condition.notify_all()
+
+    def _decrease(self, factor, started):
+        #only one decrease per round trip: requests that were already in flight when we last backed off
+        #were sent under the old limit and would otherwise cut the limit again for the same congestion
+        if started < self._last_decrease:
+            return False
+
+        self.limit = max(self.min_limit, self.limit * factor)
+        self._last_decrease = time.monotonic()
+        return True
+
+    def on_success(self, started):
+        latency = time.monotonic() - started
+
+        with self._condition:
+            self.stats["successes"] += 1
+
+            #compare a smoothed latency against its own best level, so one slow outlier is not read as congestion
+            if self.recent_latency is None:
+                self.recent_latency = latency
+            else:
+                self.recent_latency += (latency - self.recent_latency) * 0.1
+
+            if self.baseline_latency is None or self.recent_latency < self.baseline_latency:
+                self.baseline_latency = self.recent_latency
+            else:
+                self.baseline_latency += (self.recent_latency - self.baseline_latency) * 0.005 #drift up slowly to follow real changes
+
+            if self.recent_latency > self.baseline_latency * self.latency_tolerance:
+                if self._decrease(self.latency_decrease, started): #otherwise we already backed off for this congestion; no increase either
+                    self.stats["latency_decreases"] += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.stats["peak_limit"] = max(self.stats["peak_limit"], self.limit)
+
+            self._release()
+
+    def on_throttle(self, started):
+        with self._condition:
+            self.stats["throttles"] += 1
+            self._decrease(self.throttle_decrease, started)
+            self._release()
+
+    def on_error(self): #any other failure says nothing about capacity
+        with self._condition:
+            self._release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_id, **limiter_args): #the process-wide limiter for a model, created on first use
+    with _limiters_lock:
+        limiter = _limiters.get(model_id)
+
+        if limiter is None:
+            limiter = AdaptiveLimiter(**limiter_args)
+            _limiters[model_id] = limiter
+
+        return limiter
+
+
+def is_throttling_error(error):
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error): #worth retrying, but not a sign we are over the quota
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)): #connect/read timeouts, dropped connections
+        return True
+
+    if not isinstance(error, ClientError):
+        return False
+
+    return (error.response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES
+            or error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500)
+
+
+def call_with_limit(fn, model_id, max_attempts=8, **kwargs):
+    """Call fn(modelId=model_id, **kwargs) inside the model's adaptive limit.
+
+    Throttled calls shrink the limit and are retried with jittered exponential backoff; other
+    transient errors are retried the same way without touching the limit. Anything else is raised.
+    """
+
+    limiter = get_limiter(model_id)
+
+    for attempt in range(max_attempts):
+        started = limiter.acquire()
+        release = limiter.on_error #also on KeyboardInterrupt and the like, so the slot is never leaked
+
+        try:
+            response = fn(modelId=model_id, **kwargs)
+            release = functools.partial(limiter.on_success, started)
+            return response
+        except Exception as e:
+            if is_throttling_error(e):
+                release = functools.partial(limiter.on_throttle, started)
+            elif not is_transient_error(e): #e.g. a ValidationException: retrying will not help
+                raise
+
+            if attempt == max_attempts - 1:
+                raise
+        finally:
+            release()
+
+        time.sleep(random.uniform(0, min(20.0, 0.1 * 2 ** attempt))) #full jitter, outside the slot
+
+
+class LimitedBedrockClient():
+    """A bedrock-runtime client whose converse/converse_stream/invoke_model calls share per-model adaptive limits.
+
+    Anything else is passed straight through to the wrapped client.
+    """
+
+    def __init__(self, client, max_attempts=8):
+        self._client = client
+        self._max_attempts = max_attempts
+
+    def converse(self, modelId, **kwargs):
+        return call_with_limit(self._client.converse, modelId, self._max_attempts, **kwargs)
+
+    def converse_stream(self, modelId, **kwargs): #the slot covers the call up to the first byte, not the whole stream
+        return call_with_limit(self._client.converse_stream, modelId, self._max_attempts, **kwargs)
+
+    def invoke_model(self, modelId, **kwargs):
+        return call_with_limit(self._client.invoke_model, modelId, self._max_attempts, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def get_limited_bedrock_client(region_name=None, **config_overrides):
+    #call_with_limit does its own retries (throttles and transient errors), so botocore must not hide throttles behind its retry loop
+    config_overrides.setdefault("retries", {"total_max_attempts": 1, "mode": "standard"})
+    config_overrides.setdefault("max_pool_connections", 128)
+
+    return LimitedBedrockClient(get_bedrock_client(region_name=region_name, **config_overrides))
@@ -0,0 +1,104 @@
+import re
+import zlib
+import numpy as np
+
+#near-duplicate detection with MinHash + LSH
+#
+#scraped corpora repeat themselves: the same service description under two names, an FAQ copied with
+#one word changed. Each copy costs an embedding call and a slot in the index, and crowds the search
+#results with the same text. Documents are reduced to sets of word shingles (runs of SHINGLE_SIZE
+#words); the MinHash signature of a set estimates its Jaccard similarity with any other set, and LSH
+#banding of the signatures finds the candidate pairs without comparing every pair. Candidates whose
+#estimated similarity reaches the threshold are clustered; the first document of each cluster is kept
+#(and embedded) and the ids of the others are recorded in its "aliases" metadata.
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32 #32 bands of 4 rows: pairs above ~0.6 similarity almost always share a band, and are then checked against the threshold
+DEFAULT_THRESHOLD = 0.8
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def get_shingles(text, size=SHINGLE_SIZE):
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    return {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+
+
+def get_signatures(texts, num_perm=NUM_PERM, seed=1):
+    """(len(texts), num_perm) uint64 MinHash signatures, one multiply-shift hash per permutation."""
+
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+
+    with np.errstate(over="ignore"): #the products wrap around 2^64 on purpose
+        for row, text in enumerate(texts):
+            shingles = get_shingles(text)
+            hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+            signatures[row] = ((hashes[:, None] * multipliers + offsets) >> np.uint64(32)).min(axis=0)
+
+    return signatures
+
+
+def find_clusters(signatures, threshold=DEFAULT_THRESHOLD, bands=BANDS):
+    """Lists of row indices whose estimated Jaccard similarity reaches threshold, smallest index first; singletons included."""
+
+    rows = signatures.shape[1] // bands
+    parents = list(range(len(signatures)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for band in range(bands):
+        buckets = {}
+
+        for row, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(key.tobytes(), []).append(row)
+
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    root_i, root_j = find(i), find(j)
+
+                    if root_i != root_j and np.mean(signatures[i] == signatures[j]) >= threshold:
+                        parents[max(root_i, root_j)] = min(root_i, root_j) #the earliest document stays the representative
+
+    clusters = {}
+
+    for row in range(len(signatures)):
+        clusters.setdefault(find(row), []).append(row)
+
+    return list(clusters.values())
+
+
+def deduplicate(items, threshold=DEFAULT_THRESHOLD):
+    """(items to embed, stats): one item per cluster of near-duplicate documents, the others' ids in its metadata "aliases".
+
+    aliases is a comma-separated string, since Chroma metadata values have to be scalars.
+    """
+
+    clusters = find_clusters(get_signatures([item['document'] for item in items]), threshold)
+    kept = []
+
+    for cluster in sorted(clusters):
+        item = items[cluster[0]]
+
+        if len(cluster) > 1:
+            item = dict(item, metadata=dict(item.get('metadata') or {}, aliases=",".join(str(items[row]['id']) for row in cluster[1:])))
+
+        kept.append(item)
+
+    stats = {
+        "items": len(items),
+        "kept": len(kept),
+        "clusters": sum(1 for cluster in clusters if len(cluster) > 1),
+        "calls_saved": len(items) - len(kept),
+    }
+
+    return kept, stats
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+#persistent, content-addressed embedding cache
+#
+#an embedding depends only on the model, its output settings and the exact input, so we key each
+#vector by sha256(model id, dimensions, normalize flag, sha256(input)) and store it as raw float32
+#bytes (4 KB for a 1024-dim vector, against ~11 KB as JSON text) in SQLite. The prefetch scripts use
+#it so unchanged documents are never re-embedded, and the libs can wrap Chroma's embedding function
+#with it so repeated questions skip the Bedrock call. Turn it on for the libs with:
+#
+#    BEDROCK_EMBEDDING_CACHE=/tmp/embeddings.db streamlit run rag_app.py
+
+CACHE_PATH_ENV_VAR = "BEDROCK_EMBEDDING_CACHE"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    dimensions INTEGER,
+    normalize INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    created REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_model_id ON embeddings (model_id);
+"""
+
+
+def get_cache_key(model_id, content, dimensions=None, normalize=True):
+    """content is the model input: text, or bytes (e.g. an image or a serialized request body)."""
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    settings = f"{model_id}\0{dimensions}\0{int(bool(normalize))}\0".encode("utf-8")
+    return hashlib.sha256(settings + hashlib.sha256(content).digest()).digest()
+
+
+def pack_vector(vector):
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data):
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache():
+    def __init__(self, path):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None) #autocommit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA mmap_size=268435456")
+        self._connection.executescript(SCHEMA)
+
+    def get_many(self, model_id, contents, dimensions=None, normalize=True):
+        """Cached vectors for each content, None where there is none yet."""
+
+        keys = [get_cache_key(model_id, content, dimensions, normalize) for content in contents]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), 500): #stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update(rows)
+
+            hits = sum(1 for key in keys if key in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(keys) - hits
+
+        return [unpack_vector(found[key]) if key in found else None for key in keys]
+
+    def get(self, model_id, content, dimensions=None, normalize=True):
+        return self.get_many(model_id, [content], dimensions, normalize)[0]
+
+    def put_many(self, model_id, contents, vectors, dimensions=None, normalize=True):
+        now = time.time()
+        rows = [(get_cache_key(model_id, content, dimensions, normalize), model_id, dimensions, int(bool(normalize)), pack_vector(vector), now)
+                for content, vector in zip(contents, vectors)]
+
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._connection.execute("COMMIT")
+            self.stats["writes"] += len(rows)
+
+    def put(self, model_id, content, vector, dimensions=None, normalize=True):
+        self.put_many(model_id, [content], [vector], dimensions, normalize)
+
+    def get_or_compute(self, model_id, content, compute, dimensions=None, normalize=True):
+        """The cached vector for content, or compute() stored and returned on a miss."""
+
+        vector = self.get(model_id, content, dimensions, normalize)
+
+        if vector is None:
+            vector = compute()
+            self.put(model_id, content, vector, dimensions, normalize)
+
+        return vector
+
+    def get_hit_rate(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return self.stats["hits"] / lookups if lookups else 0.0
+
+    def invalidate(self, model_id=None): #drop every vector for a model, or everything
+        with self._lock:
+            if model_id is None:
+                self._connection.execute("DELETE FROM embeddings")
+            else:
+                self._connection.execute("DELETE FROM embeddings WHERE model_id = ?", (model_id,))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path=None):
+    """The process-wide cache at path (or $BEDROCK_EMBEDDING_CACHE), or None when caching is off."""
+
+    path = path or os.environ.get(CACHE_PATH_ENV_VAR)
+
+    if not path:
+        return None
+
+    with _caches_lock:
+        cache = _caches.get(path)
+
+        if cache is None:
+            cache = _caches[path] = EmbeddingCache(path)
+
+        return cache
+
+
+#Chroma integration; chromadb is only imported when an embedding function is actually wrapped
+
+_wrapper_class = None
+
+
+def _get_wrapper_class():
+    global _wrapper_class
+
+    if _wrapper_class is None:
+        import numpy as np
+        from chromadb.api.types import EmbeddingFunction
+
+        class CachedEmbeddingFunction(EmbeddingFunction):
+            """Serves Chroma embedding calls from an EmbeddingCache; only the misses reach the wrapped function.
+
+            Reports the wrapped function's name and config, so collections created with either are interchangeable.
+            """
+
+            def __init__(self, embedding_function, cache, model_id, dimensions=None, normalize=True):
+                self.embedding_function = embedding_function
+                self.cache = cache
+                self.model_id = model_id
+                self.dimensions = dimensions
+                self.normalize = normalize
+
+            def __call__(self, input):
+                vectors = self.cache.get_many(self.model_id, input, self.dimensions, self.normalize)
+                missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+                if missing:
+                    computed = self.embedding_function([input[i] for i in missing])
+                    self.cache.put_many(self.model_id, [input[i] for i in missing], computed, self.dimensions, self.normalize)
+
+                    for i, vector in zip(missing, computed):
+                        vectors[i] = vector
+
+                return [np.asarray(vector, dtype=np.float32) for vector in vectors]
+
+            def name(self):
+                return self.embedding_function.name()
+
+            def get_config(self):
+                return self.embedding_function.get_config()
+
+            def is_legacy(self):
+                return self.embedding_function.is_legacy()
+
+            def default_space(self):
+                return self.embedding_function.default_space()
+
+            def supported_spaces(self):
+                return self.embedding_function.supported_spaces()
+
+        _wrapper_class = CachedEmbeddingFunction
+
+    return _wrapper_class
+
+
+def with_embedding_cache(embedding_function, model_id, dimensions=None, normalize=True, path=None):
+    """Wrap a Chroma embedding function with the process-wide cache; returns it unchanged when caching is off."""
+
+    cache = get_embedding_cache(path)
+
+    if cache is None:
+        return embedding_function
+
+    return _get_wrapper_class()(embedding_function, cache, model_id, dimensions, normalize)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+import numpy as np
+
+#compact on-disk format for precomputed embeddings
+#
+#a dump is two files sharing a base name: <name>.npy holds the vectors as one N x D float32 (or
+#float16) matrix, and <name>.items.json holds the ids, documents and metadata in the same row order.
+#As JSON text a 1024-dim vector is ~11 KB and json.load has to build a Python float for every
+#component; as float32 it is 4 KB (2 KB as float16) and np.load(mmap_mode="r") maps the matrix
+#instead of reading it, so rows are handed to Chroma as views without being copied or parsed.
+#
+#convert the existing JSON dumps with:
+#
+#    python -m common.embedding_file data/*_with_embeddings.json
+#
+#JSON dumps are never loaded whole: iter_json_records parses the top-level array one object at a time,
+#and iter_embedding_batches packs records into fixed-size float32 batches, so converting or ingesting
+#a multi-GB dump needs memory for one batch (plus the ids, documents and metadata), not the whole file
+#as Python floats (~30 bytes each, against 4 as float32).
+
+FORMAT_VERSION = 1
+DTYPES = ("float32", "float16")
+
+
+def get_base_path(path): #services_with_embeddings{.json,.npy,.items.json} -> services_with_embeddings
+    for suffix in (".items.json", ".npy", ".json"):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+
+    return path
+
+
+def get_paths(path):
+    base_path = get_base_path(path)
+    return base_path + ".npy", base_path + ".items.json"
+
+
+def write_embedding_file(path, items, embeddings, dtype="float32"):
+    """Write items (dicts with "id", "document", "metadata") and their embeddings, in the same order.
+
+    embeddings may be any iterable of vectors, such as a generator reading them from a checkpoint;
+    the matrix is filled row by row through a memory map, so the whole set is never held as Python floats.
+    """
+
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+
+    matrix_path, items_path = get_paths(path)
+    records = [{"id": item["id"], "document": item["document"], "metadata": item.get("metadata")} for item in items]
+    matrix = None
+
+    for row, embedding in enumerate(embeddings):
+        if matrix is None: #the dimensions are only known once the first vector arrives
+            matrix = np.lib.format.open_memmap(matrix_path + ".tmp", mode="w+", dtype=dtype, shape=(len(records), len(embedding)))
+
+        matrix[row] = embedding
+
+    written = 0 if matrix is None else row + 1
+
+    if written != len(records):
+        raise ValueError(f"Got {written} embeddings for {len(records)} items")
+
+    if matrix is None:
+        matrix = np.lib.format.open_memmap(matrix_path + ".tmp", mode="w+", dtype=dtype, shape=(0, 0))
+
+    dimensions = matrix.shape[1]
+    matrix.flush()
+    del matrix #release the map before renaming the file
+
+    with open(items_path + ".tmp", "w") as items_file:
+        json.dump({"version": FORMAT_VERSION, "count": len(records), "dimensions": dimensions, "dtype": dtype, "items": records}, items_file)
+
+    #the sidecar goes last: a reader that finds it can trust the matrix next to it
+    os.replace(matrix_path + ".tmp", matrix_path)
+    os.replace(items_path + ".tmp", items_path)
+
+    return matrix_path, items_path
+
+
+def read_embedding_file(path, mmap=True):
+    """Return (items, matrix) for a dump; the matrix is a read-only memory map unless mmap is False."""
+
+    matrix_path, items_path = get_paths(path)
+
+    if not os.path.exists(items_path):
+        raise FileNotFoundError(f"No embedding file at {items_path}; convert a JSON dump with: python -m common.embedding_file {get_base_path(path)}.json")
+
+    with open(items_path) as items_file:
+        sidecar = json.load(items_file)
+
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+
+    if matrix.shape[0] != sidecar["count"]:
+        raise ValueError(f"{matrix_path} has {matrix.shape[0]} rows but {items_path} lists {sidecar['count']} items")
+
+    return sidecar["items"], matrix
+
+
+def is_json_dump(path):
+    return path.endswith(".json") and not path.endswith(".items.json")
+
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_records(json_path, chunk_size=1 << 20):
+    """Yield the elements of the top-level JSON array in json_path one at a time, reading chunk_size characters at a time."""
+
+    decoder = json.JSONDecoder()
+
+    with open(json_path) as json_file:
+        buffer = json_file.read(chunk_size).lstrip()
+
+        if not buffer.startswith("["):
+            raise ValueError(f"{json_path} does not hold a JSON array")
+
+        position = 1
+
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError: #the next element runs past the buffer: read on
+                more = json_file.read(chunk_size)
+
+                if not more:
+                    raise ValueError(f"{json_path} ends in the middle of its array")
+
+                buffer = buffer[position:] + more #drop what is already parsed, so the buffer stays around one chunk
+                position = 0
+                continue
+
+            yield record
+
+
+def iter_json_batches(json_path, batch_size=1000, dtype="float32"):
+    """Yield (items, embeddings) from a *_with_embeddings.json dump, batch_size records at a time.
+
+    items are the records without their "embedding" key; embeddings is a batch_size x D array.
+    """
+
+    items, matrix = [], None
+
+    for record in iter_json_records(json_path):
+        embedding = record.pop("embedding")
+
+        if matrix is None: #a fresh array per batch, since the consumer may still hold the last one
+            matrix = np.empty((batch_size, len(embedding)), dtype=dtype)
+
+        matrix[len(items)] = embedding
+        items.append(record)
+
+        if len(items) == batch_size:
+            yield items, matrix
+            items, matrix = [], None
+
+    if items:
+        yield items, matrix[:len(items)]
+
+
+def iter_embedding_batches(path, batch_size=1000):
+    """Yield (items, embeddings) batches from either format; .npy batches are views of the memory map."""
+
+    if is_json_dump(path):
+        yield from iter_json_batches(path, batch_size)
+        return
+
+    items, matrix = read_embedding_file(path)
+
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size], matrix[start:start + batch_size]
+
+
+def as_float32(rows): #Chroma stores float32; this is a no-op (no copy) for a float32 dump
+    return np.asarray(rows, dtype=np.float32)
+
+
+def convert_json_file(json_path, dtype="float32", batch_size=1000):
+    """Convert a *_with_embeddings.json dump to the binary format next to it, in bounded memory.
+
+    The number of rows is only known at the end, so the vectors are first streamed to a scratch file
+    and then copied into the matrix batch by batch.
+    """
+
+    items = []
+    dimensions = 0
+
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(json_path))) as scratch:
+        for batch_items, batch_embeddings in iter_json_batches(json_path, batch_size, dtype):
+            items.extend(batch_items)
+            dimensions = batch_embeddings.shape[1]
+            scratch.write(batch_embeddings.tobytes())
+
+        scratch.seek(0)
+
+        def read_rows():
+            for start in range(0, len(items), batch_size):
+                yield from np.frombuffer(scratch.read(min(batch_size, len(items) - start) * dimensions * np.dtype(dtype).itemsize), dtype=dtype).reshape(-1, dimensions)
+
+        return write_embedding_file(json_path, items, read_rows(), dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert *_with_embeddings.json dumps to .npy + .items.json")
+    parser.add_argument("json_files", nargs="+")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32", help="float16 halves the size again, at ~3 significant digits")
+    args = parser.parse_args()
+
+    for json_path in args.json_files:
+        matrix_path, items_path = convert_json_file(json_path, args.dtype)
+        print(f"{json_path} ({os.path.getsize(json_path) // 1024} KB) -> {matrix_path} ({os.path.getsize(matrix_path) // 1024} KB) + "
+              f"{items_path} ({os.path.getsize(items_path) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from common.embedding_cache import with_embedding_cache
+from common.lazy import lazy_import
+chromadb = lazy_import("chromadb")
+embedding_functions = lazy_import("chromadb.utils.embedding_functions")
+np = lazy_import("numpy")
+quantized_index = lazy_import("common.quantized_index")
+vector_store = lazy_import("common.vector_store")
+
+#Titan Text Embeddings v2 profiles
+#
+#Titan v2 returns 256, 512 or 1024 dimensions, normalized or not. A profile picks those, plus how the
+#vectors are searched: "float" keeps them in a Chroma (HNSW) collection, while "int8" and "binary"
+#keep a quantized copy in a NumPy index that shortlists candidates and re-scores them against the
+#full-precision vectors (common/quantized_index.py). The quantized codes are computed locally from
+#the float vectors, so one dump per dimensions/normalize setting serves every index type.
+#
+#every step takes the profile: prefetch writes the dump for it, populate builds its collection or
+#index, and the libs pick it up from BEDROCK_EMBEDDING_PROFILE:
+#
+#    python prefetch_embeddings.py --profile titan-v2-256 && python populate_collection.py --profile titan-v2-256
+#    BEDROCK_EMBEDDING_PROFILE=titan-v2-256 streamlit run rag_app.py
+#
+#the default profile is what the labs always used (1024 dims, normalized, float) and keeps the
+#original file and collection names. benchmarks/embedding_profiles.py compares recall, latency and
+#memory across the profiles.
+
+MODEL_ID = "amazon.titan-embed-text-v2:0"
+PROFILE_ENV_VAR = "BEDROCK_EMBEDDING_PROFILE"
+DEFAULT_PROFILE = "titan-v2-1024"
+EMBEDDING_WORKERS = 8 #concurrent invoke_model calls when a batch of texts is embedded; Chroma's client pools 10 connections
+
+PROFILES = {
+    "titan-v2-1024": {"dimensions": 1024, "normalize": True, "index": "float"},
+    "titan-v2-512": {"dimensions": 512, "normalize": True, "index": "float"},
+    "titan-v2-256": {"dimensions": 256, "normalize": True, "index": "float"},
+    "titan-v2-1024-int8": {"dimensions": 1024, "normalize": True, "index": "int8", "rescore": 4},
+    "titan-v2-1024-binary": {"dimensions": 1024, "normalize": True, "index": "binary", "rescore": 10},
+    "titan-v2-512-binary": {"dimensions": 512, "normalize": True, "index": "binary", "rescore": 10},
+}
+
+
+def get_profile(name=None):
+    """The named profile (default: $BEDROCK_EMBEDDING_PROFILE, then titan-v2-1024), with its "name" added."""
+
+    name = name or os.environ.get(PROFILE_ENV_VAR) or DEFAULT_PROFILE
+
+    if name not in PROFILES:
+        raise ValueError(f"Unknown embedding profile {name!r}; choose one of {', '.join(PROFILES)}")
+
+    return dict(PROFILES[name], name=name)
+
+
+def get_vectors_name(profile): #profiles with the same dimensions and normalize flag share their vectors
+    return f"titan-v2-{profile['dimensions']}" + ("" if profile["normalize"] else "-unnormalized")
+
+
+def get_dump_path(base_path, profile):
+    """services_with_embeddings -> services_with_embeddings.npy for the default vectors, services_with_embeddings.titan-v2-256.npy etc. otherwise."""
+
+    if get_vectors_name(profile) == get_vectors_name(get_profile(DEFAULT_PROFILE)):
+        return base_path + ".npy"
+
+    return f"{base_path}.{get_vectors_name(profile)}.npy"
+
+
+def get_collection_name(collection_name, profile):
+    return collection_name if profile["name"] == DEFAULT_PROFILE else f"{collection_name}_{profile['name']}"
+
+
+def get_request_body(text, profile):
+    return json.dumps({"inputText": text, "dimensions": profile["dimensions"], "normalize": profile["normalize"]})
+
+
+#Chroma embedding function; defined on first use so importing this module does not import chromadb
+
+_function_class = None
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(): #shared by every embedding function; Titan takes one text per request
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="embed")
+
+        return _executor
+
+
+def _get_function_class():
+    global _function_class
+
+    if _function_class is None:
+        class TitanProfileEmbeddingFunction(embedding_functions.AmazonBedrockEmbeddingFunction):
+            """Chroma's Bedrock embedding function, but requesting the profile's dimensions and normalization.
+
+            Keeps the "amazon_bedrock" name, so it opens collections created with the stock function.
+            """
+
+            def __init__(self, session, profile, **client_args):
+                super().__init__(session=session, model_name=MODEL_ID, **client_args)
+                self.profile = profile
+
+            def embed(self, text):
+                response = self._client.invoke_model(
+                    body=get_request_body(text, self.profile),
+                    modelId=self.model_name,
+                    accept="application/json",
+                    contentType="application/json",
+                )
+                return np.array(json.loads(response["body"].read())["embedding"], dtype=np.float32)
+
+            def __call__(self, input):
+                if len(input) <= 1:
+                    return [self.embed(text) for text in input]
+
+                return list(_get_executor().map(self.embed, input)) #a batch of queries (common/batch_search.py) is embedded concurrently, in order
+
+        _function_class = TitanProfileEmbeddingFunction
+
+    return _function_class
+
+
+def get_embedding_function(session, profile=None, **client_args):
+    """The profile's embedding function, behind the embedding cache when BEDROCK_EMBEDDING_CACHE is set.
+
+    The in-memory query cache is not part of it: collection_registry puts that in front of queries only.
+    """
+
+    profile = profile or get_profile()
+    embedding_function = _get_function_class()(session, profile, **client_args)
+
+    return with_embedding_cache(embedding_function, MODEL_ID, profile["dimensions"], profile["normalize"]) #shared on-disk tier
+
+
+def open_collection(path, collection_name, session, profile=None, client=None, store=None, embedding_function=None, **client_args):
+    """The profile's collection in the Chroma database at path, or its quantized index for int8/binary profiles.
+
+    Any of them answers query(query_texts=..., n_results=...) with Chroma's result shape. client: an
+    already open Chroma client for path (common/collection_registry.py shares one per database).
+    store: a vector store from common/vector_store.py (default: $BEDROCK_VECTOR_STORE, then chroma);
+    the in-memory ones load the profile's dump from the directory that holds the Chroma database.
+    embedding_function: default get_embedding_function(session, profile, **client_args).
+    """
+
+    profile = profile or get_profile()
+    store = vector_store.get_store_name(store)
+    embedding_function = embedding_function or get_embedding_function(session, profile, **client_args)
+    name = get_collection_name(collection_name, profile)
+
+    if profile["index"] != "float":
+        return quantized_index.QuantizedIndex(path, name, embedding_function, profile["rescore"])
+
+    if store != "chroma":
+        if collection_name not in vector_store.COLLECTION_DUMPS:
+            raise ValueError(f"No embedding dump is known for {collection_name}; use the chroma store")
+
+        base_path = os.path.join(os.path.dirname(os.path.abspath(path)), vector_store.COLLECTION_DUMPS[collection_name])
+        return vector_store.open_vector_store(get_dump_path(base_path, profile), store, embedding_function)
+
+    client = client or chromadb.PersistentClient(path=path)
+    return client.get_collection(name, embedding_function=embedding_function)
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from common.clients import _freeze, get_bedrock_client
+from common.lazy import lazy_import
+concurrency = lazy_import("common.concurrency") #error classification, only needed when the primary fails
+
+#optional cross-region request hedging for interactive paths
+#
+#if the primary region has not answered within its recent p95 latency, the same request is sent to a
+#secondary region and whichever answers first wins. Only the slowest ~5% of requests are duplicated,
+#which cuts the tail without doubling cost. boto3 calls cannot be aborted once sent, so "cancelling"
+#the loser means dropping its result and closing its response body or event stream. A primary that
+#fails early with a throttle, a 5xx or a connection error fails over to the secondary at once; any
+#other error (a malformed request, missing access) is the caller's and is raised as is.
+#
+#turn it on by naming the secondary region:
+#
+#    BEDROCK_HEDGE_REGION=us-east-1 streamlit run chatbot_app.py
+
+HEDGE_REGION_ENV_VAR = "BEDROCK_HEDGE_REGION"
+
+
+def _close_response(response): #give the loser's connection back to the pool
+    for key in ("body", "stream"):
+        if response and hasattr(response.get(key), "close"):
+            response[key].close()
+
+
+class HedgedBedrockClient():
+    def __init__(self, primary, secondary, hedge_after_seconds=None, percentile=0.95, min_samples=20,
+                 default_hedge_after_seconds=2.0, secondary_model_ids=None, max_workers=64):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_after_seconds = hedge_after_seconds #fixed threshold; None means track the primary's percentile
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_hedge_after_seconds = default_hedge_after_seconds #used until there are enough samples
+        self.secondary_model_ids = secondary_model_ids or {} #e.g. a different inference profile in the other region
+
+        self.stats = {"requests": 0, "hedged": 0, "failovers": 0, "secondary_wins": 0, "latency_saved_seconds": 0.0}
+
+        self._latencies = deque(maxlen=500) #recent primary latencies, winners and losers alike
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-bedrock")
+
+    def get_hedge_delay(self):
+        if self.hedge_after_seconds is not None:
+            return self.hedge_after_seconds
+
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_hedge_after_seconds
+
+            ordered = sorted(self._latencies)
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def get_hedge_rate(self):
+        with self._lock:
+            return self.stats["hedged"] / self.stats["requests"] if self.stats["requests"] else 0.0
+
+    def _timed(self, client, operation, kwargs, is_primary):
+        started = time.monotonic()
+        response = getattr(client, operation)(**kwargs)
+        elapsed = time.monotonic() - started
+
+        if is_primary:
+            with self._lock:
+                self._latencies.append(elapsed)
+
+        return response, elapsed
+
+    def _call(self, operation, kwargs):
+        started = time.monotonic()
+
+        with self._lock:
+            self.stats["requests"] += 1
+
+        primary = self._executor.submit(self._timed, self.primary, operation, kwargs, True)
+        done, _ = wait([primary], timeout=self.get_hedge_delay())
+
+        if done:
+            error = primary.exception()
+
+            if error is None: #the common case: no hedge needed
+                return primary.result()[0]
+
+            if not (concurrency.is_throttling_error(error) or concurrency.is_transient_error(error)):
+                raise error #the other region would reject the same request
+
+        secondary_kwargs = dict(kwargs, modelId=self.secondary_model_ids.get(kwargs["modelId"], kwargs["modelId"]))
+        secondary = self._executor.submit(self._timed, self.secondary, operation, secondary_kwargs, False)
+
+        with self._lock:
+            self.stats["failovers" if done else "hedged"] += 1 #only slow primaries count towards the hedge rate
+
+        pending = {secondary} if done else {primary, secondary} #a primary that already failed is out of the race
+        winner = None
+        error = primary.exception() if done else None
+
+        while pending and winner is None:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                if future.exception() is None:
+                    winner = future
+                    break
+
+                error = future.exception()
+
+        for future in pending: #the loser: skip it if it has not started, otherwise drop its response
+            if not future.cancel():
+                future.add_done_callback(lambda f: _close_response(f.result()[0]) if f.exception() is None else None)
+
+        if winner is None:
+            raise error
+
+        if winner is secondary:
+            winner_elapsed = time.monotonic() - started
+
+            with self._lock:
+                self.stats["secondary_wins"] += 1
+
+            def record_saving(future): #once the slow primary finishes we know how much waiting we avoided
+                if future.exception() is None and not future.cancelled():
+                    with self._lock:
+                        self.stats["latency_saved_seconds"] += max(0.0, future.result()[1] - winner_elapsed)
+
+            primary.add_done_callback(record_saving)
+
+        return winner.result()[0]
+
+    def converse(self, **kwargs):
+        return self._call("converse", kwargs)
+
+    def converse_stream(self, **kwargs): #hedges on time to the first byte of the stream
+        return self._call("converse_stream", kwargs)
+
+    def invoke_model(self, **kwargs):
+        return self._call("invoke_model", kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+
+_hedged_clients = {}
+_hedged_clients_lock = threading.Lock()
+
+
+def get_hedged_bedrock_client(region_name=None, secondary_region=None, **hedge_args):
+    """The shared client for region_name, hedged to secondary_region (or $BEDROCK_HEDGE_REGION) when one is set.
+
+    Returns the plain shared client when hedging is off, so callers can use it unconditionally.
+    """
+
+    secondary_region = secondary_region or os.environ.get(HEDGE_REGION_ENV_VAR)
+    primary = get_bedrock_client(region_name=region_name)
+
+    if not secondary_region or secondary_region == primary.meta.region_name:
+        return primary
+
+    key = (primary.meta.region_name, secondary_region, _freeze(hedge_args))
+
+    with _hedged_clients_lock: #one per region pair and hedge settings, so the latency window survives across calls
+        client = _hedged_clients.get(key)
+
+        if client is None:
+            client = HedgedBedrockClient(primary, get_bedrock_client(region_name=secondary_region), **hedge_args)
+            _hedged_clients[key] = client
+
+        return client
+
+
+def get_hedging_stats(): #hedge rate and latency saved for every hedged client in this process
+    with _hedged_clients_lock:
+        return {f"{primary}->{secondary}" + (f" {dict(hedge_args)}" if hedge_args else ""): dict(client.stats, hedge_rate=client.get_hedge_rate())
+                for (primary, secondary, hedge_args), client in _hedged_clients.items()}
@@ -0,0 +1,54 @@
+import base64
+from io import BytesIO
+from common.lazy import lazy_import
+Image = lazy_import("PIL.Image")
+
+#images downscaled before they are sent for embedding
+#
+#Titan Multimodal Embeddings resizes its input itself, so a 12-megapixel photo costs a multi-MB
+#base64 upload (and the decode on our side) for the same vector a few hundred pixels would give.
+#Images are shrunk to at most max_side pixels on their long side and re-encoded as JPEG. JPEGs are
+#decoded in draft mode: libjpeg scales them by 1/2, 1/4 or 1/8 while decoding, so a large photo is
+#never fully decompressed. Images that are already small enough are sent as they are.
+#
+#data/prefetch_image_embeddings.py records the max_side it used in every item's metadata, and
+#image_search_lib scales query images the same way, so query vectors are comparable with the indexed
+#ones. Items without it (the checked-in images_with_embeddings dump, embedded from the full-size
+#files) get full-size queries until the dump is regenerated.
+
+MAX_IMAGE_SIDE = 512
+JPEG_QUALITY = 90
+PASSTHROUGH_FORMATS = ("JPEG", "PNG") #formats the model takes as they are
+
+
+def downscale_image(image_bytes, max_side=MAX_IMAGE_SIDE):
+    """image_bytes, or a JPEG of it scaled to fit max_side x max_side when it is larger (max_side 0: never scale)."""
+
+    image = Image.open(BytesIO(image_bytes))
+    width, height = image.size
+
+    if not max_side or (max(width, height) <= max_side and image.format in PASSTHROUGH_FORMATS):
+        return image_bytes
+
+    scale = min(1.0, max_side / max(width, height))
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if image.format == "JPEG":
+        image.draft("RGB", target) #decode at the smallest 1/2^n scale that is still at least target
+
+    image = image.convert("RGB")
+    image.thumbnail(target, Image.LANCZOS)
+
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=JPEG_QUALITY)
+
+    return output.getvalue()
+
+
+def prepare_image_file(file_path, max_side=MAX_IMAGE_SIDE):
+    """(base64 of the downscaled image, original size in bytes) for file_path; picklable, for process pools."""
+
+    with open(file_path, "rb") as image_file:
+        image_bytes = image_file.read()
+
+    return base64.b64encode(downscale_image(image_bytes, max_side)).decode("utf8"), len(image_bytes)
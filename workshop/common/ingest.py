@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common.embedding_file import iter_embedding_batches, as_float32
+
+#bulk ingest and incremental sync of precomputed embeddings into Chroma
+#
+#one collection.add per item pays the client round trip, validation and an incremental HNSW insert
+#every time; adding a few thousand rows per call amortizes all of that. Batches are capped at the
+#client's max batch size (client.get_max_batch_size(), ~5k rows for a local PersistentClient) and the
+#vectors are passed as slices of the memory-mapped matrix, so nothing is copied on our side.
+#Several collections can be loaded at once; each one is written by its own thread.
+#
+#initialize_collection syncs rather than only filling an empty collection: every document is hashed
+#(text + metadata), compared with what the collection holds, and only new or changed ids are upserted
+#and removed ids deleted. The hashes are kept in a manifest next to the database, so a re-sync of an
+#unchanged corpus reads no vectors and only a sample of the collection: the manifest is trusted when it
+#names the same collection (its id changes when it is deleted and rebuilt), the counts match and a
+#spread of MANIFEST_SAMPLE_SIZE entries is still stored with the recorded hashes. Otherwise the hashes
+#are recomputed from the collection's contents.
+#Changing the embedding model does not change any hash: delete the collection to re-embed everything.
+#Sources are read in batches (memory-map slices, or streamed from a legacy JSON dump), never whole.
+
+MANIFEST_SAMPLE_SIZE = 64 #stored entries checked against the manifest before it is trusted
+
+
+def get_batch_size(collection, batch_size=None): #the requested size, capped at what the client accepts in one call
+    max_batch_size = collection._client.get_max_batch_size()
+    return min(batch_size, max_batch_size) if batch_size else max_batch_size
+
+
+def iter_batches(items, embeddings, batch_size):
+    """Yield (ids, documents, metadatas, embeddings) for consecutive runs of at most batch_size rows.
+
+    With embeddings None the batch embeddings are None too, and Chroma embeds the documents itself.
+    """
+
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+
+        yield (
+            [str(item['id']) for item in batch],
+            [item['document'] for item in batch],
+            [item['metadata'] for item in batch],
+            None if embeddings is None else as_float32(embeddings[start:start + batch_size]),
+        )
+
+
+def ingest(collection, items, embeddings, batch_size=None, upsert=False):
+    """Add (or upsert) every item with its embedding to collection, batch by batch; returns a stats dict."""
+
+    batch_size = get_batch_size(collection, batch_size)
+    write = collection.upsert if upsert else collection.add
+    started = time.perf_counter()
+    batches = 0
+
+    for ids, documents, metadatas, batch_embeddings in iter_batches(items, embeddings, batch_size):
+        write(ids=ids, documents=documents, metadatas=metadatas, embeddings=batch_embeddings)
+        batches += 1
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        "documents": len(items),
+        "batches": batches,
+        "batch_size": batch_size,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(len(items) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+#incremental sync
+
+def get_content_hash(item):
+    content = json.dumps({"document": item["document"], "metadata": item.get("metadata")}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_manifest_path(manifest_dir, collection_name):
+    return os.path.join(manifest_dir, f"{collection_name}.manifest.json")
+
+
+def read_manifest(manifest_path): #{"collection_id", "hashes": {id: content hash}, ...} as of the last sync, or None
+    if not manifest_path or not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(manifest_path, collection, source_file, hashes):
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump({"collection": collection.name, "collection_id": str(collection.id), "source": source_file, "synced": time.time(), "hashes": hashes}, manifest_file)
+
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def manifest_matches(collection, manifest):
+    """Whether manifest still describes collection: same collection id and count, and a sample of its entries stored unchanged."""
+
+    hashes = manifest["hashes"]
+
+    if manifest.get("collection_id") != str(collection.id) or len(hashes) != collection.count():
+        return False
+
+    ids = list(hashes)
+    sample = ids[::max(1, len(ids) // MANIFEST_SAMPLE_SIZE)][:MANIFEST_SAMPLE_SIZE]
+
+    if not sample:
+        return True
+
+    stored = collection.get(ids=sample, include=["documents", "metadatas"])
+
+    if len(stored["ids"]) != len(sample): #rewritten out of band with other ids
+        return False
+
+    return all(hashes[item_id] == get_content_hash({"document": document, "metadata": metadata})
+               for item_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]))
+
+
+def get_collection_hashes(collection, batch_size=None):
+    """{id: content hash} for everything currently in collection, read page by page."""
+
+    batch_size = get_batch_size(collection, batch_size)
+    hashes = {}
+
+    for offset in range(0, collection.count(), batch_size):
+        page = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+
+        for item_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            hashes[item_id] = get_content_hash({"document": document, "metadata": metadata})
+
+    return hashes
+
+
+def sync_collection(collection, batches, batch_size=None, manifest_path=None, source_file=None):
+    """Make collection hold exactly the items in batches: upsert new and changed ids, delete the rest; returns a stats dict.
+
+    batches yields (items, embeddings) with the embeddings in item order (only the changed rows are
+    read), or embeddings None to have Chroma's embedding function embed just the changed documents.
+    Only one batch is held at a time, plus the {id: hash} map.
+    """
+
+    started = time.perf_counter()
+    manifest = read_manifest(manifest_path)
+
+    if manifest is not None and manifest_matches(collection, manifest):
+        indexed = manifest["hashes"]
+    else: #no manifest, or the collection was changed behind its back
+        indexed = get_collection_hashes(collection, batch_size)
+
+    hashes = {}
+    added = updated = 0
+
+    for items, embeddings in batches:
+        batch_hashes = [get_content_hash(item) for item in items]
+        rows = [row for row, item in enumerate(items) if indexed.get(str(item['id'])) != batch_hashes[row]]
+
+        if len(rows) == len(items): #all new (a fresh collection) or all changed: pass the batch through as is
+            ingest(collection, items, embeddings, batch_size, upsert=True)
+        elif rows:
+            ingest(collection, [items[row] for row in rows], None if embeddings is None else embeddings[rows], batch_size, upsert=True)
+
+        new = sum(1 for row in rows if str(items[row]['id']) not in indexed)
+        added += new
+        updated += len(rows) - new
+        hashes.update((str(item['id']), item_hash) for item, item_hash in zip(items, batch_hashes))
+
+    removed = [item_id for item_id in indexed if item_id not in hashes]
+    batch_size = get_batch_size(collection, batch_size)
+
+    for start in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start:start + batch_size])
+
+    if manifest_path:
+        write_manifest(manifest_path, collection, source_file, hashes)
+
+    elapsed = time.perf_counter() - started
+    written = added + updated
+
+    return {
+        "documents": len(hashes),
+        "added": added,
+        "updated": updated,
+        "removed": len(removed),
+        "unchanged": len(hashes) - written,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(written / elapsed, 1) if written and elapsed > 0 else None,
+    }
+
+
+def initialize_collection(collection, source_file, batch_size=None, manifest_dir=None):
+    """Sync collection with source_file: an embedding dump (see common/embedding_file.py) or a legacy JSON dump, streamed."""
+
+    manifest_path = get_manifest_path(manifest_dir, collection.name) if manifest_dir else None
+    batches = iter_embedding_batches(source_file, get_batch_size(collection, batch_size))
+
+    stats = sync_collection(collection, batches, batch_size, manifest_path, source_file)
+
+    print(f"Synced collection {collection.name}: {stats['added']} added, {stats['updated']} updated, {stats['removed']} removed, "
+          f"{stats['unchanged']} unchanged in {stats['elapsed_seconds']} s"
+          + (f" ({stats['documents_per_second']} docs/s)" if stats['documents_per_second'] else ""))
+
+    return stats
+
+
+def initialize_collections(get_collection, sources, batch_size=None, parallel=True, manifest_dir=None):
+    """Sync several collections from {collection name: source file}, concurrently unless parallel is False.
+
+    get_collection(name) returns the (get-or-created) collection. Returns {collection name: stats}.
+    """
+
+    started = time.perf_counter()
+
+    def initialize(name):
+        return initialize_collection(get_collection(name), sources[name], batch_size, manifest_dir)
+
+    if parallel and len(sources) > 1:
+        with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="ingest") as executor:
+            results = dict(zip(sources, executor.map(initialize, sources)))
+    else:
+        results = {name: initialize(name) for name in sources}
+
+    elapsed = time.perf_counter() - started
+    written = sum(stats["added"] + stats["updated"] for stats in results.values())
+
+    if written:
+        print(f"Wrote {written} documents to {len(sources)} collections in {elapsed:.2f} s ({written / elapsed:.1f} docs/s)")
+
+    return results
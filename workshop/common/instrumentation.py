@@ -0,0 +1,321 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+#per-call latency and token instrumentation for bedrock-runtime clients
+#
+#hooks into botocore's event system, so every client built by common.clients is covered without
+#touching the libs. Each converse / converse_stream / invoke_model call records the model id, input
+#and output tokens, server latency, client latency and, for streams, time to first token and mean
+#inter-token latency into an in-process ring buffer. Failed calls are recorded too, with the error
+#code, or the exception class when no response came back at all (timeouts, dropped connections) or a
+#stream broke off. summarize() gives percentiles per model and operation, and the buffer can be
+#exported as JSON lines or Prometheus text (errors_total carries the error as a label).
+#
+#recording is off unless BEDROCK_METRICS=1 or enable() is called. When off, each hook is a single
+#flag check, so the cost is negligible.
+
+METRICS_ENV_VAR = "BEDROCK_METRICS"
+
+INSTRUMENTED_OPERATIONS = ("Converse", "ConverseStream", "InvokeModel")
+
+#Prometheus histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.environ.get(METRICS_ENV_VAR, "") not in ("", "0", "false")
+_records = deque(maxlen=10000)
+_histograms = {} #(metric, model_id, operation) -> [bucket counts..., +Inf count, sum]
+_counters = {} #(metric, model_id, operation, error) -> total; error is None except for errors_total
+_lock = threading.Lock()
+
+
+def enable(capacity=None):
+    global _enabled, _records
+
+    if capacity is not None:
+        with _lock:
+            _records = deque(_records, maxlen=capacity)
+
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _records.clear()
+        _histograms.clear()
+        _counters.clear()
+
+
+def _observe(metric, model_id, operation, value):
+    key = (metric, model_id, operation)
+    histogram = _histograms.get(key)
+
+    if histogram is None:
+        histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            histogram[i] += 1
+
+    histogram[len(LATENCY_BUCKETS)] += 1 #+Inf, which is also the count
+    histogram[-1] += value
+
+
+def _count(metric, model_id, operation, value, error=None):
+    key = (metric, model_id, operation, error)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def record(entry):
+    """Add one call's measurements; times are in seconds, missing values are None."""
+
+    with _lock:
+        _records.append(entry)
+
+        model_id, operation = entry["model_id"], entry["operation"]
+        _count("requests_total", model_id, operation, 1)
+
+        if entry.get("error"):
+            _count("errors_total", model_id, operation, 1, error=entry["error"])
+
+        for metric in ("input_tokens", "output_tokens"):
+            if entry.get(metric):
+                _count(f"{metric}_total", model_id, operation, entry[metric])
+
+        for metric in ("client_latency", "server_latency", "time_to_first_token", "inter_token_latency"):
+            if entry.get(metric) is not None:
+                _observe(f"{metric}_seconds", model_id, operation, entry[metric])
+
+
+#botocore event handlers
+
+def _before_parameter_build(params, model, context, **kwargs):
+    if not _enabled or model.name not in INSTRUMENTED_OPERATIONS:
+        return
+
+    context["instrumentation"] = {"model_id": params.get("modelId"), "operation": model.name, "started": time.perf_counter()}
+
+
+def _new_entry(call):
+    return {
+        "timestamp": time.time(),
+        "model_id": call["model_id"],
+        "operation": call["operation"],
+        "client_latency": time.perf_counter() - call["started"],
+        "server_latency": None,
+        "input_tokens": None,
+        "output_tokens": None,
+        "time_to_first_token": None,
+        "inter_token_latency": None,
+        "error": None,
+    }
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    call = context.get("instrumentation")
+
+    if call is None:
+        return
+
+    entry = _new_entry(call)
+
+    if http_response.status_code >= 300:
+        entry["error"] = parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+        record(entry)
+        return
+
+    if call["operation"] == "Converse":
+        usage = parsed.get("usage", {})
+        entry["input_tokens"] = usage.get("inputTokens")
+        entry["output_tokens"] = usage.get("outputTokens")
+        entry["server_latency"] = parsed.get("metrics", {}).get("latencyMs", 0) / 1000 or None
+        record(entry)
+    elif call["operation"] == "InvokeModel":
+        headers = http_response.headers
+        entry["input_tokens"] = _int_or_none(headers.get("x-amzn-bedrock-input-token-count"))
+        entry["output_tokens"] = _int_or_none(headers.get("x-amzn-bedrock-output-token-count"))
+        latency_ms = _int_or_none(headers.get("x-amzn-bedrock-invocation-latency"))
+        entry["server_latency"] = latency_ms / 1000 if latency_ms is not None else None
+        record(entry)
+    else: #the stream is still open; the wrapper records once it has been read
+        parsed["stream"] = TimedEventStream(parsed["stream"], entry, call["started"])
+
+
+def _after_call_error(exception, context, **kwargs): #no HTTP response at all: read timeouts, dropped connections
+    call = context.get("instrumentation")
+
+    if call is None:
+        return
+
+    entry = _new_entry(call)
+    entry["error"] = type(exception).__name__
+    record(entry)
+
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+
+class TimedEventStream():
+    """Wraps a converse_stream EventStream to measure time to first token and inter-token latency."""
+
+    def __init__(self, stream, entry, started):
+        self._stream = stream
+        self._entry = entry
+        self._started = started
+        self._recorded = False
+
+    def __iter__(self):
+        first_token = None
+        last_token = None
+        gaps = 0.0
+        deltas = 0
+
+        try:
+            for event in self._stream:
+                if "contentBlockDelta" in event:
+                    now = time.perf_counter()
+
+                    if first_token is None:
+                        first_token = now
+                    else:
+                        gaps += now - last_token
+
+                    last_token = now
+                    deltas += 1
+                elif "metadata" in event:
+                    usage = event["metadata"].get("usage", {})
+                    self._entry["input_tokens"] = usage.get("inputTokens")
+                    self._entry["output_tokens"] = usage.get("outputTokens")
+                    self._entry["server_latency"] = event["metadata"].get("metrics", {}).get("latencyMs", 0) / 1000 or None
+
+                yield event
+        except Exception as e:
+            self._entry["error"] = type(e).__name__
+            raise
+        finally:
+            if first_token is not None:
+                self._entry["time_to_first_token"] = first_token - self._started
+
+            if deltas > 1:
+                self._entry["inter_token_latency"] = gaps / (deltas - 1)
+
+            self._finish()
+
+    def _finish(self):
+        if not self._recorded:
+            self._recorded = True
+            self._entry["client_latency"] = time.perf_counter() - self._started #for a stream: until the last event was read
+            record(self._entry)
+
+    def close(self):
+        self._stream.close()
+        self._finish()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def instrument_client(client): #attach the hooks to a bedrock-runtime client; they do nothing until enabled
+    events = client.meta.events
+    events.register("before-parameter-build.bedrock-runtime", _before_parameter_build, unique_id="instrumentation-before")
+    events.register("after-call.bedrock-runtime", _after_call, unique_id="instrumentation-after")
+    events.register("after-call-error.bedrock-runtime", _after_call_error, unique_id="instrumentation-after-error")
+    return client
+
+
+#summaries and exporters
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def get_records():
+    with _lock:
+        return list(_records)
+
+
+def summarize():
+    """Percentiles per (model id, operation) over the records currently in the ring buffer."""
+
+    groups = {}
+
+    for entry in get_records():
+        groups.setdefault(f"{entry['model_id']} {entry['operation']}", []).append(entry)
+
+    summary = {}
+
+    for name, entries in groups.items():
+        group = {
+            "requests": len(entries),
+            "errors": sum(1 for e in entries if e["error"]),
+            "input_tokens": sum(e["input_tokens"] or 0 for e in entries),
+            "output_tokens": sum(e["output_tokens"] or 0 for e in entries),
+        }
+
+        for metric in ("client_latency", "server_latency", "time_to_first_token", "inter_token_latency"):
+            values = sorted(e[metric] for e in entries if e[metric] is not None)
+
+            if values:
+                group[metric] = {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95), "p99": _percentile(values, 0.99), "max": values[-1]}
+
+        summary[name] = group
+
+    return summary
+
+
+def export_jsonl(file_path): #append the ring buffer contents, one JSON object per call
+    entries = get_records()
+
+    with open(file_path, "a") as jsonl_file:
+        for entry in entries:
+            jsonl_file.write(json.dumps(entry) + "\n")
+
+    return len(entries)
+
+
+def export_prometheus(prefix="bedrock"):
+    """Counters and histograms in the Prometheus text exposition format (cumulative since enable/reset)."""
+
+    lines = []
+
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+
+    for metric in sorted({key[0] for key, _ in counters}):
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+
+        for (name, model_id, operation, error), value in counters:
+            if name == metric:
+                error_label = f',error="{error}"' if error is not None else ""
+                lines.append(f'{prefix}_{metric}{{model_id="{model_id}",operation="{operation}"{error_label}}} {value}')
+
+    for metric in sorted({key[0] for key, _ in histograms}):
+        lines.append(f"# TYPE {prefix}_{metric} histogram")
+
+        for (name, model_id, operation), histogram in histograms:
+            if name != metric:
+                continue
+
+            labels = f'model_id="{model_id}",operation="{operation}"'
+
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f'{prefix}_{metric}_bucket{{{labels},le="{bound}"}} {count}')
+
+            lines.append(f'{prefix}_{metric}_bucket{{{labels},le="+Inf"}} {histogram[len(LATENCY_BUCKETS)]}')
+            lines.append(f"{prefix}_{metric}_sum{{{labels}}} {histogram[-1]}")
+            lines.append(f"{prefix}_{metric}_count{{{labels}}} {histogram[len(LATENCY_BUCKETS)]}")
+
+    return "\n".join(lines) + "\n"
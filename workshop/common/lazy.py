@@ -0,0 +1,57 @@
+import importlib
+import sys
+import threading
+
+#deferred imports for heavy dependencies
+#
+#Streamlit runs each app as a fresh script on first load, and every lib used to pull in boto3,
+#chromadb, pandas or PIL at import time whether or not the page ever called into them. A lazy module
+#is a stand-in that imports the real module on first attribute access, so the cost moves from app
+#start to the first call that actually needs it:
+#
+#    chromadb = lazy_import("chromadb")
+#    client = chromadb.PersistentClient(path=path) #chromadb is imported here
+#
+#use it for module-level names only; `from x import y` has to become `x = lazy_import("x")` + `x.y`.
+
+
+class LazyModule():
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+
+        if module is None:
+            with self.__dict__["_lock"]: #the import system has its own lock; this one just avoids repeating the lookup
+                module = self.__dict__["_module"]
+
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name): #the module itself if something already imported it, otherwise a LazyModule
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def is_loaded(module):
+    return not isinstance(module, LazyModule) or module.__dict__["_module"] is not None
@@ -0,0 +1,224 @@
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from common.lazy import lazy_import
+np = lazy_import("numpy")
+
+#BM25 keyword index and hybrid (keyword + vector) search
+#
+#vector search finds paraphrases but can rank an exact keyword match, such as a model name like
+#"Jurassic-2 Ultra" or "Titan", below loosely related text, so the labs had to ask for more results
+#(and send more context tokens) to be sure of it. A BM25 index over the same documents is built
+#next to the Chroma database by populate_collection.py. The postings are flat NumPy arrays (CSR
+#layout: for term t, doc_ids/term_freqs[offsets[t]:offsets[t + 1]]), a few bytes per posting.
+#
+#in hybrid mode, the keyword and vector searches run concurrently and their rankings are merged with
+#reciprocal rank fusion: score(d) = sum over rankings of 1 / (RRF_K + rank of d). Turn it on for
+#the libs with:
+#
+#    BEDROCK_SEARCH_MODE=hybrid streamlit run rag_app.py
+
+SEARCH_MODE_ENV_VAR = "BEDROCK_SEARCH_MODE"
+SEARCH_MODES = ("vector", "hybrid")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+MIN_CANDIDATES = 20 #results taken from each search before fusion
+
+
+def get_search_mode(mode=None):
+    mode = mode or os.environ.get(SEARCH_MODE_ENV_VAR) or "vector"
+
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; choose one of {', '.join(SEARCH_MODES)}")
+
+    return mode
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def get_index_path(path, name):
+    return os.path.join(path, name + ".bm25.npz")
+
+
+def pack_strings(strings): #newline-separated UTF-8 bytes; NumPy's fixed-width str arrays pad every entry to the longest
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def unpack_strings(packed):
+    return packed.tobytes().decode("utf-8").split("\n") if len(packed) else []
+
+
+def build_bm25_index(path, name, items):
+    """Write the BM25 index of items ({"id", "document"}) to <path>/<name>.bm25.npz; returns its stats."""
+
+    postings = {} #term -> {row: term frequency}
+    doc_lengths = np.zeros(len(items), dtype=np.int32)
+
+    for row, item in enumerate(items):
+        tokens = tokenize(item["document"])
+        doc_lengths[row] = len(tokens)
+
+        for token in tokens:
+            counts = postings.setdefault(token, {})
+            counts[row] = counts.get(row, 0) + 1
+
+    vocabulary = sorted(postings)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term]) for term in vocabulary])
+
+    doc_ids = np.empty(offsets[-1], dtype=np.int32)
+    term_freqs = np.empty(offsets[-1], dtype=np.uint16)
+
+    for t, term in enumerate(vocabulary):
+        rows = sorted(postings[term])
+        doc_ids[offsets[t]:offsets[t + 1]] = rows
+        term_freqs[offsets[t]:offsets[t + 1]] = np.minimum([postings[term][row] for row in rows], 65535)
+
+    os.makedirs(path, exist_ok=True)
+    index_path = get_index_path(path, name)
+    temp_path = index_path + ".tmp.npz"
+
+    np.savez(temp_path, offsets=offsets, doc_ids=doc_ids, term_freqs=term_freqs, doc_lengths=doc_lengths,
+             vocabulary=pack_strings(vocabulary), ids=pack_strings(str(item["id"]) for item in items))
+    os.replace(temp_path, index_path) #readers never see a half-written index
+
+    return {"documents": len(items), "terms": len(vocabulary), "postings": int(offsets[-1]), "bytes": os.path.getsize(index_path)}
+
+
+class BM25Index():
+    def __init__(self, path, name):
+        index_path = get_index_path(path, name)
+
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No BM25 index {name} in {path}; build it with populate_collection.py")
+
+        with np.load(index_path) as arrays:
+            self.offsets = arrays["offsets"]
+            self.doc_ids = arrays["doc_ids"]
+            self.term_freqs = arrays["term_freqs"].astype(np.float32)
+            self.doc_lengths = arrays["doc_lengths"]
+            self.ids = unpack_strings(arrays["ids"])
+            vocabulary = unpack_strings(arrays["vocabulary"])
+
+        self.terms = {term: t for t, term in enumerate(vocabulary)}
+        self.name = name
+
+        average_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 1.0
+        self.length_norms = (K1 * (1 - B + B * self.doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+
+    def count(self):
+        return len(self.ids)
+
+    def get_memory_bytes(self):
+        return self.offsets.nbytes + self.doc_ids.nbytes + self.term_freqs.nbytes + self.length_norms.nbytes
+
+    def search(self, query, n_results=10):
+        """(ids, BM25 scores) of the best n_results documents containing any query term, best first."""
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+
+        for token in set(tokenize(query)):
+            t = self.terms.get(token)
+
+            if t is None:
+                continue
+
+            start, end = self.offsets[t], self.offsets[t + 1]
+            rows, freqs = self.doc_ids[start:end], self.term_freqs[start:end]
+            idf = math.log(1 + (len(self.ids) - (end - start) + 0.5) / ((end - start) + 0.5))
+
+            scores[rows] += idf * freqs * (K1 + 1) / (freqs + self.length_norms[rows]) #rows are unique within a posting list
+
+        matched = np.flatnonzero(scores)
+
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results)[:n_results]]
+
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+
+        return [self.ids[row] for row in matched], scores[matched].tolist()
+
+
+def fuse_rankings(rankings, n_results, rrf_k=RRF_K):
+    """Reciprocal rank fusion of lists of ids, best first; returns [(id, score)]."""
+
+    scores = {}
+
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (rrf_k + rank)
+
+    return sorted(scores.items(), key=lambda pair: -pair[1])[:n_results]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(): #shared by every hybrid collection; keyword searches are short
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+        return _executor
+
+
+class HybridCollection():
+    """A collection (Chroma, quantized or in-memory) plus its BM25 index; query() fuses both rankings.
+
+    Results have Chroma's shape, with the fused RRF scores in "scores"; "distances" holds the vector
+    distance, or None for documents only the keyword search found.
+    """
+
+    def __init__(self, collection, bm25_index, candidates=MIN_CANDIDATES):
+        self.collection = collection
+        self.bm25_index = bm25_index
+        self.candidates = candidates
+        self.size = collection.count() #both indexes are built from the same dump
+
+    def query(self, query_texts=None, n_results=10, include=None, **kwargs):
+        if query_texts is None: #query_embeddings only: nothing to match keywords against
+            return self.collection.query(n_results=n_results, **kwargs)
+
+        size = min(max(n_results, self.candidates), self.size)
+        lexical = [_get_executor().submit(self.bm25_index.search, text, size) for text in query_texts] #while the question is embedded
+        vector = self.collection.query(query_texts=query_texts, n_results=size, **kwargs)
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "scores": []}
+
+        for i, future in enumerate(lexical):
+            lexical_ids, _ = future.result()
+            found = {item_id: (document, metadata, distance) for item_id, document, metadata, distance
+                     in zip(vector["ids"][i], vector["documents"][i], vector["metadatas"][i], vector["distances"][i])}
+
+            fused = fuse_rankings([vector["ids"][i], lexical_ids], n_results)
+            missing = [item_id for item_id, _ in fused if item_id not in found]
+
+            if missing: #keyword-only hits: fetch their documents
+                extra = self.collection.get(ids=missing)
+
+                for item_id, document, metadata in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+                    found[item_id] = (document, metadata, None)
+
+            fused = [(item_id, score) for item_id, score in fused if item_id in found]
+
+            results["ids"].append([item_id for item_id, _ in fused])
+            results["documents"].append([found[item_id][0] for item_id, _ in fused])
+            results["metadatas"].append([found[item_id][1] for item_id, _ in fused])
+            results["distances"].append([found[item_id][2] for item_id, _ in fused])
+            results["scores"].append([score for _, score in fused])
+
+        return results
+
+    def __getattr__(self, name): #count(), get() etc. go to the collection
+        return getattr(self.collection, name)
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from common.concurrency import is_throttling_error, is_transient_error
+from common.embedding_file import write_embedding_file
+
+#concurrent, resumable embedding prefetch
+#
+#items are embedded by a bounded pool of worker threads (the Bedrock calls themselves go through the
+#adaptive per-model limits in common.concurrency). Every finished embedding is appended to a JSONL
+#checkpoint next to the output and flushed periodically, so an interrupted or partly failed run picks
+#up where it stopped: items already in the checkpoint are skipped, as long as their content has not
+#changed. Embeddings live in the checkpoint rather than in memory, so a 100k-document corpus does not
+#need gigabytes of Python floats; the output file is streamed from it at the end.
+
+
+def get_item_key(item): #identifies an item and its content, so edited items are re-embedded on resume
+    content = json.dumps({k: v for k, v in item.items() if k != "embedding"}, sort_keys=True, ensure_ascii=False)
+    return item["id"] + ":" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+class Checkpoint():
+    """Append-only JSONL of {"key", "embedding"} lines; remembers where each key's line starts."""
+
+    def __init__(self, path, flush_every=200):
+        self.path = path
+        self.flush_every = flush_every #lines written between flushes to disk
+        self.offsets = {}
+        self._pending = 0
+
+        if os.path.exists(path):
+            self._load()
+
+        self._file = open(path, "ab")
+
+    def _load(self):
+        valid_length = 0
+
+        with open(self.path, "rb") as checkpoint_file:
+            while True:
+                offset = checkpoint_file.tell()
+                line = checkpoint_file.readline()
+
+                if not line.endswith(b"\n"): #end of file, or a line cut short by a crash
+                    break
+
+                try:
+                    self.offsets[json.loads(line)["key"]] = offset
+                except (ValueError, KeyError):
+                    break
+
+                valid_length = checkpoint_file.tell()
+
+        if valid_length != os.path.getsize(self.path): #drop the torn tail so new lines start cleanly
+            with open(self.path, "r+b") as checkpoint_file:
+                checkpoint_file.truncate(valid_length)
+
+    def add(self, key, embedding):
+        self.offsets[key] = self._file.tell()
+        self._file.write(json.dumps({"key": key, "embedding": embedding}).encode("utf-8") + b"\n")
+        self._pending += 1
+
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def read_embedding(self, reader, key): #reader: an open binary handle on the checkpoint
+        reader.seek(self.offsets[key])
+        return json.loads(reader.readline())["embedding"]
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def embed_with_retry(embed, item, max_attempts=5):
+    """embed(item), retried with jittered exponential backoff on throttling and transient errors.
+
+    Those are already retried inside the limited client; this covers what gets past it (a throttling
+    storm or an outage that outlasts those retries). Anything else, e.g. a ValidationException or
+    AccessDeniedException, would fail the same way again and is raised at once.
+    """
+
+    for attempt in range(max_attempts):
+        try:
+            return embed(item)
+        except Exception as e:
+            if not (is_throttling_error(e) or is_transient_error(e)) or attempt == max_attempts - 1:
+                raise
+
+            time.sleep(random.uniform(0, min(30.0, 0.5 * 2 ** attempt))) #full jitter
+
+
+class Progress():
+    def __init__(self, total, already_done, report_seconds=5.0, stream=sys.stdout):
+        self.total = total
+        self.done = already_done
+        self.embedded = 0
+        self.failed = 0
+        self.report_seconds = report_seconds
+        self.stream = stream
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.embedded / elapsed if elapsed > 0 else 0.0
+
+    def update(self, embedded=0, failed=0, force=False):
+        self.embedded += embedded
+        self.failed += failed
+        self.done += embedded
+
+        now = time.monotonic()
+
+        if force or now - self._last_report >= self.report_seconds:
+            self._last_report = now
+            rate = self.rate()
+            remaining = self.total - self.done - self.failed
+            eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+            print(f"{self.done}/{self.total} embedded ({self.done * 100 // max(1, self.total)}%), {rate:.1f} items/s, "
+                  f"{self.failed} failed, ETA {eta}", file=self.stream, flush=True)
+
+
+def prefetch_embeddings(items, embed, output_path, workers=16, checkpoint_every=200, report_seconds=5.0, max_attempts=5):
+    """Embed every item (a dict with at least "id") and write them with their embeddings to output_path.
+
+    A .json output_path gets the legacy JSON dump (items with an "embedding" key added); anything else
+    gets the binary format from common.embedding_file (.npy matrix + .items.json sidecar).
+
+    embed(item) returns the embedding. Progress is checkpointed to output_path + ".checkpoint.jsonl";
+    run again after an interruption or failures and only the missing items are embedded. Returns a
+    stats dict; the output is written (and the checkpoint removed) only when every item succeeded.
+    """
+
+    checkpoint_path = output_path + ".checkpoint.jsonl"
+    checkpoint = Checkpoint(checkpoint_path, checkpoint_every)
+    keys = [get_item_key(item) for item in items]
+    todo = [(item, key) for item, key in zip(items, keys) if key not in checkpoint.offsets]
+
+    progress = Progress(len(items), len(items) - len(todo), report_seconds)
+    failures = []
+
+    if len(todo) < len(items):
+        print(f"Resuming from {checkpoint_path}: {len(items) - len(todo)} of {len(items)} items already embedded", flush=True)
+
+    def finish(future, item, key):
+        try:
+            embedding = future.result()
+        except Exception as e:
+            failures.append((item["id"], repr(e)))
+            progress.update(failed=1)
+            return
+
+        checkpoint.add(key, embedding) #futures are finished on this thread only, so no locking needed
+        progress.update(embedded=1)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") as executor:
+            pending = {}
+
+            try:
+                for item, key in todo:
+                    if len(pending) >= workers * 2: #bounded queue: don't materialize 100k futures up front
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                        for future in done:
+                            finish(future, *pending.pop(future))
+
+                    pending[executor.submit(embed_with_retry, embed, item, max_attempts)] = (item, key)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        finish(future, *pending.pop(future))
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+
+                print("Interrupted; progress is saved in the checkpoint, run again to resume", flush=True)
+                raise
+    finally:
+        checkpoint.close()
+
+    progress.update(force=True)
+
+    stats = {
+        "total": len(items),
+        "resumed": len(items) - len(todo),
+        "embedded": progress.embedded,
+        "failed": len(failures),
+        "elapsed_seconds": round(time.monotonic() - progress.started, 2),
+        "items_per_second": round(progress.rate(), 2),
+    }
+
+    if failures:
+        for item_id, error in failures[:10]:
+            print(f"Item {item_id} failed: {error}", flush=True)
+
+        print(f"{len(failures)} items failed; run again to retry them (the others are kept in {checkpoint_path})", flush=True)
+        return stats
+
+    write_output(items, keys, checkpoint, output_path)
+    os.remove(checkpoint_path)
+
+    return stats
+
+
+def write_output(items, keys, checkpoint, output_path):
+    """Stream the items, in their original order, with embeddings from the checkpoint, to the output file(s)."""
+
+    if not output_path.endswith(".json"):
+        with open(checkpoint.path, "rb") as reader:
+            write_embedding_file(output_path, items, (checkpoint.read_embedding(reader, key) for key in keys))
+
+        return
+
+    temp_path = output_path + ".tmp"
+
+    with open(checkpoint.path, "rb") as reader, open(temp_path, "w") as output_file:
+        output_file.write("[")
+
+        for i, (item, key) in enumerate(zip(items, keys)):
+            if i > 0:
+                output_file.write(", ")
+
+            output_file.write(json.dumps(dict(item, embedding=checkpoint.read_embedding(reader, key))))
+
+        output_file.write("]")
+
+    os.replace(temp_path, output_path) #readers never see a half-written file
@@ -0,0 +1,169 @@
+import json
+import os
+import numpy as np
+from common.embedding_file import read_embedding_file, write_embedding_file
+
+#quantized coarse index with full-precision re-scoring
+#
+#a 1024-dim float32 vector takes 4 KB; as int8 (one byte per dimension, scaled per dimension) it
+#takes 1 KB and as binary (the sign of each dimension, packed) 128 bytes. The codes are small enough
+#to scan exhaustively with NumPy: a query is quantized the same way, the closest rescore x n_results
+#codes are shortlisted (dot product for int8, Hamming distance for binary), and only those rows are
+#read from the memory-mapped float32 vectors to rank them exactly. Recall stays close to the float
+#index while the part that has to sit in RAM shrinks 4-32x.
+#
+#files, for an index called <name> in <path>:
+#    <name>.npy, <name>.items.json    the float32 vectors and items (the common/embedding_file.py format)
+#    <name>.codes.npy                 int8 codes, or packed sign bits
+#    <name>.index.json                {"quantization", "scale"} (scale: int8 only)
+#
+#query() takes and returns the same shapes as a Chroma collection's query(), so the libs can use
+#either without changes. Distances are squared L2, Chroma's default.
+
+QUANTIZATIONS = ("int8", "binary")
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+SCAN_ROWS = 2048 #int8 codes are widened to float32 this many rows at a time, so the scan uses BLAS without a full-size copy
+
+
+def hamming_distances(codes, query_code):
+    xor = np.bitwise_xor(codes, query_code)
+
+    if xor.shape[1] % 8 == 0: #popcount 64 bits at a time
+        xor = xor.view(np.uint64)
+
+    if hasattr(np, "bitwise_count"): #NumPy 2.0+
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+
+    return _POPCOUNT[xor.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def int8_scores(codes, query_code): #dot products of every code with the query code
+    query_code = query_code.astype(np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+
+    for start in range(0, len(codes), SCAN_ROWS):
+        scores[start:start + SCAN_ROWS] = codes[start:start + SCAN_ROWS].astype(np.float32) @ query_code
+
+    return scores
+
+
+def get_scale(matrix): #per-dimension int8 scale: the largest magnitude maps to 127
+    scale = np.abs(matrix).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    return scale.astype(np.float32)
+
+
+def quantize(matrix, quantization, scale=None):
+    matrix = np.asarray(matrix, dtype=np.float32)
+
+    if quantization == "binary":
+        return np.packbits(matrix > 0, axis=-1)
+
+    if quantization == "int8":
+        return np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+
+    raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+
+
+def get_index_paths(path, name):
+    base_path = os.path.join(path, name)
+    return base_path, base_path + ".codes.npy", base_path + ".index.json"
+
+
+def build_quantized_index(path, name, items, matrix, quantization):
+    """Write a quantized index for items and their float vectors (matrix) into path; returns the stats."""
+
+    base_path, codes_path, settings_path = get_index_paths(path, name)
+    os.makedirs(path, exist_ok=True)
+
+    write_embedding_file(base_path, items, matrix)
+
+    scale = get_scale(matrix) if quantization == "int8" else None
+    codes = quantize(matrix, quantization, scale)
+    np.save(codes_path, codes)
+
+    with open(settings_path, "w") as settings_file:
+        json.dump({"quantization": quantization, "scale": None if scale is None else scale.tolist()}, settings_file)
+
+    return {"documents": len(items), "code_bytes": codes.nbytes, "float_bytes": len(items) * matrix.shape[1] * 4}
+
+
+class QuantizedIndex():
+    def __init__(self, path, name, embedding_function=None, rescore=4):
+        base_path, codes_path, settings_path = get_index_paths(path, name)
+
+        if not os.path.exists(settings_path):
+            raise FileNotFoundError(f"No quantized index {name} in {path}; build it with populate_collection.py --profile")
+
+        with open(settings_path) as settings_file:
+            settings = json.load(settings_file)
+
+        self.name = name
+        self.quantization = settings["quantization"]
+        self.scale = None if settings["scale"] is None else np.asarray(settings["scale"], dtype=np.float32)
+        self.codes = np.load(codes_path) #held in memory; the float vectors stay mapped
+        self.items, self.vectors = read_embedding_file(base_path)
+        self.embedding_function = embedding_function
+        self.rescore = rescore
+
+    def count(self):
+        return len(self.items)
+
+    def get(self, ids, include=None): #items by id, like a Chroma collection's get()
+        if not hasattr(self, "_rows"):
+            self._rows = {str(item["id"]): row for row, item in enumerate(self.items)}
+
+        rows = [self._rows[str(item_id)] for item_id in ids if str(item_id) in self._rows]
+
+        return {
+            "ids": [str(self.items[row]["id"]) for row in rows],
+            "documents": [self.items[row]["document"] for row in rows],
+            "metadatas": [self.items[row]["metadata"] for row in rows],
+        }
+
+    def get_memory_bytes(self): #what has to stay resident: the codes (the float vectors are only paged in for re-scoring)
+        return self.codes.nbytes
+
+    def shortlist(self, query_embedding, size):
+        """Indices of the size closest codes to query_embedding, in no particular order."""
+
+        codes = quantize(query_embedding[None, :], self.quantization, self.scale)[0]
+
+        if self.quantization == "binary":
+            scores = hamming_distances(self.codes, codes)
+        else:
+            scores = -int8_scores(self.codes, codes) #larger dot product = closer
+
+        if size >= len(scores):
+            return np.arange(len(scores))
+
+        return np.argpartition(scores, size)[:size]
+
+    def search(self, query_embedding, n_results):
+        """(row indices, squared L2 distances) of the n_results nearest items, nearest first."""
+
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        candidates = np.sort(self.shortlist(query_embedding, n_results * self.rescore)) #ascending rows read the map sequentially
+
+        distances = ((np.asarray(self.vectors[candidates], dtype=np.float32) - query_embedding) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:n_results]
+
+        return candidates[order], distances[order]
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, include=None): #include is accepted for Chroma compatibility; everything is returned
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        for query_embedding in query_embeddings:
+            rows, distances = self.search(query_embedding, n_results)
+
+            results["ids"].append([str(self.items[row]["id"]) for row in rows])
+            results["documents"].append([self.items[row]["document"] for row in rows])
+            results["metadatas"].append([self.items[row]["metadata"] for row in rows])
+            results["distances"].append(distances.tolist())
+
+        return results
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from common.embedding_cache import _get_wrapper_class
+
+#in-memory query embedding cache
+#
+#chat users ask the same few questions again and again, and every collection.query(query_texts=...)
+#used to embed the question through Titan: a network round trip in front of every RAG answer. Query
+#embeddings are kept in a bounded LRU, keyed by the embedding settings plus the question with its
+#whitespace normalized (case is kept: the model sees it), and expire after a TTL. Behind it sits the
+#optional SQLite tier from common/embedding_cache.py (BEDROCK_EMBEDDING_CACHE), which several
+#processes can share, so a miss here can still be a hit there.
+#
+#only questions go through it: QueryCachedCollection embeds query_texts itself and queries with the
+#vectors, while add/upsert keep using the collection's own embedding function, so populating a
+#collection does not flush the questions out of the LRU. On by default for the libs
+#(collection_registry.get_collection); tune or turn it off with:
+#
+#    BEDROCK_QUERY_CACHE_SIZE=0           #off
+#    BEDROCK_QUERY_CACHE_SIZE=4096 BEDROCK_QUERY_CACHE_TTL=600 streamlit run rag_app.py
+
+SIZE_ENV_VAR = "BEDROCK_QUERY_CACHE_SIZE"
+TTL_ENV_VAR = "BEDROCK_QUERY_CACHE_TTL"
+
+DEFAULT_SIZE = 1024 #4 KB per 1024-dim vector: ~4 MB when full
+DEFAULT_TTL_SECONDS = 3600
+
+
+def normalize_query(text):
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache():
+    """Bounded LRU of query vectors with a TTL.
+
+    Has EmbeddingCache's get_many/put_many, so the same Chroma wrapper serves both.
+    """
+
+    def __init__(self, max_entries=DEFAULT_SIZE, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+        self._entries = OrderedDict() #key -> (stored at, vector), least recently used first
+        self._lock = threading.Lock()
+
+    def get_key(self, model_id, content, dimensions=None, normalize=True):
+        return (model_id, dimensions, bool(normalize), normalize_query(content))
+
+    def get_many(self, model_id, contents, dimensions=None, normalize=True):
+        """Cached vectors for each content, None where there is none (or it expired)."""
+
+        now = time.monotonic()
+        vectors = []
+
+        with self._lock:
+            for content in contents:
+                key = self.get_key(model_id, content, dimensions, normalize)
+                entry = self._entries.get(key)
+
+                if entry is not None and self.ttl_seconds is not None and now - entry[0] > self.ttl_seconds:
+                    del self._entries[key]
+                    self.stats["expired"] += 1
+                    entry = None
+
+                if entry is None:
+                    self.stats["misses"] += 1
+                    vectors.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    vectors.append(entry[1])
+
+        return vectors
+
+    def put_many(self, model_id, contents, vectors, dimensions=None, normalize=True):
+        now = time.monotonic()
+
+        with self._lock:
+            for content, vector in zip(contents, vectors):
+                key = self.get_key(model_id, content, dimensions, normalize)
+                self._entries[key] = (now, vector)
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_hit_rate(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return self.stats["hits"] / lookups if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """The process-wide query cache, sized from $BEDROCK_QUERY_CACHE_SIZE / $BEDROCK_QUERY_CACHE_TTL; None when the size is 0."""
+
+    global _cache
+
+    max_entries = int(os.environ.get(SIZE_ENV_VAR, DEFAULT_SIZE))
+
+    if max_entries <= 0:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            ttl_seconds = float(os.environ.get(TTL_ENV_VAR, DEFAULT_TTL_SECONDS))
+            _cache = QueryEmbeddingCache(max_entries, ttl_seconds if ttl_seconds > 0 else None)
+
+        return _cache
+
+
+class QueryCachedCollection():
+    """Embeds query_texts through the query cache and queries the collection with the vectors. Anything else goes straight to the collection."""
+
+    def __init__(self, collection, embedding_function):
+        self.collection = collection
+        self.embedding_function = embedding_function
+
+    def query(self, query_texts=None, query_embeddings=None, **kwargs):
+        if query_texts is not None and query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        return self.collection.query(query_embeddings=query_embeddings, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def with_query_cache(collection, embedding_function, model_id, dimensions=None, normalize=True):
+    """Put the process-wide query cache in front of a collection's queries; returns the collection unchanged when the cache is off.
+
+    embedding_function: the one the collection was opened with.
+    """
+
+    cache = get_query_cache()
+
+    if cache is None:
+        return collection
+
+    return QueryCachedCollection(collection, _get_wrapper_class()(embedding_function, cache, model_id, dimensions, normalize))
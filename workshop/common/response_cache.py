@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+#opt-in, disk-backed cache for deterministic converse calls
+#
+#a converse call with temperature 0 and identical inputs returns (near enough) the same answer every
+#time, so we store the response - usage metadata included - under a hash of the canonicalized request.
+#Entries live in SQLite (memory-mapped, WAL mode), bounded by entry count in LRU order, expire after a
+#TTL, and can be dropped per model. The entry count is kept in memory (counted once when the cache is
+#opened), and hits only note their access time in memory; those are written in one batch before an
+#eviction or every ACCESS_FLUSH_SIZE hits, so neither a hit nor an insert scans or rewrites the table. Set the env var below to a file path to turn it on for the libs:
+#
+#    BEDROCK_RESPONSE_CACHE=/tmp/bedrock_cache.db streamlit run prompt_app.py
+
+CACHE_PATH_ENV_VAR = "BEDROCK_RESPONSE_CACHE"
+ACCESS_FLUSH_SIZE = 256 #hits whose last_access update is held back before writing them together
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+CREATE INDEX IF NOT EXISTS responses_model_id ON responses (model_id);
+"""
+
+
+def is_deterministic(request): #only temperature 0 requests are safe to replay
+    return request.get("inferenceConfig", {}).get("temperature") == 0
+
+
+def get_request_key(request):
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache():
+    def __init__(self, path, max_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None) #autocommit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA mmap_size=268435456") #serve reads from the page cache
+        self._connection.executescript(SCHEMA)
+
+        self._count = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self._pending_access = {} #key -> last hit time, not yet written
+
+    def _flush_access(self):
+        if self._pending_access:
+            self._connection.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                         [(accessed, key) for key, accessed in self._pending_access.items()])
+            self._pending_access.clear()
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._count -= self._connection.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+                    self._pending_access.pop(key, None)
+
+                self.stats["misses"] += 1
+                return None
+
+            self._pending_access[key] = now
+            self.stats["hits"] += 1
+
+            if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+
+        return json.loads(row[0])
+
+    def put(self, key, model_id, response):
+        now = time.time()
+        response = {k: v for k, v in response.items() if k != "ResponseMetadata"} #request ids and headers belong to the original call
+
+        with self._lock:
+            exists = self._connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model_id, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model_id, json.dumps(response, default=str), now, now),
+            )
+            self._pending_access.pop(key, None)
+
+            if not exists:
+                self._count += 1
+
+            if self._count > self.max_entries: #evict least recently used
+                self._flush_access() #so recent hits are not evicted as if they were never used
+                evicted = self._connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (self._count - self.max_entries,)).rowcount
+                self._count -= evicted
+                self.stats["evictions"] += evicted
+
+    def invalidate(self, model_id=None): #drop every entry for a model, or everything
+        with self._lock:
+            self._flush_access()
+
+            if model_id is None:
+                self._count -= self._connection.execute("DELETE FROM responses").rowcount
+            else:
+                self._count -= self._connection.execute("DELETE FROM responses WHERE model_id = ?", (model_id,)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._connection.close()
+
+
+class CachedBedrockClient():
+    """Serves deterministic converse calls from a ResponseCache; everything else goes to the wrapped client."""
+
+    def __init__(self, client, cache):
+        self._client = client
+        self.cache = cache
+
+    def converse(self, **kwargs):
+        if not is_deterministic(kwargs):
+            return self._client.converse(**kwargs)
+
+        key = get_request_key(kwargs)
+        response = self.cache.get(key)
+
+        if response is None:
+            response = self._client.converse(**kwargs)
+            self.cache.put(key, kwargs.get("modelId", ""), response)
+
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache(): #the process-wide cache named by the env var, or None when caching is off
+    global _cache
+
+    path = os.environ.get(CACHE_PATH_ENV_VAR)
+
+    if not path:
+        return None
+
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            _cache = ResponseCache(path)
+
+        return _cache
+
+
+def with_response_cache(client):
+    cache = get_response_cache()
+
+    return CachedBedrockClient(client, cache) if cache is not None else client
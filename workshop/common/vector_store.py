@@ -0,0 +1,181 @@
+import os
+from common.embedding_file import as_float32, read_embedding_file
+from common.lazy import lazy_import
+np = lazy_import("numpy")
+faiss = lazy_import("faiss")
+
+#in-memory vector stores loaded from the embedding dumps
+#
+#every search used to go through Chroma's persistent client: SQLite for the documents and metadata,
+#an HNSW index loaded from disk on first use. For corpora that fit in memory the dumps written by
+#prefetch_embeddings.py already hold everything a search needs, so a store can be built straight from
+#them:
+#
+#    numpy        exact search, a matrix product over all vectors (no extra dependency)
+#    faiss-flat   exact search with FAISS (IndexFlatL2)
+#    faiss-hnsw   approximate, graph-based (IndexHNSWFlat)
+#    faiss-ivf    approximate, k-means buckets of which nprobe are scanned (IndexIVFFlat)
+#
+#a vector store is anything with count(), get(ids=...) and query(query_texts=... or
+#query_embeddings=..., n_results=...) returning Chroma's result shape (ids, documents, metadatas,
+#distances as squared L2): a Chroma collection, a QuantizedIndex (common/quantized_index.py) or the
+#stores here, so the libs' get_vector_search_results works with any of them. The libs pick the
+#backend from BEDROCK_VECTOR_STORE (default: chroma), reading the dumps next to the Chroma database:
+#
+#    BEDROCK_VECTOR_STORE=faiss-hnsw streamlit run rag_app.py
+#
+#benchmarks/vector_stores.py compares load time, query latency, recall and memory against Chroma.
+
+STORE_ENV_VAR = "BEDROCK_VECTOR_STORE"
+DEFAULT_STORE = "chroma"
+STORES = ("chroma", "numpy", "faiss-flat", "faiss-hnsw", "faiss-ivf")
+
+COLLECTION_DUMPS = { #collection name -> base name of its embedding dump in data/
+    'services_collection': 'services_with_embeddings',
+    'bedrock_faqs_collection': 'bedrock_faqs_with_embeddings',
+    'bedrock_faq_chunks_collection': 'bedrock_faq_chunks_with_embeddings', #optional: FAQ answer chunks, see common/chunking.py
+}
+
+HNSW_M = 32 #graph links per vector
+HNSW_EF_SEARCH = 64 #candidates kept while searching; higher is slower and more exact
+IVF_NPROBE = 8 #buckets scanned per query
+
+
+def get_store_name(name=None):
+    name = name or os.environ.get(STORE_ENV_VAR) or DEFAULT_STORE
+
+    if name not in STORES:
+        raise ValueError(f"Unknown vector store {name!r}; choose one of {', '.join(STORES)}")
+
+    return name
+
+
+class VectorStore():
+    """Items plus a search over their vectors; subclasses implement search() and get_memory_bytes()."""
+
+    def __init__(self, items, embedding_function=None):
+        self.items = items
+        self.embedding_function = embedding_function
+        self._rows = None
+
+    def count(self):
+        return len(self.items)
+
+    def search(self, query_matrix, n_results):
+        """(rows, squared L2 distances), each (queries, n_results), nearest first; row -1 where there is no result."""
+
+        raise NotImplementedError
+
+    def get_memory_bytes(self):
+        raise NotImplementedError
+
+    def get(self, ids, include=None): #items by id, like a Chroma collection's get()
+        if self._rows is None:
+            self._rows = {str(item["id"]): row for row, item in enumerate(self.items)}
+
+        rows = [self._rows[str(item_id)] for item_id in ids if str(item_id) in self._rows]
+
+        return {
+            "ids": [str(self.items[row]["id"]) for row in rows],
+            "documents": [self.items[row]["document"] for row in rows],
+            "metadatas": [self.items[row]["metadata"] for row in rows],
+        }
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, include=None): #include is accepted for Chroma compatibility; everything is returned
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        query_matrix = np.ascontiguousarray(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        all_rows, all_distances = self.search(query_matrix, min(n_results, self.count()))
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        for rows, distances in zip(all_rows, all_distances):
+            found = rows >= 0
+
+            results["ids"].append([str(self.items[row]["id"]) for row in rows[found]])
+            results["documents"].append([self.items[row]["document"] for row in rows[found]])
+            results["metadatas"].append([self.items[row]["metadata"] for row in rows[found]])
+            results["distances"].append(distances[found].tolist())
+
+        return results
+
+
+class NumpyStore(VectorStore):
+    """Exact search: |q|^2 - 2 q.x + |x|^2 for every vector, then a partial sort."""
+
+    def __init__(self, items, matrix, embedding_function=None):
+        super().__init__(items, embedding_function)
+        self.matrix = np.ascontiguousarray(as_float32(matrix))
+        self.norms = (self.matrix ** 2).sum(axis=1)
+
+    def search(self, query_matrix, n_results):
+        distances = self.norms[None, :] - 2 * query_matrix @ self.matrix.T + (query_matrix ** 2).sum(axis=1)[:, None]
+
+        if n_results < distances.shape[1]:
+            candidates = np.argpartition(distances, n_results, axis=1)[:, :n_results]
+        else:
+            candidates = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+
+        return np.take_along_axis(candidates, order, axis=1), np.maximum(np.take_along_axis(candidate_distances, order, axis=1), 0)
+
+    def get_memory_bytes(self):
+        return self.matrix.nbytes + self.norms.nbytes
+
+
+class FaissStore(VectorStore):
+    """A FAISS index over the vectors: "flat" (exact), "hnsw" or "ivf"."""
+
+    def __init__(self, items, matrix, index_type="flat", embedding_function=None, hnsw_m=HNSW_M, ef_search=HNSW_EF_SEARCH, nlist=None, nprobe=IVF_NPROBE):
+        super().__init__(items, embedding_function)
+        matrix = np.ascontiguousarray(as_float32(matrix))
+        dimensions = matrix.shape[1]
+
+        if index_type == "flat":
+            self.index = faiss.IndexFlatL2(dimensions)
+        elif index_type == "hnsw":
+            self.index = faiss.IndexHNSWFlat(dimensions, hnsw_m)
+            self.index.hnsw.efSearch = ef_search
+        elif index_type == "ivf":
+            nlist = nlist or max(1, int(np.sqrt(len(matrix)))) #~sqrt(n) buckets
+            self.quantizer = faiss.IndexFlatL2(dimensions) #the index keeps a pointer to it, so we keep the object alive
+            self.index = faiss.IndexIVFFlat(self.quantizer, dimensions, nlist)
+            self.index.train(matrix)
+            self.index.nprobe = min(nprobe, nlist)
+        else:
+            raise ValueError(f"index_type must be flat, hnsw or ivf, got {index_type!r}")
+
+        self.index_type = index_type
+        self.index.add(matrix)
+
+    def search(self, query_matrix, n_results):
+        distances, rows = self.index.search(query_matrix, n_results)
+        return rows, distances
+
+    def get_memory_bytes(self): #the vectors FAISS holds, plus the HNSW graph links
+        vector_bytes = self.index.ntotal * self.index.d * 4
+
+        if self.index_type == "hnsw":
+            vector_bytes += self.index.hnsw.neighbors.size() * 4
+
+        return vector_bytes
+
+
+def build_vector_store(store, items, matrix, embedding_function=None):
+    if store == "numpy":
+        return NumpyStore(items, matrix, embedding_function)
+
+    if store.startswith("faiss-"):
+        return FaissStore(items, matrix, store[len("faiss-"):], embedding_function)
+
+    raise ValueError(f"{store!r} is not an in-memory vector store")
+
+
+def open_vector_store(dump_path, store, embedding_function=None):
+    """The store built from an embedding dump (see common/embedding_file.py)."""
+
+    items, matrix = read_embedding_file(dump_path)
+    return build_vector_store(store, items, matrix, embedding_function)
@@ -2,8 +2,10 @@ from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Callable
 from util import llm_call, extract_xml
 
-def parallel(prompt: str, inputs: List[str], n_workers: int = 3) -> List[str]:
-    """동일한 프롬프트로 여러 입력을 동시에 처리할 수 있습니다."""
+def parallel(prompt: str, inputs: List[str], n_workers: int = 16) -> List[str]:
+    """동일한 프롬프트로 여러 입력을 동시에 처리할 수 있습니다.
+
+    실제 동시 요청 수는 llm_call의 적응형 동시성 제한기가 스로틀링에 맞춰 조절하므로 n_workers는 상한값입니다."""
     with ThreadPoolExecutor(max_workers=n_workers) as executor:
         futures = [executor.submit(llm_call, f"{prompt}\nInput: {x}") for x in inputs]
         return [f.result() for f in futures]
@@ -1,15 +1,16 @@
-import boto3
+import os, sys
 import re
 import json
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.concurrency import get_limited_bedrock_client
+from common.response_cache import with_response_cache
 
 def get_bedrock_client():
-    return boto3.client(
-        service_name='bedrock-runtime',
-        region_name='us-west-2'
-    )
+    #모델별 적응형(AIMD) 동시성 제한을 스레드 간에 공유하는 클라이언트
+    return get_limited_bedrock_client(region_name='us-west-2')
 
-def llm_call(prompt: str, system_prompt: str = "") -> str:
-    client = get_bedrock_client()
+def llm_call(prompt: str, system_prompt: str = "", temperature: float = 0.1) -> str:
+    client = with_response_cache(get_bedrock_client()) #temperature 0 호출은 BEDROCK_RESPONSE_CACHE 설정 시 캐시에서 응답
     
     try:
         messages = [{
@@ -26,7 +27,7 @@ def llm_call(prompt: str, system_prompt: str = "") -> str:
             messages=messages,
             system=system_messages,
             inferenceConfig={
-                "temperature": 0.1,
+                "temperature": temperature,
                 "maxTokens": 4096,
                 "topP": 1
             }
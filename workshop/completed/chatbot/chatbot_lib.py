@@ -1,4 +1,6 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.hedging import get_hedged_bedrock_client
 
 MAX_MESSAGES = 20
 
@@ -25,8 +27,7 @@ def convert_chat_messages_to_converse_api(chat_messages):
 
 
 def chat_with_model(message_history, new_text=None):
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
+    bedrock = get_hedged_bedrock_client() #shared client, hedged to a second region when BEDROCK_HEDGE_REGION is set
     
     new_text_message = ChatMessage('user', text=new_text)
     message_history.append(new_text_message)
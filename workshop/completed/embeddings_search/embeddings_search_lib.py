@@ -1,15 +1,14 @@
 import itertools
-import boto3
-import chromadb
-from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common import collection_registry
 
 
 def get_collection(path, collection_name):
-    session = boto3.Session()
-    embedding_function = AmazonBedrockEmbeddingFunction(session=session, model_name="amazon.titan-embed-text-v2:0")
     
-    client = chromadb.PersistentClient(path=path)
-    collection = client.get_collection(collection_name, embedding_function=embedding_function)
+    #the BEDROCK_EMBEDDING_PROFILE profile's collection (or quantized index); by default the original 1024-dim one
+    #opened once per process and shared across questions; repeated questions skip Bedrock when BEDROCK_EMBEDDING_CACHE is set
+    collection = collection_registry.get_collection(path, collection_name)
     
     return collection
     
@@ -26,9 +25,6 @@ def get_vector_search_results(collection, question):
 
 def get_similarity_search_results(question):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
-    
     collection = get_collection("../../data/chroma", "bedrock_faqs_collection")
     
     search_results = get_vector_search_results(collection, question)
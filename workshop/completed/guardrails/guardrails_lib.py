@@ -1,4 +1,6 @@
-import boto3, json, random, string, os, sys, configparser
+import json, random, string, os, sys, configparser
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 
 def get_text_response(prompt):
     
@@ -11,8 +13,7 @@ def get_text_response(prompt):
     except:
         raise KeyError("Please run the appropriate create guardrail script indicated in the lab instructions.")
     
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
+    bedrock = get_bedrock_client() #reuses the shared, pooled Bedrock client
     
     #randomize the input tagging suffix. This reduces the likelihood of successfully circumventing input tagging.
     input_tagging_suffix = "".join(random.choices(string.ascii_lowercase, k=8))
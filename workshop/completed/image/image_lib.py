@@ -1,13 +1,11 @@
-import boto3 #import aws sdk and supporting libraries
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 import json
 import base64
 from io import BytesIO
 
 
-session = boto3.Session()
-
-bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
-
 bedrock_model_id = "stability.stable-diffusion-xl-v1" #use the Stable Diffusion model
 
 
@@ -29,6 +27,8 @@ def get_image_response(prompt_content): #text-to-text client function
                                "cfg_scale": 9, #how closely the model tries to match the prompt
                                "steps": 50, }) #number of diffusion steps to perform
     
+    bedrock = get_bedrock_client() #built on first use rather than at import, so the app starts without loading boto3
+    
     response = bedrock.invoke_model(body=request_body, modelId=bedrock_model_id) #call the Amazon Bedrock endpoint
     
     output = get_response_image_from_payload(response) #convert the response payload to a BytesIO object for the client to consume
@@ -1,7 +1,10 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.lazy import lazy_import
 import json
 import base64
-from PIL import Image
+Image = lazy_import("PIL.Image") #imported when the first image is decoded
 from io import BytesIO
 from random import randint
 
@@ -118,9 +121,7 @@ def get_response_image(response):
 
 #generate an image using Amazon Nova Canvas
 def get_image_from_model(prompt_content, image_bytes, negative_prompt=None, vertical_alignment=0.5, horizontal_alignment=0.5):
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-east-1') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-east-1') #reuses the shared, pooled Bedrock client
     
     body = get_image_extension_request_body(prompt_content, image_bytes, negative_prompt=negative_prompt, vertical_alignment=vertical_alignment, horizontal_alignment=horizontal_alignment)
     
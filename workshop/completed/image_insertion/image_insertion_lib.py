@@ -1,7 +1,10 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.lazy import lazy_import
 import json
 import base64
-from PIL import Image
+Image = lazy_import("PIL.Image") #imported when the first image is decoded
 from io import BytesIO
 from random import randint
 
@@ -105,9 +108,7 @@ def get_bytes_from_file(file_path):
 
 #generate an image using Amazon Nova Canvas
 def get_image_from_model(prompt_content, image_bytes, mask_prompt=None, negative_prompt=None, insertion_position=None, insertion_dimensions=None):
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-east-1') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-east-1') #reuses the shared, pooled Bedrock client
     
     if image_bytes == None:
         image_bytes = get_bytes_from_file("images/desk.jpg") #use desk.jpg if no file uploaded
@@ -1,5 +1,7 @@
 # Import required AWS and utility libraries
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 import json
 import base64
 from io import BytesIO
@@ -67,8 +69,7 @@ def get_image_from_model(prompt_content, negative_prompt=None):
         BytesIO: Generated image as bytes stream
     """
     # Create AWS session and Bedrock client
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-east-1')
+    bedrock = get_bedrock_client(region_name='us-east-1') #reuses the shared, pooled Bedrock client
     
     # Prepare the request body
     body = get_image_generation_request_body(prompt_content, negative_prompt=negative_prompt)
@@ -1,4 +1,6 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 import json
 import base64
 from io import BytesIO
@@ -65,9 +67,7 @@ def get_response_image(response):
 
 #generate an image using Amazon Nova Canvas
 def get_image_from_model(prompt_content, image_bytes, mask_prompt=None):
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-east-1') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-east-1') #reuses the shared, pooled Bedrock client
     
     body = get_image_inpainting_request_body(prompt_content, image_bytes, mask_prompt=mask_prompt)
     
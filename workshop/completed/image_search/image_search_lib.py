@@ -1,17 +1,20 @@
 import itertools
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common import collection_registry #imports chromadb on the first search; chromadb alone takes most of a second to import
+from common.clients import get_bedrock_client
+from common.embedding_cache import get_embedding_cache
+from common.lazy import lazy_import
 import json
 import base64
-import chromadb
+images = lazy_import("common.images") #PIL is only needed for image searches
 from io import BytesIO
 
 
 #calls Bedrock to get a vector from either an image, text, or both
 def get_multimodal_vector(input_image_base64=None, input_text=None):
     
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-west-2') #reuses the shared, pooled Bedrock client
     
     request_body = {}
     
@@ -23,6 +26,14 @@ def get_multimodal_vector(input_image_base64=None, input_text=None):
     
     body = json.dumps(request_body)
     
+    cache = get_embedding_cache() #opt-in: BEDROCK_EMBEDDING_CACHE reuses vectors for repeated searches
+    
+    if cache is not None:
+        embedding = cache.get("amazon.titan-embed-image-v1", body, dimensions=1024)
+        
+        if embedding is not None:
+            return embedding
+    
     response = bedrock.invoke_model(
     	body=body, 
     	modelId="amazon.titan-embed-image-v1", 
@@ -34,17 +45,27 @@ def get_multimodal_vector(input_image_base64=None, input_text=None):
     
     embedding = response_body.get("embedding")
     
+    if cache is not None:
+        cache.put("amazon.titan-embed-image-v1", body, embedding, dimensions=1024)
+    
     return embedding
 
 
 def get_collection(path, collection_name):
 
-    client = chromadb.PersistentClient(path=path)
-    collection = client.get_collection(collection_name)
+    collection = collection_registry.get_chroma_collection(path, collection_name) #opened once per process, shared across searches
     
     return collection
 
 
+def get_index_max_side(collection): #the size the indexed images were scaled to before embedding (0: full size)
+    
+    if "max_side" not in collection.derived: #kept on the registry entry, so collection_registry.reload() forgets it with the collection
+        sample = collection.get(limit=1, include=["metadatas"])
+        collection.derived["max_side"] = (sample["metadatas"][0] or {}).get("max_side", 0) if sample["metadatas"] else 0
+    
+    return collection.derived["max_side"]
+
 
 def get_vector_search_results(collection, query_embedding):
     
@@ -69,12 +90,12 @@ def get_base64_from_bytes(image_bytes):
 #get a list of images based on the provided search term and/or search image
 def get_similarity_search_results(search_term=None, search_image=None):
     
-    search_image_base64 = (get_base64_from_bytes(search_image) if search_image else None)
+    collection = get_collection("../../data/chroma", "images_collection")
+    
+    search_image_base64 = (get_base64_from_bytes(images.downscale_image(search_image, get_index_max_side(collection))) if search_image else None) #the same size the indexed images were embedded at
 
     query_embedding = get_multimodal_vector(input_text=search_term, input_image_base64=search_image_base64)
     
-    collection = get_collection("../../data/chroma", "images_collection")
-    
     search_results = get_vector_search_results(collection, query_embedding)
     
     flattened_results_list = list(itertools.chain(*search_results['documents'])) #flatten the list of lists returned by chromadb
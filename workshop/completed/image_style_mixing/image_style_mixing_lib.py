@@ -1,5 +1,6 @@
-import os
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 import json
 import base64
 from io import BytesIO
@@ -66,9 +67,7 @@ def get_response_image(response):
 
 #generate an image using Amazon Nova Canvas
 def get_image_from_model(prompt_content, similarity_strength, image_bytes1, image_bytes2):
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-east-1') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-east-1') #reuses the shared, pooled Bedrock client
     
     body = get_image_variation_request_body(prompt_content, similarity_strength, image_bytes1, image_bytes2) #prompt text hardcode since it doesn't matter
     
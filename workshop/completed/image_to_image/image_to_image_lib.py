@@ -1,15 +1,14 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.lazy import lazy_import
 import json
 import base64
-from PIL import Image
+Image = lazy_import("PIL.Image") #imported when the first image is decoded
 from io import BytesIO
 
 #
 
-session = boto3.Session()
-
-bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
-
 bedrock_model_id = 'stability.stable-diffusion-xl-v1'
 
 #
@@ -62,6 +61,8 @@ def get_altered_image_from_model(prompt_content, image_bytes):
     
     body = get_stability_ai_request_body(prompt_content, image_str)
     
+    bedrock = get_bedrock_client() #built on first use rather than at import, so the app starts without loading boto3
+    
     response = bedrock.invoke_model(body=body, modelId=bedrock_model_id, contentType="application/json", accept="application/json")
     
     output = get_stability_ai_response_image(response)
@@ -1,4 +1,6 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 from io import BytesIO
 
 
@@ -16,9 +18,7 @@ def get_bytes_from_file(file_path):
 
 #generate a response using Anthropic Claude
 def get_response_from_model(prompt_content, image_bytes, mask_prompt=None):
-    session = boto3.Session()
-    
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2') #creates a Bedrock client
+    bedrock = get_bedrock_client(region_name='us-west-2') #reuses the shared, pooled Bedrock client
     
     image_message = {
         "role": "user",
@@ -1,4 +1,7 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.batch_inference import run_batch, to_anthropic_request, get_tool_input
 
 def get_tools():
     tools = [
@@ -75,13 +78,7 @@ def get_tools():
     return tools
 
 
-def get_json_response(input_content): #text-to-text client function
-
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
-    
-    tool_list = get_tools()
-    
+def get_message(input_content):
     message = {
         "role": "user",
         "content": [
@@ -90,6 +87,16 @@ def get_json_response(input_content): #text-to-text client function
         ],
     }
     
+    return message
+
+def get_json_response(input_content): #text-to-text client function
+
+    bedrock = get_bedrock_client() #reuses the shared, pooled Bedrock client
+    
+    tool_list = get_tools()
+    
+    message = get_message(input_content)
+    
     response = bedrock.converse(
         modelId="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
         messages=[message],
@@ -119,3 +126,37 @@ def get_json_response(input_content): #text-to-text client function
     tool_result_dict = tool_use_block['input']
     
     return tool_result_dict
+
+
+def get_json_responses_batch(input_contents, poll_seconds=30.0): #bulk variant: one Bedrock batch inference job for many emails
+    
+    tool_list = get_tools()
+    
+    model_inputs = [
+        to_anthropic_request(
+            messages=[get_message(input_content)],
+            inference_config={
+                "maxTokens": 2000,
+                "temperature": 0
+            },
+            tool_config={
+                "tools": tool_list,
+                "toolChoice": {
+                    "tool": {
+                        "name": "summarize_email"
+                    }
+                }
+            }
+        )
+        for input_content in input_contents
+    ]
+    
+    results = run_batch("us.anthropic.claude-3-7-sonnet-20250219-v1:0", model_inputs, poll_seconds=poll_seconds)
+    
+    tool_result_dicts = []
+    
+    for model_output, error in results: #one dict per email, in input order; failed records keep their place with the error
+        tool_result_dict = get_tool_input(model_output, "summarize_email")
+        tool_result_dicts.append(tool_result_dict if tool_result_dict is not None else {"error": (error or {}).get("errorMessage", "No tool use in the response")})
+    
+    return tool_result_dicts
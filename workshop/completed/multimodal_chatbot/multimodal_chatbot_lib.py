@@ -1,4 +1,6 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 from io import BytesIO
 
 MAX_MESSAGES = 20
@@ -56,9 +58,7 @@ def convert_chat_messages_to_converse_api(chat_messages):
 
 
 def chat_with_model(message_history, new_text=None, new_image_bytes=None):
-    session = boto3.Session()
-    
-    bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
+    bedrock = get_bedrock_client() #reuses the shared, pooled Bedrock client
     
     if new_text:
         new_text_message = ChatMessage('user', 'text', text=new_text)
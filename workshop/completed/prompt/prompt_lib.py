@@ -1,4 +1,7 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.response_cache import with_response_cache
 
 def read_file(file_name):
     with open(file_name, "r") as f:
@@ -44,8 +47,7 @@ def get_prompt(template, context=None):
 
 def get_text_response(model_id, temperature, template, context=None):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+    bedrock = with_response_cache(get_bedrock_client()) #repeat prompts are answered from the cache when BEDROCK_RESPONSE_CACHE is set
 
     prompt = get_prompt(template, context)
     
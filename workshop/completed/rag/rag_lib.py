@@ -1,14 +1,15 @@
 import itertools
-import boto3
-import chromadb
-from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.hedging import get_hedged_bedrock_client
+from common.chunking import chunks_enabled, get_chunk_context
+from common import collection_registry
 
 def get_collection(path, collection_name):
-    session = boto3.Session()
-    embedding_function = AmazonBedrockEmbeddingFunction(session=session, model_name="amazon.titan-embed-text-v2:0")
     
-    client = chromadb.PersistentClient(path=path)
-    collection = client.get_collection(collection_name, embedding_function=embedding_function)
+    #the BEDROCK_EMBEDDING_PROFILE profile's collection (or quantized index); by default the original 1024-dim one
+    #opened once per process and shared across questions; repeated questions skip Bedrock when BEDROCK_EMBEDDING_CACHE is set
+    collection = collection_registry.get_collection(path, collection_name)
     
     return collection
 
@@ -25,14 +26,17 @@ def get_vector_search_results(collection, question):
 
 def get_rag_response(question):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+    bedrock = get_hedged_bedrock_client() #shared client, hedged to a second region when BEDROCK_HEDGE_REGION is set
     
     collection = get_collection("../../data/chroma", "bedrock_faqs_collection")
     
-    search_results = get_vector_search_results(collection, question)
-    
-    flattened_results_list = list(itertools.chain(*search_results['documents'])) #flatten the list of lists returned by chromadb
+    if chunks_enabled(): #BEDROCK_RAG_CHUNKS: search the FAQ answer chunks, expanding to the whole FAQ when several of its chunks match
+        chunk_collection = get_collection("../../data/chroma", "bedrock_faq_chunks_collection")
+        flattened_results_list = get_chunk_context(chunk_collection, question, collection)
+    else:
+        search_results = get_vector_search_results(collection, question)
+        
+        flattened_results_list = list(itertools.chain(*search_results['documents'])) #flatten the list of lists returned by chromadb
     
     rag_content = "\n\n".join(flattened_results_list)
     print(rag_content)
@@ -1,8 +1,10 @@
 # 필요한 라이브러리 임포트
 import itertools  # 리스트 평탄화(flatten)를 위한 도구
-import boto3  # AWS 서비스와 통신하기 위한 SDK
-import chromadb  # 벡터 데이터베이스 클라이언트
-from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction  # Bedrock 임베딩 함수
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.hedging import get_hedged_bedrock_client
+from common.chunking import chunks_enabled, get_chunk_context  # FAQ 답변 청크 검색 (BEDROCK_RAG_CHUNKS)
+from common import collection_registry  # 프로세스 전역 컬렉션 레지스트리 (chromadb는 첫 검색 시점에 임포트)
 
 # 대화 히스토리에 저장할 최대 메시지 수 (메모리 관리를 위한 제한)
 MAX_MESSAGES = 20
@@ -34,21 +36,10 @@ def get_collection(path, collection_name):
     Returns:
         Collection: ChromaDB 컬렉션 객체
     """
-    # AWS 세션 생성
-    session = boto3.Session()
-    
-    # Amazon Bedrock의 Titan 임베딩 모델을 사용하는 임베딩 함수 생성
-    embedding_function = AmazonBedrockEmbeddingFunction(
-        session=session, 
-        region_name='us-west-2',
-        model_name="amazon.titan-embed-text-v2:0"
-    )
-    
-    # 영구 저장소에서 ChromaDB 클라이언트 생성
-    client = chromadb.PersistentClient(path=path)
-    
-    # 지정된 컬렉션을 임베딩 함수와 함께 가져오기
-    collection = client.get_collection(collection_name, embedding_function=embedding_function)
+    # BEDROCK_EMBEDDING_PROFILE에 맞는 Titan v2 임베딩 함수로 컬렉션(또는 양자화 인덱스) 가져오기
+    # 기본값은 기존의 1024차원 컬렉션이며, BEDROCK_EMBEDDING_CACHE 설정 시 같은 질문은 다시 임베딩하지 않음
+    # 프로세스당 한 번만 열고, 이후 도구 호출에서는 같은 컬렉션을 재사용
+    collection = collection_registry.get_collection(path, collection_name, region_name='us-west-2')
     
     return collection
 
@@ -175,11 +166,16 @@ def process_tool(response_message, messages, bedrock, tool_list):
                 print("----QUERY:----")
                 print(query)
                 
-                # 벡터 검색 수행
-                search_results = get_vector_search_results(collection, query)
-    
-                # ChromaDB가 반환하는 중첩 리스트를 평탄화 (flatten)
-                flattened_results_list = list(itertools.chain(*search_results['documents']))
+                if chunks_enabled():
+                    # 청크 단위 검색: 같은 FAQ의 청크가 여러 개 검색되면 원본 FAQ 전체로 확장
+                    chunk_collection = get_collection("../../data/chroma", "bedrock_faq_chunks_collection")
+                    flattened_results_list = get_chunk_context(chunk_collection, query, collection)
+                else:
+                    # 벡터 검색 수행
+                    search_results = get_vector_search_results(collection, query)
+        
+                    # ChromaDB가 반환하는 중첩 리스트를 평탄화 (flatten)
+                    flattened_results_list = list(itertools.chain(*search_results['documents']))
                 
                 # 검색된 문서들을 하나의 문자열로 결합 (RAG 컨텍스트)
                 rag_content = "\n\n".join(flattened_results_list)
@@ -251,8 +247,7 @@ def chat_with_model(message_history, new_text=None):
         None (message_history가 직접 수정됨)
     """
     # AWS 세션 및 Bedrock 클라이언트 생성
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2')
+    bedrock = get_hedged_bedrock_client(region_name='us-west-2') #shared client, hedged to a second region when BEDROCK_HEDGE_REGION is set
     
     # 사용 가능한 도구 리스트 가져오기
     tool_list = get_tools()
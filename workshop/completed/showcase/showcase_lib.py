@@ -1,4 +1,7 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
+from common.response_cache import with_response_cache
 
 
 def get_prompt(user_input, template):
@@ -10,8 +13,7 @@ def get_prompt(user_input, template):
 
 def get_text_response(user_input, template):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+    bedrock = with_response_cache(get_bedrock_client()) #repeat prompts are answered from the cache when BEDROCK_RESPONSE_CACHE is set
 
     prompt = get_prompt(user_input, template)
     
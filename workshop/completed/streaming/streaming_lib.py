@@ -1,9 +1,10 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.hedging import get_hedged_bedrock_client
 
 def get_streaming_response(prompt, streaming_callback):
     
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+    bedrock = get_hedged_bedrock_client() #shared client, hedged to a second region when BEDROCK_HEDGE_REGION is set
     
     message = {
         "role": "user",
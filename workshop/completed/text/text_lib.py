@@ -1,9 +1,10 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 
 def get_text_response(input_content):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2')
+    bedrock = get_bedrock_client(region_name='us-west-2') #reuses the shared, pooled Bedrock client
     
     message = {
         "role": "user",
@@ -1,10 +1,11 @@
-import boto3
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) #make the shared workshop/common package importable
+from common.clients import get_bedrock_client
 
 
 def get_text_response(model, input_content, temperature, top_p, max_token_count):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+    bedrock = get_bedrock_client() #reuses the shared, pooled Bedrock client
     
     message = {
         "role": "user",
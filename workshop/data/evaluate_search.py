@@ -0,0 +1,116 @@
+import argparse, json, os, sys, time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.batch_search import DEFAULT_BATCH_SIZE, iter_batches, search_batch
+from common.collection_registry import get_collection, warm_up
+from common.embedding_file import read_embedding_file
+from common.embedding_profiles import DEFAULT_PROFILE, PROFILE_ENV_VAR, PROFILES, get_dump_path, get_profile
+from common.vector_store import COLLECTION_DUMPS
+
+#offline search evaluation: labelled queries against the populated collections, in batches
+#
+#every query goes through common/batch_search.py with the same settings as the libs
+#(BEDROCK_EMBEDDING_PROFILE, BEDROCK_VECTOR_STORE, BEDROCK_SEARCH_MODE), and the run reports recall@k,
+#MRR and queries per minute for each collection. Without --queries the labels come from the dumps:
+#    services_collection       each service's name -> that service
+#    bedrock_faqs_collection   each FAQ's question -> that FAQ
+#or pass a JSON Lines file of {"collection": ..., "query": ..., "relevant": [ids]}.
+#
+#    python evaluate_search.py
+#    python evaluate_search.py --queries labelled.jsonl --k 2 --output evaluation.json
+#    python evaluate_search.py --batch-size 1      #one question per call, as the libs search
+
+
+def get_default_queries(profile):
+
+    services, _ = read_embedding_file(get_dump_path(COLLECTION_DUMPS['services_collection'], profile))
+    faqs, _ = read_embedding_file(get_dump_path(COLLECTION_DUMPS['bedrock_faqs_collection'], profile))
+
+    return (
+        [{"collection": "services_collection", "query": item['metadata']['name'], "relevant": [str(item['id'])]} for item in services] +
+        [{"collection": "bedrock_faqs_collection", "query": item['document'].strip().split("\n")[0].strip(), "relevant": [str(item['id'])]} for item in faqs]
+    )
+
+
+def read_queries(file_path): #lines without relevant ids are skipped: recall@k is undefined for them
+
+    queries = []
+
+    with open(file_path) as queries_file:
+        for line_number, line in enumerate(queries_file, start=1):
+            if not line.strip():
+                continue
+
+            query = json.loads(line)
+
+            if not query.get('relevant'):
+                print(f"{file_path}:{line_number}: skipping {query.get('query')!r}, it has no relevant ids", file=sys.stderr)
+                continue
+
+            queries.append(query)
+
+    return queries
+
+
+def score(relevant, ids, k): #(recall@k, reciprocal rank of the first relevant result)
+
+    relevant = {str(item_id) for item_id in relevant}
+    ranks = [rank for rank, item_id in enumerate(ids[:k], start=1) if item_id in relevant]
+
+    return len(ranks) / min(k, len(relevant)), 1.0 / ranks[0] if ranks else 0.0
+
+
+def evaluate_collection(collection_name, queries, k=4, batch_size=DEFAULT_BATCH_SIZE):
+
+    collection = get_collection("chroma", collection_name)
+    questions = [query['query'] for query in queries]
+    results = []
+
+    started = time.perf_counter()
+
+    for batch in iter_batches(questions, batch_size * 16): #progress every few batches
+        results.extend(search_batch(collection, batch, k, batch_size))
+        print(f"{collection_name}: {len(results)}/{len(questions)} queries", file=sys.stderr)
+
+    seconds = time.perf_counter() - started
+    scores = [score(query['relevant'], result['ids'], k) for query, result in zip(queries, results)]
+
+    return {
+        "queries": len(queries),
+        "recall_at_k": round(sum(recall for recall, _ in scores) / len(scores), 4),
+        "mrr": round(sum(reciprocal_rank for _, reciprocal_rank in scores) / len(scores), 4),
+        "seconds": round(seconds, 3),
+        "queries_per_minute": round(len(queries) / seconds * 60),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate search over the populated collections with labelled queries")
+    parser.add_argument("--queries", help="JSON Lines file of {collection, query, relevant} (default: labels built from the dumps)")
+    parser.add_argument("--k", type=int, default=4, help="results per query (the labs ask for 4)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="queries embedded and searched per call")
+    parser.add_argument("--profile", choices=list(PROFILES), help=f"embedding profile (default: ${PROFILE_ENV_VAR}, then {DEFAULT_PROFILE})")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.profile:
+        os.environ[PROFILE_ENV_VAR] = args.profile #the collection registry reads the profile from the environment
+
+    queries = read_queries(args.queries) if args.queries else get_default_queries(get_profile())
+    by_collection = {}
+
+    for query in queries:
+        by_collection.setdefault(query['collection'], []).append(query)
+
+    warm_up("chroma", list(by_collection)) #opening a collection is not part of the measurement
+
+    results = {}
+
+    for collection_name, collection_queries in by_collection.items():
+        entry = results[collection_name] = evaluate_collection(collection_name, collection_queries, args.k, args.batch_size)
+
+        print(f"{collection_name:26} {entry['queries']:6} queries  recall@{args.k} {entry['recall_at_k']:.3f}  MRR {entry['mrr']:.3f}  "
+              f"{entry['seconds']:7.2f} s  {entry['queries_per_minute']:8} queries/min")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"settings": {"k": args.k, "batch_size": args.batch_size, "profile": get_profile()['name']}, "collections": results}, output_file, indent=2)
@@ -1,46 +1,66 @@
-import boto3, json
+import argparse, boto3, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
 import chromadb
-from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction
+from common.embedding_file import read_embedding_file
+from common.embedding_profiles import DEFAULT_PROFILE, PROFILE_ENV_VAR, PROFILES, get_collection_name, get_dump_path, get_embedding_function, get_profile
+from common.ingest import initialize_collections
+from common.lexical_index import build_bm25_index
+from common.quantized_index import build_quantized_index
+from common.vector_store import COLLECTION_DUMPS
 
 #startup script to populate vector db
 
-def get_text_embeddings_collection(collection_name):
+
+def get_sources(profile): #the dumps that exist for the profile; only the chunks may be missing
+    return {collection_name: base_name for collection_name, base_name in COLLECTION_DUMPS.items()
+            if collection_name != 'bedrock_faq_chunks_collection' or os.path.exists(get_dump_path(base_name, profile))}
+
+
+def get_text_embeddings_collection(collection_name, profile=None):
     session = boto3.Session()
-    embedding_function = AmazonBedrockEmbeddingFunction(session=session, region_name='us-west-2', model_name="amazon.titan-embed-text-v2:0")
-    
+    embedding_function = get_embedding_function(session, profile or get_profile(), region_name='us-west-2') #Titan v2 with the profile's dimensions
+
     client = chromadb.PersistentClient()
     index = client.get_or_create_collection(collection_name, embedding_function=embedding_function)
-    
+
     return index
 
 
-def initialize_collection(collection_name, source_json_file):
-    
-    collection = get_text_embeddings_collection(collection_name)
-    
-    if collection.count() == 0:
-        
-        row_count = 0
-        
-        with open(source_json_file) as json_file:
-            source_json = json.load(json_file)
-            
-            for item in source_json:
-                row_count = row_count + 1
-                collection.add(
-                    ids=[str(item['id'])],
-                    documents=[item['document']],
-                    metadatas=[item['metadata']],
-                    embeddings=[item['embedding']]
-                )
-    
-    print(f"Initialized collection {collection_name}")
-    
-    return collection
-
-
-
-initialize_collection('services_collection', 'services_with_embeddings.json')
-
-initialize_collection('bedrock_faqs_collection', 'bedrock_faqs_with_embeddings.json')
+def build_quantized_indexes(profile): #int8/binary profiles: a NumPy index next to the Chroma database instead of a collection
+
+    for collection_name, base_name in get_sources(profile).items():
+        items, embeddings = read_embedding_file(get_dump_path(base_name, profile))
+        stats = build_quantized_index("chroma", get_collection_name(collection_name, profile), items, embeddings, profile['index'])
+
+        print(f"Built {profile['index']} index {get_collection_name(collection_name, profile)}: {stats['documents']} documents, "
+              f"{stats['code_bytes'] // 1024} KB of codes for {stats['float_bytes'] // 1024} KB of float32 vectors")
+
+
+def build_bm25_indexes(profile): #keyword indexes for BEDROCK_SEARCH_MODE=hybrid; the same for every profile
+
+    for collection_name, base_name in get_sources(profile).items():
+        items, _ = read_embedding_file(get_dump_path(base_name, profile))
+        stats = build_bm25_index("chroma", collection_name, items)
+
+        print(f"Built BM25 index {collection_name}: {stats['documents']} documents, {stats['terms']} terms, "
+              f"{stats['postings']} postings in {stats['bytes'] // 1024} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the precomputed text embeddings into Chroma")
+    parser.add_argument("--batch-size", type=int, help="rows per collection.add (default and maximum: the client's max batch size)")
+    parser.add_argument("--sequential", action="store_true", help="load one collection at a time")
+    parser.add_argument("--profile", choices=list(PROFILES), help=f"embedding profile (default: ${PROFILE_ENV_VAR}, then {DEFAULT_PROFILE}); run prefetch_embeddings.py with the same profile first")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+
+    build_bm25_indexes(profile)
+
+    if profile['index'] != "float":
+        build_quantized_indexes(profile)
+        sys.exit(0)
 
+    initialize_collections(lambda collection_name: get_text_embeddings_collection(collection_name, profile), {
+        get_collection_name(collection_name, profile): get_dump_path(base_name, profile) for collection_name, base_name in get_sources(profile).items()
+    }, batch_size=args.batch_size, parallel=not args.sequential, manifest_dir="chroma") #re-runs only write what changed in the dumps
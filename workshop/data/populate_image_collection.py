@@ -1,39 +1,24 @@
-import boto3, json
+import argparse, boto3, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
 import chromadb
+from common.ingest import initialize_collections
 
 #startup script to populate vector db
 
+CHROMA_PATH = "/home/ec2-user/bedrock-workshop/workshop/data"  # 경로 추가
+
 def get_multimodal_embeddings_collection(collection_name):
-    client = chromadb.PersistentClient(path="/home/ec2-user/bedrock-workshop/workshop/data")  # 경로 추가
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
     index = client.get_or_create_collection(collection_name)
     
     return index
 
 
-def initialize_collection(collection_name, source_json_file):
-    
-    collection = get_multimodal_embeddings_collection(collection_name)
-    
-    if collection.count() == 0:
-        
-        row_count = 0
-        
-        with open(source_json_file) as json_file:
-            source_json = json.load(json_file)
-            
-            for item in source_json:
-                row_count = row_count + 1
-                collection.add(
-                    ids=[str(item['id'])],
-                    documents=[item['document']],
-                    metadatas=[item['metadata']],
-                    embeddings=[item['embedding']]
-                )
-    
-    print(f"Initialized collection {collection_name}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the precomputed image embeddings into Chroma")
+    parser.add_argument("--batch-size", type=int, help="rows per collection.add (default and maximum: the client's max batch size)")
+    args = parser.parse_args()
     
-    return collection
-
-
-
-initialize_collection('image_collection', 'images_with_embeddings.json')
+    initialize_collections(get_multimodal_embeddings_collection, {
+        'image_collection': 'images_with_embeddings.npy',
+    }, batch_size=args.batch_size, manifest_dir=CHROMA_PATH) #re-runs only write what changed in the dump
@@ -1,88 +1,154 @@
-import boto3, json
+import argparse, json, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.concurrency import get_limited_bedrock_client
+from common.chunking import chunk_document
+from common.dedup import DEFAULT_THRESHOLD, deduplicate
+from common.embedding_cache import get_embedding_cache
+from common.embedding_profiles import DEFAULT_PROFILE, MODEL_ID, PROFILE_ENV_VAR, PROFILES, get_dump_path, get_profile, get_request_body
+from common.prefetch import prefetch_embeddings
 
 #Load directory/csv/json-process and store metadata, docs, ids, and embeddings
 
 
-def get_text_embedding(text):
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime') #creates a Bedrock client
+def get_text_embedding(text, cache=None, profile=None):
+    
+    profile = profile or get_profile() #dimensions and normalization, see common/embedding_profiles.py
+    
+    if cache is not None: #unchanged documents are served from the content-hash cache
+        embedding = cache.get(MODEL_ID, text, profile['dimensions'], profile['normalize'])
+        
+        if embedding is not None:
+            return embedding
+    
+    bedrock = get_limited_bedrock_client() #shared client with adaptive concurrency and throttle retries
     
     response = bedrock.invoke_model(
-        body=json.dumps({ "inputText": text }), 
-        modelId="amazon.titan-embed-text-v2:0", 
+        body=get_request_body(text, profile), 
+        modelId=MODEL_ID, 
         accept="application/json",
         contentType="application/json"
     )
     
     response_body = json.loads(response['body'].read())
-    return response_body['embedding']
+    embedding = response_body['embedding']
     
-
-def serialize_services_embeddings():
+    if cache is not None:
+        cache.put(MODEL_ID, text, embedding, profile['dimensions'], profile['normalize'])
     
-    processed_items = []
-    row_count = 0
+    return embedding
+    
+
+def load_services():
     
     with open('services.json') as json_file: 
         services_json = json.load(json_file)
-        
-        for item in services_json:
-            row_count = row_count + 1
-            print(f"Processing item: {row_count}")
-            item_dict = {
-                'id': str(row_count),
-                'document': item['description'],
-                'metadata': {'name': item['name'], 'url': item['url'] },
-                'embedding': get_text_embedding(item['description'])
-            }
-            
-            processed_items.append(item_dict)
-            
-            #collection.add(
-            #    ids=[str(row_count)],
-            #    documents=[item['description']],
-            #    metadatas=[{'name': item['name'], 'url': item['url'] }])
     
-    with open('services_with_embeddings.json', 'w') as json_file:
-        json.dump(processed_items, json_file)
+    return [
+        {
+            'id': str(row_count),
+            'document': item['description'],
+            'metadata': {'name': item['name'], 'url': item['url'] },
+        }
+        for row_count, item in enumerate(services_json, start=1)
+    ]
 
 
-    print("Saved services_with_embeddings.json to disk!")
+def load_faqs():
+    
+    with open('bedrock_faqs.json') as json_file:
+        faqs_json = json.load(json_file)
+    
+    return [
+        {
+            'id': str(row_count),
+            'document': item['question'] + "\n" + item['answer'],
+            'metadata': {'topic': 'bedrock' },
+        }
+        for row_count, item in enumerate(faqs_json, start=1)
+    ]
 
 
-def serialize_faqs_embeddings():
-    
-    processed_items = []
-    row_count = 0
+def load_faq_chunks(max_tokens=100, overlap=20):
     
-    #with open('services.json') as json_file: 
     with open('bedrock_faqs.json') as json_file:
-        services_json = json.load(json_file)
-        
-        for item in services_json:
-            row_count = row_count + 1
-            print(f"Processing item: {row_count}")
-            item_dict = {
-                'id': str(row_count),
-                'document': item['question'] + "\n" + item['answer'],
-                'metadata': {'topic': 'bedrock' },
-                'embedding': get_text_embedding(item['question'] + "\n" + item['answer'])
-            }
-            
-            processed_items.append(item_dict)
-            
-            #collection.add(
-            #    ids=[str(row_count)],
-            #    documents=[item['description']],
-            #    metadatas=[{'name': item['name'], 'url': item['url'] }])
+        faqs_json = json.load(json_file)
     
-    with open('bedrock_faqs_with_embeddings.json', 'w') as json_file:
-        json.dump(processed_items, json_file)
+    chunks = []
     
+    for row_count, item in enumerate(faqs_json, start=1): #parent ids match load_faqs, so a chunk can be expanded to its whole FAQ
+        chunks.extend(chunk_document(row_count, item['answer'], {'topic': 'bedrock' }, max_tokens, overlap, prefix=item['question'] + "\n"))
     
-    print("Saved bedrock_faqs_with_embeddings.json to disk!")
+    return chunks
 
 
-serialize_faqs_embeddings()
+def serialize_embeddings(items, output_file, workers=16, cache=None, profile=None, dedup_threshold=None):
+    
+    dedup_stats = {'calls_saved': 0}
+    
+    if dedup_threshold: #embed one document per cluster of near-duplicates, see common/dedup.py
+        items, dedup_stats = deduplicate(items, dedup_threshold)
+        print(f"{output_file}: {dedup_stats['items']} documents, {dedup_stats['clusters']} clusters of near-duplicates, "
+              f"{dedup_stats['calls_saved']} embedding calls saved")
+    
+    stats = prefetch_embeddings(items, lambda item: get_text_embedding(item['document'], cache, profile), output_file, workers=workers)
+    stats['calls_saved'] = dedup_stats['calls_saved']
+    
+    if stats['failed'] == 0:
+        print(f"Saved {output_file} to disk! ({stats['embedded']} embedded, {stats['resumed']} resumed, {stats['items_per_second']} items/s)")
+    
+    return stats
+
+
+def get_output_file(base_name, profile, output_format): #npy: services_with_embeddings.npy + .items.json (see common/embedding_file.py)
+    return get_dump_path(base_name, profile)[:-len(".npy")] + "." + output_format
+
+
+def serialize_services_embeddings(workers=16, cache=None, output_format="npy", profile=None, dedup_threshold=None):
+    profile = profile or get_profile()
+    return serialize_embeddings(load_services(), get_output_file('services_with_embeddings', profile, output_format), workers, cache, profile, dedup_threshold)
+
+
+def serialize_faqs_embeddings(workers=16, cache=None, output_format="npy", profile=None, dedup_threshold=None):
+    profile = profile or get_profile()
+    return serialize_embeddings(load_faqs(), get_output_file('bedrock_faqs_with_embeddings', profile, output_format), workers, cache, profile, dedup_threshold)
+
+
+def serialize_faq_chunks_embeddings(workers=16, cache=None, output_format="npy", profile=None, max_tokens=100, overlap=20, dedup_threshold=None):
+    profile = profile or get_profile()
+    return serialize_embeddings(load_faq_chunks(max_tokens, overlap), get_output_file('bedrock_faq_chunks_with_embeddings', profile, output_format), workers, cache, profile, dedup_threshold)
 
-serialize_services_embeddings()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the FAQ and services corpora; safe to interrupt and re-run")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent embedding calls (the adaptive limiter may allow fewer)")
+    parser.add_argument("--cache", default="embedding_cache.db", help="embedding cache file, shared with the libs via BEDROCK_EMBEDDING_CACHE")
+    parser.add_argument("--no-cache", action="store_true", help="re-embed everything")
+    parser.add_argument("--format", choices=["npy", "json"], default="npy", help="npy: float32 matrix + .items.json sidecar; json: the legacy *_with_embeddings.json dumps")
+    parser.add_argument("--profile", choices=list(PROFILES), help=f"embedding profile (default: ${PROFILE_ENV_VAR}, then {DEFAULT_PROFILE})")
+    parser.add_argument("--chunk-tokens", type=int, default=100, help="FAQ answer tokens per chunk (each chunk also starts with its question)")
+    parser.add_argument("--chunk-overlap", type=int, default=20, help="tokens shared by consecutive chunks")
+    parser.add_argument("--dedup", action="store_true", help="embed one document per cluster of near-duplicates; the others become ids in its 'aliases' metadata and their own metadata is dropped")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="with --dedup: estimated Jaccard similarity at which documents count as near-duplicates")
+    args = parser.parse_args()
+    
+    cache = None if args.no_cache else get_embedding_cache(args.cache)
+    profile = get_profile(args.profile)
+    dedup_threshold = args.dedup_threshold if args.dedup else None #off by default: every document keeps its own entry and metadata
+    
+    try:
+        faq_stats = serialize_faqs_embeddings(args.workers, cache, args.format, profile, dedup_threshold)
+        
+        chunk_stats = serialize_faq_chunks_embeddings(args.workers, cache, args.format, profile, args.chunk_tokens, args.chunk_overlap, dedup_threshold)
+        
+        services_stats = serialize_services_embeddings(args.workers, cache, args.format, profile, dedup_threshold)
+    except KeyboardInterrupt: #progress is already in the checkpoint files
+        sys.exit(130)
+    
+    if dedup_threshold:
+        print(f"Near-duplicate dedup: {faq_stats['calls_saved'] + chunk_stats['calls_saved'] + services_stats['calls_saved']} embedding calls saved")
+    
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses ({cache.get_hit_rate():.0%} hit rate), {len(cache)} vectors in {args.cache}")
+    
+    if faq_stats['failed'] or chunk_stats['failed'] or services_stats['failed']:
+        sys.exit(1)
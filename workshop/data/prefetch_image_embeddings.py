@@ -1,12 +1,17 @@
-import boto3, json, base64, os
+import argparse, itertools, json, os, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.concurrency import get_limited_bedrock_client
+from common.embedding_cache import CACHE_PATH_ENV_VAR, get_embedding_cache
+from common.embedding_file import write_embedding_file
+from common.images import MAX_IMAGE_SIDE, prepare_image_file
 
 
 #calls Amazon Bedrock to get a vector from either an image, text, or both
 def get_multimodal_vector(input_image_base64=None, input_text=None):
     
-    session = boto3.Session()
-
-    bedrock = session.client(service_name='bedrock-runtime', region_name='us-west-2') #creates a Bedrock client
+    bedrock = get_limited_bedrock_client(region_name='us-west-2') #shared client with adaptive concurrency and throttle retries
     
     request_body = {}
     
@@ -18,6 +23,14 @@ def get_multimodal_vector(input_image_base64=None, input_text=None):
     
     body = json.dumps(request_body)
     
+    cache = get_embedding_cache() #unchanged images are served from the content-hash cache
+    
+    if cache is not None:
+        embedding = cache.get("amazon.titan-embed-image-v1", body, dimensions=1024)
+        
+        if embedding is not None:
+            return embedding
+    
     response = bedrock.invoke_model(
     	body=body, 
     	modelId="amazon.titan-embed-image-v1", 
@@ -29,49 +42,107 @@ def get_multimodal_vector(input_image_base64=None, input_text=None):
     
     embedding = response_body.get("embedding")
     
+    if cache is not None:
+        cache.put("amazon.titan-embed-image-v1", body, embedding, dimensions=1024)
+    
     return embedding
 
 
-#creates a vector from a file
-def get_vector_from_file(file_path):
-    with open(file_path, "rb") as image_file:
-        input_image_base64 = base64.b64encode(image_file.read()).decode('utf8')
+#creates a vector from a file, downscaled first (see common/images.py)
+def get_vector_from_file(file_path, max_side=MAX_IMAGE_SIDE):
+    input_image_base64, _ = prepare_image_file(file_path, max_side)
     
     vector = get_multimodal_vector(input_image_base64 = input_image_base64)
     
     return vector
 
 
-def serialize_image_embeddings():
+def serialize_image_embeddings(path="../labs/image_search/images", max_side=MAX_IMAGE_SIDE, processes=None, workers=8):
+    """Decode and downscale the images in a process pool while a thread pool embeds them.
     
-    processed_items = []
-    row_count = 0
+    At most workers requests are in flight, and at most twice as many decoded images wait for one,
+    so memory stays flat however large the library is.
+    """
     
-    path = "../labs/image_search/images"
+    file_names = os.listdir(path)
+    window = workers * 2
     
-    for file in os.listdir(path):
-        file_path = os.path.join(path, file)
+    processed_items = []
+    embeddings = []
+    stats = {'images': 0, 'original_bytes': 0, 'uploaded_bytes': 0}
+    started = time.monotonic()
+    
+    with ProcessPoolExecutor(max_workers=processes) as decoders, ThreadPoolExecutor(max_workers=workers) as embedders:
+        names = iter(file_names)
+        decoding = deque()
+        embedding = deque()
+        
+        def decode_more(): #keep the decoders busy without decoding the whole library ahead of the embedders
+            for file in itertools.islice(names, window - len(decoding)):
+                decoding.append((file, decoders.submit(prepare_image_file, os.path.join(path, file), max_side)))
         
-        embedding = get_vector_from_file(file_path)
+        def finish(file, future): #results are collected in file order, so ids match os.listdir
+            embeddings.append(future.result())
+            
+            row_count = len(processed_items) + 1
+            print(f"Processing item: {row_count}")
+            processed_items.append({
+                'id': str(row_count),
+                'document': f"images/{file}",
+                'metadata': {'file_path': f"images/{file}", 'max_side': max_side } #image_search_lib scales query images to match
+            })
         
-        row_count = row_count + 1
-        print(f"Processing item: {row_count}")
-        item_dict = {
-            'id': str(row_count),
-            'document': f"images/{file}",
-            'metadata': {'file_path': f"images/{file}" },
-            'embedding': embedding
-        }
+        decode_more()
         
-        processed_items.append(item_dict)
+        while decoding:
+            file, future = decoding.popleft()
+            input_image_base64, original_bytes = future.result()
+            decode_more()
+            
+            stats['images'] += 1
+            stats['original_bytes'] += original_bytes
+            stats['uploaded_bytes'] += len(input_image_base64)
+            
+            if len(embedding) >= window:
+                finish(*embedding.popleft())
+            
+            embedding.append((file, embedders.submit(get_multimodal_vector, input_image_base64=input_image_base64)))
+        
+        while embedding:
+            finish(*embedding.popleft())
+    
+    elapsed = time.monotonic() - started
+    stats['elapsed_seconds'] = round(elapsed, 2)
+    stats['images_per_second'] = round(stats['images'] / elapsed, 2) if elapsed > 0 else 0.0
     
+    write_embedding_file('images_with_embeddings', processed_items, embeddings) #images_with_embeddings.npy + .items.json
     
-    with open('images_with_embeddings.json', 'w') as json_file:
-        json.dump(processed_items, json_file)
     
+    print("Saved images_with_embeddings.npy to disk!")
+    print(f"{stats['images']} images in {stats['elapsed_seconds']} s ({stats['images_per_second']} images/s); "
+          f"uploaded {stats['uploaded_bytes'] / 1e6:.1f} MB of base64 for {stats['original_bytes'] / 1e6:.1f} MB of image files")
     
-    print("Saved images_with_embeddings.json to disk!")
+    return stats
 
 
 
-serialize_image_embeddings()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the image search lab's images with Titan Multimodal Embeddings")
+    parser.add_argument("--path", default="../labs/image_search/images", help="directory of images to embed")
+    parser.add_argument("--max-side", type=int, default=MAX_IMAGE_SIDE, help="downscale images to at most this many pixels on their long side (0: send them as they are)")
+    parser.add_argument("--processes", type=int, help="image decoding processes (default: one per CPU)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent embedding requests")
+    parser.add_argument("--no-cache", action="store_true", help="re-embed everything")
+    args = parser.parse_args()
+    
+    if args.no_cache:
+        os.environ[CACHE_PATH_ENV_VAR] = "" #get_embedding_cache() returns None
+    else:
+        os.environ.setdefault(CACHE_PATH_ENV_VAR, "embedding_cache.db") #the same cache file as prefetch_embeddings.py
+    
+    serialize_image_embeddings(args.path, args.max_side, args.processes, args.workers)
+    
+    cache = get_embedding_cache()
+    
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses ({cache.get_hit_rate():.0%} hit rate)")
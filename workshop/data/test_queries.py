@@ -1,47 +1,34 @@
-import boto3
-import itertools
-import chromadb
-from chromadb.utils.embedding_functions import AmazonBedrockEmbeddingFunction
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) #make the shared workshop/common package importable
+from common.batch_search import search_batch
+from common.collection_registry import get_collection
+
+#spot-check the populated collections; data/evaluate_search.py scores labelled queries in bulk
 
 def get_text_embeddings_collection(collection_name):
-    session = boto3.Session()
-    embedding_function = AmazonBedrockEmbeddingFunction(session=session, model_name="amazon.titan-embed-text-v2:0")
-    
-    client = chromadb.PersistentClient()
-    index = client.get_or_create_collection(collection_name, embedding_function=embedding_function)
     
-    return index
+    return get_collection("chroma", collection_name) #profile, vector store and search mode as in the libs
 
-def get_vector_search_results(collection, question):
+def get_vector_search_results(collection, questions):
     
-    results = collection.query(
-        query_texts=[question],
-        n_results=4
-    )
+    results = search_batch(collection, questions, n_results=4) #all questions embedded together, one index probe
     
     return results
-    
-def get_similarity_search_results(collection_name, question):
 
-    session = boto3.Session()
-    bedrock = session.client(service_name='bedrock-runtime')
+def get_similarity_search_results(collection_name, questions):
     
     collection = get_text_embeddings_collection(collection_name)
     
-    search_results = get_vector_search_results(collection, question)
-    
-    flattened_results_list = list(itertools.chain(*search_results['documents'])) #flatten the list of lists returned by chromadb
+    search_results = get_vector_search_results(collection, questions)
     
-    print(f"\n{collection_name}\n")
+    for question, results in zip(questions, search_results):
+        print(f"\n{collection_name}: {question}\n")
+        print(results['documents'])
     
-    print(flattened_results_list)
-    
-    return flattened_results_list
-
-
-get_similarity_search_results("services_collection", "Managed database service")
+    return [results['documents'] for results in search_results]
 
 
-get_similarity_search_results("bedrock_faqs_collection", "What can I do with Bedrock agents?")
+get_similarity_search_results("services_collection", ["Managed database service"])
 
 
+get_similarity_search_results("bedrock_faqs_collection", ["What can I do with Bedrock agents?"])